@@ -0,0 +1,59 @@
+import json
+import time
+
+# 判断登录状态是否过期时检查的 cookie
+AUTH_COOKIE_NAMES = ("__client_id", "_uid")
+
+def load_valid_accounts(cookie_path="cookies.json", now=None):
+    """
+    读取 cookies.json 中仍然有效的登录账号
+
+    参数:
+        cookie_path: cookies.json文件路径
+        now: 当前时间（秒级时间戳），默认取当前时间
+
+    返回:
+        list: 账号用户ID列表（按 cookies.json 中的顺序）；没有 cookies 或登录 cookie 已过期的账号跳过
+    """
+    now = time.time() if now is None else now
+    with open(cookie_path, "r") as file:
+        cookies = json.load(file)
+
+    account_ids = []
+    for account in cookies:
+        account_cookies = account.get("cookies") or []
+        if not account.get("user_id") or not account_cookies:
+            continue
+        expired = any(
+            c.get("name") in AUTH_COOKIE_NAMES and 0 < c.get("expires", -1) < now
+            for c in account_cookies
+        )
+        if expired:
+            print(f"账号 {account.get('user_name')}（{account['user_id']}）的登录状态已过期，跳过")
+            continue
+        if account["user_id"] not in account_ids:
+            account_ids.append(account["user_id"])
+    return account_ids
+
+def union_watch_list(user_ids_list):
+    """合并 user_ids.json 中所有账号的监控列表（去重，保持首次出现的顺序）"""
+    seen = set()
+    union = []
+    for user_ids in user_ids_list.values():
+        for user_id in user_ids or []:
+            if user_id not in seen:
+                seen.add(user_id)
+                union.append(user_id)
+    return union
+
+def assign_shards(user_ids, account_ids):
+    """
+    把用户轮流分配给各个账号
+
+    返回:
+        dict: {账号用户ID: [监控用户ID, ...]}，各账号分到的用户数最多相差 1
+    """
+    shards = {account_id: [] for account_id in account_ids}
+    for index, user_id in enumerate(user_ids):
+        shards[account_ids[index % len(account_ids)]].append(user_id)
+    return shards
@@ -0,0 +1,144 @@
+import bisect
+from Record_Types import SECONDS_PER_DAY
+
+# 未指定最长轮询间隔时，取监控周期的这个倍数（间隔逐次加倍：1、2、4、8、16 个周期）
+MAX_INTERVAL_CYCLES = 16
+
+class AdaptivePoller:
+    """
+    按用户活跃程度决定每个用户的轮询间隔
+
+    参数:
+        base_interval: 监控周期（秒），活跃用户每个周期都轮询
+        max_interval: 最长轮询间隔（秒），为 None 时取 base_interval × MAX_INTERVAL_CYCLES
+        rate_window_days: 统计近期提交频率的天数
+        polls_per_gap: 平均提交间隔内至少轮询的次数
+        active_window: 最近一次提交后的这段时间（秒）内视为活跃，每个周期都轮询
+
+    注意:
+        通知只提示10分钟内的提交。max_interval 不超过10分钟时，不活跃的用户重新提交后一定能在通知窗口内被发现；
+        超过时（例如 5 分钟的监控周期取默认的 80 分钟），这类用户的第一条新记录可能只保存、不弹出通知，
+        需要通知时应显式传入不超过 600 的 max_interval（Main.py 中的 MAX_POLL_INTERVAL_MINUTES）
+
+    功能:
+        1. 根据已保存记录中的近期提交频率和空闲时间确定初始间隔
+        2. 活跃期过后，轮询没有发现新记录时间隔加倍，直到 max_interval
+        3. 发现新记录时立即恢复为每个周期轮询
+        4. 爬取失败或未抓到水位线的用户下个周期重新轮询，间隔不变
+    """
+    def __init__(self, base_interval, max_interval=None, rate_window_days=7, polls_per_gap=4, active_window=600):
+        self.base_interval = base_interval
+        if max_interval is None:
+            max_interval = base_interval * MAX_INTERVAL_CYCLES
+        self.max_interval = max(max_interval, base_interval)
+        self.rate_window = rate_window_days * SECONDS_PER_DAY
+        self.polls_per_gap = polls_per_gap
+        self.active_window = active_window
+        self._last_active = {}
+        self._intervals = {}
+        self._next_due = {}
+
+    def _quantize(self, seconds):
+        # 取不超过 seconds 的 base_interval × 2^k，并限制在 [base_interval, max_interval]
+        # （max_interval 不是 base_interval 的 2^k 倍时，超过它的间隔取 max_interval 本身）
+        interval = self.base_interval
+        while interval * 2 <= seconds and interval < self.max_interval:
+            interval *= 2
+        return min(interval, self.max_interval)
+
+    def initial_interval(self, timestamps, now):
+        """
+        根据一个用户的提交时间（秒）计算初始轮询间隔
+
+        说明:
+            预计间隔取 近期平均提交间隔 与 距上次提交的时间 中较大的一个，
+            再除以 polls_per_gap，保证平均每两次提交之间至少轮询 polls_per_gap 次
+        """
+        timestamps = [t for t in timestamps if t is not None]
+        if not timestamps:
+            return self.base_interval
+        idle = max(now - max(timestamps), 0)
+        if idle < self.active_window:
+            return self.base_interval
+        recent = sum(1 for t in timestamps if t >= now - self.rate_window)
+        average_gap = self.rate_window / recent if recent else self.rate_window
+        return self._quantize(max(average_gap, idle) / self.polls_per_gap)
+
+    def seed(self, existing_records, now):
+        """根据已保存的记录为每个用户设置初始间隔（启动时调用一次）"""
+        for user in existing_records:
+            self.seed_user(user.get("user_id"), [r.timestamp for r in user.get("records", [])], now)
+
+    def seed_user(self, user_id, timestamps, now):
+        """根据一个用户的提交时间设置初始间隔，并安排在本周期轮询"""
+        self._intervals[user_id] = self.initial_interval(timestamps, now)
+        self._next_due[user_id] = now
+        valid = [t for t in timestamps if t is not None]
+        if valid:
+            self._last_active[user_id] = max(valid)
+
+    def interval(self, user_id):
+        return self._intervals.get(user_id, self.base_interval)
+
+    def due_users(self, user_ids, now):
+        """返回本周期需要轮询的用户（保持原顺序）；到期时间在半个周期内的也算到期"""
+        slack = self.base_interval / 2
+        return [user_id for user_id in user_ids if self._next_due.get(user_id, now) <= now + slack]
+
+    def observe(self, user_id, found_new, now, complete=True):
+        """记录一次轮询的结果并安排下次轮询时间"""
+        if not complete:
+            self._next_due[user_id] = now
+            return
+        if found_new:
+            self._last_active[user_id] = now
+        if now - self._last_active.get(user_id, float("-inf")) < self.active_window:
+            interval = self.base_interval
+        else:
+            interval = min(self.interval(user_id) * 2, self.max_interval)
+        self._intervals[user_id] = interval
+        self._next_due[user_id] = now + interval
+
+    def observe_results(self, crawl_results, now):
+        """根据本周期的爬取结果更新各用户的间隔，返回发现新记录的用户数"""
+        active = 0
+        for result in crawl_results:
+            found_new = bool(result.get("records"))
+            active += found_new
+            self.observe(result["user_id"], found_new, now, result.get("complete", True))
+        return active
+
+def simulate_polling(timelines, start, end, cycle_seconds, poller=None):
+    """
+    按监控周期模拟轮询：每个周期轮询到期的用户，发现上次轮询之后的新提交
+
+    参数:
+        timelines: {用户ID: 升序的提交时间列表}
+        poller: AdaptivePoller，为 None 时每个周期轮询全部用户
+
+    返回:
+        dict: {"polls", "cycles", "delays"}，delays 为每条提交从提交到被发现的秒数
+    """
+    user_ids = list(timelines)
+    if poller is not None:
+        for user_id in user_ids:
+            history = timelines[user_id]
+            poller.seed_user(user_id, history[:bisect.bisect_right(history, start)], start)
+    last_poll = {user_id: start for user_id in user_ids}
+    polls = 0
+    cycles = 0
+    delays = []
+    now = start
+    while now <= end:
+        due = user_ids if poller is None else poller.due_users(user_ids, now)
+        for user_id in due:
+            stamps = timelines[user_id]
+            new = stamps[bisect.bisect_right(stamps, last_poll[user_id]):bisect.bisect_right(stamps, now)]
+            delays.extend(now - t for t in new)
+            last_poll[user_id] = now
+            if poller is not None:
+                poller.observe(user_id, bool(new), now)
+        polls += len(due)
+        cycles += 1
+        now += cycle_seconds
+    return {"polls": polls, "cycles": cycles, "delays": delays}
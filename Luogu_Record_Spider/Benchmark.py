@@ -0,0 +1,763 @@
+import asyncio
+import gc
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from Get_Record import build_existing_record_index, clean_old_records, extract_page_records_bulk, extract_page_records_by_locator, load_existing_records, merge_records, record_key, run_multiprocess_spider, run_sharded_spider, run_spider
+from Fake_Luogu_Server import FakeLuoguServer, make_synthetic_problems, make_synthetic_record_rows, render_record_list_page
+from Record_Parser import DIFFICULTY_NAMES, RECORDS_PER_PAGE
+from Record_Types import Record, to_seconds, users_from_dicts, users_to_dicts
+from Record_Store import JsonRecordStore
+from Data_Cache import BackgroundJsonWriter, CachedJsonFile
+from Record_Index import UserRecordIndex
+from Leaderboard import LeaderboardAggregate
+from Adaptive_Poller import AdaptivePoller, simulate_polling
+from Get_Problem import get_problem
+from Metrics import METRICS, percentile
+
+def make_synthetic_records(count, start=None):
+    """生成按时间倒序排列的合成记录"""
+    start = start or datetime.now()
+    records = []
+    for i in range(count):
+        post_date = (start - timedelta(minutes=37 * i)).strftime("%Y-%m-%d %H:%M:00")
+        records.append({"post_date": post_date, "problem_number": f"P{1000 + i}", "problem_name": f"题目 {i}"})
+    return records
+
+async def benchmark_record_extraction(rounds=20):
+    """
+    对比逐行定位与批量提取两种方式
+
+    输出每页的浏览器往返次数与耗时
+    """
+    # 只有这项测试需要浏览器，其余纯 Python 的测试不依赖 Playwright
+    from playwright.async_api import async_playwright
+
+    html = render_record_list_page("bench_user", make_synthetic_records(RECORDS_PER_PAGE))
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        page = await browser.new_page()
+        await page.set_content(html)
+
+        extractors = [
+            ("逐行定位", lambda stats: extract_page_records_by_locator(page, "bench_user", 1, stats)),
+            ("批量提取", lambda stats: extract_page_records_bulk(page, stats)),
+        ]
+        for name, extractor in extractors:
+            stats = {}
+            start = time.perf_counter()
+            for _ in range(rounds):
+                page_data = await extractor(stats)
+            elapsed = time.perf_counter() - start
+            print(f"{name}：每页 {len(page_data['records'])} 条记录，"
+                  f"往返 {stats.get('round_trips', 0) / rounds:.1f} 次，耗时 {elapsed / rounds * 1000:.1f} 毫秒")
+
+        await browser.close()
+
+def make_synthetic_user_records(users, records_per_user):
+    """生成与 user_records.json 结构相同的合成数据"""
+    start = datetime.now()
+    return [{
+        "user_id": str(100000 + u),
+        "user_name": f"user_{u}",
+        "records": make_synthetic_records(records_per_user, start - timedelta(seconds=u)),
+    } for u in range(users)]
+
+async def benchmark_existing_index(users=1000, records_per_user=500, sample_users=20):
+    """
+    对比已存在记录的两种加载方式
+
+    旧做法：每个用户各自读取并解析整个记录文件，再线性查找自己的记录
+    新做法：每个周期只建立一次索引，每个用户直接取自己的部分
+    旧做法只测量 sample_users 个用户，再按用户数折算
+    """
+    existing_records = make_synthetic_user_records(users, records_per_user)
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "user_records.json")
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(existing_records, file, ensure_ascii=False, indent=2)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        print(f"合成记录文件：{users} 个用户 × {records_per_user} 条记录，{size_mb:.1f} MB")
+        existing_records = users_from_dicts(existing_records)
+
+        start = time.perf_counter()
+        for user_data in existing_records[:sample_users]:
+            for candidate in load_existing_records(path):
+                if candidate.get("user_id") == user_data["user_id"]:
+                    {record_key(record) for record in candidate.get("records", [])}
+                    break
+        legacy = (time.perf_counter() - start) / sample_users * users
+        print(f"旧做法（每用户读取一次文件）：约 {legacy:.1f} 秒/周期（按 {sample_users} 个用户折算）")
+
+        start = time.perf_counter()
+        index = build_existing_record_index(existing_records)
+        for user_data in existing_records:
+            index.get(user_data["user_id"], set())
+        indexed = time.perf_counter() - start
+        print(f"新做法（每周期建立一次索引）：{indexed:.2f} 秒/周期，约快 {legacy / indexed:.0f} 倍")
+
+def measure_memory(build):
+    """返回 build() 的结果及其占用的内存（MB）"""
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size / 1024 / 1024
+
+async def benchmark_record_pipeline(users=1000, records_per_user=500, days_threshold=7):
+    """
+    对比记录字典 + strptime 与 Record + 整数时间两种表示下的 合并 + 清理 + 排行榜 开销
+
+    旧做法：记录为字典，排序、清理、排行榜统计时每次用 strptime 解析日期字符串
+    新做法：记录为 Record，读取时解析一次，之后只比较整数
+    """
+    level_of = lambda p_num: int(p_num[1:]) % 7
+    date_format = "%Y-%m-%d %H:%M:%S"
+    data = make_synthetic_user_records(users, records_per_user)
+    now = datetime.now()
+    print(f"合成记录：{users} 个用户 × {records_per_user} 条记录，共 {users * records_per_user} 条")
+
+    # 每个用户本周期新增一条记录
+    def new_records_for(users_data, as_record):
+        records = []
+        for user in users_data:
+            record = {"post_date": now.strftime(date_format), "problem_number": "P999", "problem_name": "新题目"}
+            records.append({"user_id": user["user_id"], "user_name": user["user_name"],
+                            "records": [Record.from_dict(record) if as_record else record]})
+        return records
+
+    # 两种表示各自占用的内存（读取时的转换不计入每周期耗时）
+    record_users, record_mb = measure_memory(lambda: users_from_dicts(data))
+    legacy_users, legacy_mb = measure_memory(lambda: [dict(user, records=[dict(r) for r in user["records"]]) for user in data])
+
+    # 新做法
+    # 排行榜统计在程序启动时建立一次，之后每周期随合并与清理增量更新
+    leaderboard = LeaderboardAggregate(level_of)
+    leaderboard.rebuild(record_users)
+    gc.collect()
+    start = time.perf_counter()
+    merged = merge_records(record_users, new_records_for(record_users, True), leaderboard)
+    merged = clean_old_records(merged, days_threshold, leaderboard)
+    board = leaderboard.query(days_threshold, 0, 6, now)
+    compact = time.perf_counter() - start
+
+    # 旧做法（排行榜统计按旧实现每次从全部记录重新计算）
+    gc.collect()
+    start = time.perf_counter()
+    cutoff = datetime.now() - timedelta(days=days_threshold)
+    for user, new_user in zip(legacy_users, new_records_for(legacy_users, False)):
+        user["records"].extend(new_user["records"])
+        user["records"].sort(key=lambda x: datetime.strptime(x["post_date"], date_format), reverse=True)
+        user["records"] = [r for r in user["records"] if datetime.strptime(r["post_date"], date_format) >= cutoff]
+    legacy_counts = {}
+    for user in legacy_users:
+        for record in user["records"]:
+            day = datetime.strptime(record["post_date"], date_format).toordinal()
+            counts = legacy_counts.setdefault((user["user_id"], day), [0] * 7)
+            counts[level_of(record["problem_number"])] += 1
+    legacy = time.perf_counter() - start
+
+    # 两种做法各自取当前时间，截止时间相差不到一秒，只允许截止边界上的个别记录不同
+    kept, legacy_kept = sum(len(u["records"]) for u in merged), sum(len(u["records"]) for u in legacy_users)
+    assert abs(kept - legacy_kept) <= users // 100, f"保留记录数不一致：{kept} / {legacy_kept}"
+    assert abs(sum(entry["count"] for entry in board) - sum(sum(c) for c in legacy_counts.values())) <= users // 100
+    print(f"旧做法（字典 + strptime）：{legacy:.2f} 秒/周期，记录占用 {legacy_mb:.0f} MB")
+    print(f"新做法（Record + 整数时间）：{compact:.2f} 秒/周期，记录占用 {record_mb:.0f} MB，约快 {legacy / compact:.1f} 倍")
+
+def legacy_merge_records(existing_records, new_records):
+    """旧的合并做法：每个用户重建集合、追加后整体重新排序"""
+    user_records_map = {user["user_id"]: dict(user) for user in existing_records}
+    for new_record in new_records:
+        records = user_records_map[new_record["user_id"]]["records"]
+        keys = {record_key(record) for record in records}
+        for record in new_record["records"]:
+            if record_key(record) not in keys:
+                records.append(record)
+                keys.add(record_key(record))
+    merged_records = list(user_records_map.values())
+    for user in merged_records:
+        user["records"].sort(key=lambda x: x.timestamp if x.timestamp is not None else float("-inf"), reverse=True)
+    return merged_records
+
+async def benchmark_merge(users=1000, changed_users=50, new_per_user=3, history_sizes=(10, 100, 500)):
+    """
+    对比两种合并做法在历史记录增长时的每周期耗时
+
+    每个周期固定只有 changed_users 个用户各有 new_per_user 条新记录，
+    历史记录从每用户 10 条增长到 500 条；新做法的耗时应基本不随历史增长
+    """
+    now = datetime.now()
+    for records_per_user in history_sizes:
+        history = users_from_dicts(make_synthetic_user_records(users, records_per_user))
+        new_records = [{
+            "user_id": user["user_id"], "user_name": user["user_name"],
+            "records": [Record(f"P{9000 + i}", (now + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:00"), "新题目")
+                        for i in range(new_per_user, 0, -1)] + user["records"][:2],
+        } for user in history[:changed_users]]
+
+        legacy_history = [dict(user, records=list(user["records"])) for user in history]
+        expected = legacy_merge_records(legacy_history, new_records)
+        legacy_history = [dict(user, records=list(user["records"])) for user in history]
+        # 先做一次完整回收，避免历史记录越多、计时中途触发的回收越慢
+        gc.collect()
+        start = time.perf_counter()
+        legacy_merge_records(legacy_history, new_records)
+        legacy = time.perf_counter() - start
+
+        gc.collect()
+        start = time.perf_counter()
+        merged = merge_records(history, new_records)
+        linear = time.perf_counter() - start
+
+        assert [u["records"] for u in merged] == [u["records"] for u in expected]
+        print(f"历史 {users * records_per_user} 条、新增 {changed_users * new_per_user} 条："
+              f"旧做法 {legacy * 1000:.1f} 毫秒，新做法 {linear * 1000:.2f} 毫秒")
+        # 在计时区域之外释放本轮数据
+        del history, legacy_history, new_records, expected, merged
+
+def load_timelines(path):
+    """从 user_records.json 读取每个用户的提交时间（秒，升序）"""
+    users = load_existing_records(path)
+    return {user["user_id"]: sorted(r.timestamp for r in user["records"] if r.timestamp is not None) for user in users}
+
+def make_synthetic_timelines(users=500, days=14, seed=1, end=None):
+    """
+    生成提交时间线：10% 活跃用户（平均 40 分钟一次，集中在白天的练习时段），
+    30% 偶尔提交（平均 1 天一次），其余基本不提交（平均 20 天一次）
+
+    fixtures/submission_timelines.json 由 make_synthetic_timelines(300, 10, end=1760745600) 录制
+    """
+    rng = random.Random(seed)
+    end = time.time() if end is None else end
+    start = end - days * 86400
+    timelines = {}
+    for u in range(users):
+        kind = u % 10
+        mean_gap = 40 * 60 if kind == 0 else 86400 if kind <= 3 else 20 * 86400
+        t = start + rng.expovariate(1 / mean_gap)
+        stamps = []
+        while t < end:
+            hour = time.localtime(t).tm_hour
+            if kind != 0 or 8 <= hour < 23:
+                stamps.append(int(t))
+            t += rng.expovariate(1 / mean_gap)
+        timelines[str(100000 + u)] = stamps
+    return timelines
+
+async def benchmark_adaptive_polling(timelines_path=None, simulate_days=3, cycle_minutes=0.5, max_interval_minutes=None):
+    """
+    在提交时间线上对比固定轮询与按活跃程度轮询的请求数和发现延迟
+
+    timelines_path 指向 user_records.json 时使用真实记录，否则使用合成时间线；
+    模拟最后 simulate_days 天，之前的记录用于确定初始间隔
+    """
+    if timelines_path:
+        timelines = load_timelines(timelines_path)
+    else:
+        timelines = make_synthetic_timelines()
+    # 时间线使用 Record 的秒数基准（本地时间），合成数据换算到同一基准
+    if not timelines_path:
+        offset = to_seconds(datetime.now()) - time.time()
+        timelines = {u: [int(t + offset) for t in stamps] for u, stamps in timelines.items()}
+    end = max((stamps[-1] for stamps in timelines.values() if stamps), default=to_seconds(datetime.now()))
+    start = end - simulate_days * 86400
+    cycle_seconds = cycle_minutes * 60
+    poller = AdaptivePoller(cycle_seconds, max_interval_minutes * 60 if max_interval_minutes is not None else None)
+    print(f"{len(timelines)} 个用户，模拟 {simulate_days} 天，监控周期 {cycle_minutes} 分钟，最长间隔 {poller.max_interval / 60:g} 分钟")
+
+    results = [
+        ("固定轮询", simulate_polling(timelines, start, end, cycle_seconds)),
+        ("按活跃程度", simulate_polling(timelines, start, end, cycle_seconds, poller)),
+    ]
+    fixed_polls = results[0][1]["polls"]
+    for name, result in results:
+        delays = sorted(result["delays"])
+        missed = sum(1 for d in delays if d >= 10 * 60)
+        p95 = delays[int(len(delays) * 0.95)] if delays else 0
+        print(f"{name}：每周期平均请求 {result['polls'] / result['cycles']:.1f} 个用户（为固定轮询的 1/{fixed_polls / result['polls']:.1f}），"
+              f"发现 {len(delays)} 条提交，延迟中位数 {delays[len(delays) // 2] if delays else 0:.0f} 秒，"
+              f"95% {p95:.0f} 秒，超过10分钟（不再弹出通知）{missed} 条")
+
+async def benchmark_account_shards(users=40, account_counts=(1, 2, 4), requests_per_second_per_account=5):
+    """
+    在本地模拟服务器上测量多账号分片爬取的吞吐量
+
+    每个账号限速相同，吞吐量应随账号数近似线性增长，且每个账号的请求频率不超过限速
+    """
+    record_rows = make_synthetic_record_rows(users, 5)
+    user_ids = list(record_rows)
+    server = FakeLuoguServer(record_rows).start()
+    with tempfile.TemporaryDirectory() as work_dir:
+        cookie_path = os.path.join(work_dir, "cookies.json")
+        accounts = [str(100 + index) for index in range(max(account_counts))]
+        with open(cookie_path, "w", encoding="utf-8") as file:
+            json.dump([{"user_name": f"bench_{account_id}", "user_id": account_id,
+                        "cookies": [{"name": "_uid", "value": account_id, "expires": -1}]} for account_id in accounts], file)
+        try:
+            for account_count in account_counts:
+                server.requests_by_cookie.clear()
+                start = time.perf_counter()
+                results = await run_sharded_spider(
+                    accounts[:account_count], user_ids, cookie_path, 5,
+                    os.path.join(work_dir, "user_records.json"), 60,
+                    backend="http", base_url=server.base_url,
+                    requests_per_second_per_account=requests_per_second_per_account, existing_records=[]
+                )
+                elapsed = time.perf_counter() - start
+                assert sorted(result["user_id"] for result in results) == sorted(user_ids)
+                assert all(len(result["records"]) == 5 for result in results)
+                busiest = max(server.requests_by_cookie.values())
+                print(f"{account_count} 个账号：{elapsed:.2f} 秒，{users / elapsed * 60:.0f} 用户/分钟，"
+                      f"单账号最多 {busiest} 次请求（首次请求之后 {(busiest - 1) / elapsed:.1f} 次/秒，限速 {requests_per_second_per_account} 次/秒）")
+        finally:
+            server.stop()
+
+def serve_synthetic_records(users, records_per_user, ready_queue, stop_event, latency=0.0, error_rate=0.0, problems=0):
+    """在独立进程中运行模拟服务器，避免服务器与被测的爬虫争用同一个进程的 GIL"""
+    server = FakeLuoguServer(make_synthetic_record_rows(users, records_per_user), latency=latency, error_rate=error_rate,
+                             problems=make_synthetic_problems(problems) if problems else None).start()
+    ready_queue.put(server.base_url)
+    stop_event.wait()
+    server.stop()
+
+async def benchmark_crawl_workers(users=300, records_per_user=60, worker_counts=(1, 2, 4)):
+    """
+    在本地模拟服务器上测量多进程爬取的吞吐量（用户/分钟）
+
+    使用 HTTP 后端且不限速，测的是抓取和解析本身能跑多快；
+    每个用户 records_per_user 条记录，全部是新记录，需要翻页抓完
+    """
+    context = multiprocessing.get_context("spawn")
+    ready_queue, stop_event = context.Queue(), context.Event()
+    server_process = context.Process(target=serve_synthetic_records, args=(users, records_per_user, ready_queue, stop_event), daemon=True)
+    server_process.start()
+    base_url = ready_queue.get(timeout=30)
+    user_ids = [str(1000000 + index) for index in range(users)]
+    # 多给一页，抓到空页即说明已抓完
+    max_pages = records_per_user // RECORDS_PER_PAGE + 1
+    with tempfile.TemporaryDirectory() as work_dir:
+        cookie_path = os.path.join(work_dir, "cookies.json")
+        with open(cookie_path, "w", encoding="utf-8") as file:
+            json.dump([{"user_name": "bench", "user_id": "1", "cookies": []}], file)
+        records_path = os.path.join(work_dir, "user_records.json")
+        try:
+            report = []
+            for workers in worker_counts:
+                start = time.perf_counter()
+                if workers == 1:
+                    results = await run_spider("1", user_ids, cookie_path, max_pages, records_path, 60, backend="http",
+                                               base_url=base_url, requests_per_second=0, existing_records=[])
+                else:
+                    results = await run_multiprocess_spider("1", user_ids, workers, cookie_path, max_pages, records_path, 60,
+                                                            backend="http", base_url=base_url, requests_per_second=0, existing_records=[])
+                elapsed = time.perf_counter() - start
+                assert len(results) == users and all(len(result["records"]) == records_per_user for result in results)
+                report.append((workers, elapsed))
+            print(f"\n{users} 个用户，每用户 {max_pages} 页：")
+            for workers, elapsed in report:
+                print(f"{workers} 个进程：{elapsed:.2f} 秒，{users / elapsed * 60:.0f} 用户/分钟，"
+                      f"相对单进程 {report[0][1] / elapsed:.2f} 倍")
+        finally:
+            stop_event.set()
+            server_process.join(timeout=5)
+
+async def benchmark_persistence(users=500, records_per_user=100, writes=5):
+    """
+    对比两种保存记录的做法：事件循环被阻塞的时间，以及另一个线程同时读取时读到不完整文件的次数
+
+    旧做法：在事件循环中 json.dump(indent=2) 直接覆盖 user_records.json
+    新做法：事件循环只生成快照并提交，后台线程紧凑序列化后写临时文件、fsync、替换
+    """
+    users_data = users_from_dicts(make_synthetic_user_records(users, records_per_user))
+    print(f"合成记录：{users} 个用户 × {records_per_user} 条记录")
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "user_records.json")
+
+        def run_with_reader(save):
+            """写入 writes 次，同时另一个线程不停读取；返回 (每次阻塞秒数, 读取次数, 不完整次数)"""
+            stop = threading.Event()
+            reads = {"total": 0, "torn": 0}
+
+            def reader():
+                while not stop.is_set():
+                    try:
+                        with open(path, "r", encoding="utf-8") as file:
+                            json.load(file)
+                    except FileNotFoundError:
+                        continue
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        # 文件写到一半时可能截断在 JSON 中间，也可能截断在多字节字符中间
+                        reads["torn"] += 1
+                    reads["total"] += 1
+
+            thread = threading.Thread(target=reader, daemon=True)
+            thread.start()
+            blocked = []
+            for _ in range(writes):
+                start = time.perf_counter()
+                save()
+                blocked.append(time.perf_counter() - start)
+            return blocked, stop, thread, reads
+
+        def legacy_save():
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump(users_to_dicts(users_data), file, ensure_ascii=False, indent=2)
+
+        blocked, stop, thread, reads = run_with_reader(legacy_save)
+        stop.set()
+        thread.join()
+        print(f"旧做法（事件循环中原地写入）：每次阻塞 {sum(blocked) / writes * 1000:.0f} 毫秒，"
+              f"并发读取 {reads['total']} 次中 {reads['torn']} 次读到不完整文件")
+
+        writer = BackgroundJsonWriter()
+        store = JsonRecordStore(path, writer=writer)
+        start = time.perf_counter()
+        blocked, stop, thread, reads = run_with_reader(lambda: store.save(users_data))
+        writer.flush()
+        elapsed = time.perf_counter() - start
+        # 写完之后再读一段时间，覆盖替换前后的窗口
+        time.sleep(0.2)
+        stop.set()
+        thread.join()
+        writer.close()
+        print(f"新做法（后台原子写入）：每次阻塞 {sum(blocked) / writes * 1000:.0f} 毫秒，{writes} 次提交合并为 {writer.writes} 次写入，"
+              f"全部落盘 {elapsed * 1000:.0f} 毫秒；并发读取 {reads['total']} 次中 {reads['torn']} 次读到不完整文件")
+        with open(path, "r", encoding="utf-8") as file:
+            assert json.load(file) == users_to_dicts(users_data)
+
+async def benchmark_record_journal(users=1000, records_per_user=200, changed_users=50, new_per_user=3, cycles=5):
+    """
+    对比每周期重写整个快照与只追加增量日志的写入量和耗时，并测量启动时读取（重放）的峰值内存
+
+    每个周期 changed_users 个用户各有 new_per_user 条新记录；最后从快照 + 日志重新读取，应与内存中的记录一致
+    """
+    history = users_from_dicts(make_synthetic_user_records(users, records_per_user))
+    now = datetime.now()
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "user_records.json")
+        store = JsonRecordStore(path)
+        store.compact(history)
+        snapshot_bytes = os.path.getsize(path)
+
+        start = time.perf_counter()
+        for _ in range(cycles):
+            store.compact(history)
+        snapshot_seconds = (time.perf_counter() - start) / cycles
+
+        journal_bytes = 0
+        start = time.perf_counter()
+        for cycle in range(cycles):
+            new_records = [{
+                "user_id": user["user_id"], "user_name": user["user_name"],
+                "records": [Record(f"P{9000 + i}", (now + timedelta(minutes=cycle * new_per_user + i)).strftime("%Y-%m-%d %H:%M:00"), "新题目")
+                            for i in range(new_per_user, 0, -1)],
+            } for user in history[cycle * changed_users % users:][:changed_users]]
+            added_records = []
+            history = merge_records(history, new_records, added_records=added_records)
+            journal_bytes += store.journal.append(users_to_dicts(added_records))
+        journal_seconds = (time.perf_counter() - start) / cycles
+        print(f"每周期 {changed_users * new_per_user} 条新记录（共 {users * records_per_user} 条）：")
+        print(f"重写快照：{snapshot_bytes / 1024:.0f} KB、{snapshot_seconds * 1000:.0f} 毫秒/周期")
+        print(f"追加日志：{journal_bytes / cycles / 1024:.1f} KB、{journal_seconds * 1000:.1f} 毫秒/周期（含合并），"
+              f"写入量约为快照的 1/{snapshot_bytes * cycles / journal_bytes:.0f}")
+
+        expected = users_to_dicts(history)
+        del history
+        gc.collect()
+        loaded, legacy_mb = measure_peak_memory(lambda: users_from_dicts(JsonRecordStore(path).load()))
+        del loaded
+        gc.collect()
+        loaded, streamed_mb = measure_peak_memory(lambda: JsonRecordStore(path).load_users())
+        assert users_to_dicts(loaded) == expected, "重放后的记录与内存中的不一致"
+        print(f"启动读取（快照 + 重放 {cycles * changed_users} 行日志）峰值内存：整体解析后转换 {legacy_mb:.0f} MB，逐个用户流式转换 {streamed_mb:.0f} MB")
+
+def measure_peak_memory(build):
+    """返回 build() 的结果及执行过程中的峰值内存（MB）"""
+    tracemalloc.start()
+    result = build()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, peak / 1024 / 1024
+
+async def benchmark_record_detail(users=200, records_per_user=3000, clicks=50):
+    """
+    对比用户详情页两种分页做法的每次点击耗时（翻页 clicks 次）
+
+    旧做法：每次点击读取 user_records.json 和 problem_list.json，线性查找用户，切片后逐条复制并补充难度和颜色
+    新做法：UserRecordIndex 按用户建立一次行列表（难度和颜色预先算好），之后按游标取页
+    """
+    users_data = make_synthetic_user_records(users, records_per_user)
+    problem_map = {f"P{1000 + n}": DIFFICULTY_NAMES[1 + n % 7] for n in range(9000)}
+    build_index = lambda problems: {number: (difficulty, DIFFICULTY_NAMES.index(difficulty), "#bfbfbf") for number, difficulty in problems.items()}
+    unknown = ("未知", -1, "#bfbfbf")
+    uid = users_data[-1]["user_id"]
+    with tempfile.TemporaryDirectory() as work_dir:
+        records_path = os.path.join(work_dir, "user_records.json")
+        problem_path = os.path.join(work_dir, "problem_list.json")
+        with open(records_path, "w", encoding="utf-8") as file:
+            json.dump(users_data, file, ensure_ascii=False)
+        with open(problem_path, "w", encoding="utf-8") as file:
+            json.dump(problem_map, file, ensure_ascii=False)
+        del users_data
+
+        legacy_samples = []
+        for page in range(1, clicks + 1):
+            start = time.perf_counter()
+            with open(records_path, "r", encoding="utf-8") as file:
+                all_users = json.load(file)
+            with open(problem_path, "r", encoding="utf-8") as file:
+                problems = build_index(json.load(file))
+            target = next(user for user in all_users if user["user_id"] == uid)
+            legacy_page = []
+            for record in target["records"][(page - 1) * 10:page * 10]:
+                difficulty, _, color = problems.get(record["problem_number"], unknown)
+                legacy_page.append(dict(record, difficulty=difficulty, color=color))
+            legacy_samples.append(time.perf_counter() - start)
+            del all_users
+
+        index = UserRecordIndex(JsonRecordStore(records_path, cached=True), CachedJsonFile(problem_path, dict, build_index), unknown)
+        index.query(uid)
+        samples, cursor = [], None
+        for _ in range(clicks):
+            start = time.perf_counter()
+            result = index.query(uid, cursor)
+            samples.append(time.perf_counter() - start)
+            cursor = result["next_cursor"]
+        assert result["data"] == legacy_page, "两种做法最后一页的结果不一致"
+
+        filtered_samples, cursor = [], None
+        for _ in range(clicks):
+            start = time.perf_counter()
+            result = index.query(uid, cursor, min_lv=3, max_lv=4, prefix="P1")
+            filtered_samples.append(time.perf_counter() - start)
+            cursor = result["next_cursor"]
+        legacy_p50, legacy_p99 = samples_ms(legacy_samples)
+        p50, p99 = samples_ms(samples)
+        filtered_p50, filtered_p99 = samples_ms(filtered_samples)
+        print(f"{users} 个用户 × {records_per_user} 条记录，翻页 {clicks} 次：")
+        print(f"旧做法（每次读取文件）：p50 {legacy_p50:.1f} 毫秒，p99 {legacy_p99:.1f} 毫秒")
+        print(f"新做法（按用户索引 + 游标）：p50 {p50:.3f} 毫秒，p99 {p99:.3f} 毫秒；"
+              f"按难度和题号筛选：p50 {filtered_p50:.3f} 毫秒，p99 {filtered_p99:.3f} 毫秒（共 {result['total']} 条）")
+
+# 对比两次基准结果时，超过该比例的变差视为性能回退
+REGRESSION_THRESHOLD = 0.10
+
+def peak_rss_mb():
+    """本进程到目前为止的峰值常驻内存（MB），没有 resource 模块的平台（Windows）返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return round(peak / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+
+def histogram_ms(name, **labels):
+    """指标中某个耗时直方图的 (p50, p99)，单位毫秒；没有观测时为 (None, None)"""
+    histogram = METRICS.get(name, **labels)
+    if histogram is None:
+        return None, None
+    return tuple(round(histogram.quantile(q) * 1000, 2) for q in (0.5, 0.99))
+
+def samples_ms(samples):
+    """多轮耗时（秒）的 (p50, p99)，单位毫秒"""
+    samples = sorted(samples)
+    return tuple(round(percentile(samples, q) * 1000, 2) for q in (0.5, 0.99))
+
+def counter_value(name, **labels):
+    counter = METRICS.get(name, **labels)
+    return counter.value if counter is not None else 0
+
+async def run_benchmark_suite(output_path=None, users=200, records_per_user=60, latency=0.02, error_rate=0.02, problems=2000, rounds=20):
+    """
+    离线基准套件：在本地模拟服务器上依次测量 爬取记录 / 爬取题目列表 / 合并 / 清理 / 排行榜查询
+
+    参数:
+        output_path: 结果写入的 JSON 文件，为 None 时只打印；两次结果可用 compare 子命令对比
+        users / records_per_user: 模拟服务器上的用户数和每个用户的记录数
+        latency: 模拟服务器每个请求的延迟（秒）
+        error_rate: 模拟服务器返回 500 的概率（HTTP 后端会改用浏览器重试）
+        problems: 模拟题库的题目数（每页 50 道）
+        rounds: 合并、清理、排行榜查询各重复的轮数
+
+    结果:
+        {"config": 参数, "metrics": {指标名: 数值}}；指标名以 _per_minute / _per_second 结尾的越大越好，其余越小越好
+    """
+    config = {"users": users, "records_per_user": records_per_user, "latency": latency,
+              "error_rate": error_rate, "problems": problems, "rounds": rounds}
+    metrics = {}
+    context = multiprocessing.get_context("spawn")
+    ready_queue, stop_event = context.Queue(), context.Event()
+    server_process = context.Process(target=serve_synthetic_records, daemon=True,
+                                     args=(users, records_per_user, ready_queue, stop_event, latency, error_rate, problems))
+    server_process.start()
+    base_url = ready_queue.get(timeout=30)
+    user_ids = [str(1000000 + index) for index in range(users)]
+    max_pages = records_per_user // RECORDS_PER_PAGE + 1
+    previous_cwd = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        cookie_path = os.path.join(work_dir, "cookies.json")
+        with open(cookie_path, "w", encoding="utf-8") as file:
+            json.dump([{"user_name": "bench", "user_id": "1", "cookies": []}], file)
+        try:
+            # 1. 爬取记录（HTTP 后端、不限速，测抓取和解析本身）
+            METRICS.reset()
+            start = time.perf_counter()
+            results = await run_spider("1", user_ids, cookie_path, max_pages, os.path.join(work_dir, "user_records.json"), 60,
+                                       backend="http", base_url=base_url, requests_per_second=0, existing_records=[])
+            elapsed = time.perf_counter() - start
+            metrics["spider.users_per_minute"] = round(len(results) / elapsed * 60, 1)
+            metrics["spider.pages_per_second"] = round(counter_value("crawler_pages_fetched_total") / elapsed, 1)
+            metrics["spider.user_p50_ms"], metrics["spider.user_p99_ms"] = histogram_ms("crawler_user_seconds")
+            metrics["spider.page_p50_ms"], metrics["spider.page_p99_ms"] = histogram_ms("crawler_page_phase_seconds", backend="http", phase="navigate")
+            metrics["spider.failed_pages"] = counter_value("crawler_page_failures_total")
+            metrics["spider.browser_fallbacks"] = counter_value("crawler_retries_total", kind="browser_fallback")
+
+            # 2. 爬取题目列表（浏览器）
+            METRICS.reset()
+            problem_path = os.path.join(work_dir, "problem_list.json")
+            start = time.perf_counter()
+            try:
+                await get_problem(requests_per_second=0, checkpoint_dir=os.path.join(work_dir, "problem_checkpoint"),
+                                  output_path=problem_path, meta_path=os.path.join(work_dir, "problem_list_meta.json"),
+                                  page_deadline=10, base_url=base_url)
+            except Exception as e:
+                print(f"题目列表爬取失败，跳过：{str(e)[:80]}")
+            else:
+                elapsed = time.perf_counter() - start
+                histogram = METRICS.get("crawler_problem_page_seconds")
+                with open(problem_path, "r", encoding="utf-8") as file:
+                    metrics["problems.crawled"] = len(json.load(file))
+                metrics["problems.pages_per_second"] = round((histogram.count if histogram else 0) / elapsed, 2)
+                metrics["problems.page_p50_ms"], metrics["problems.page_p99_ms"] = histogram_ms("crawler_problem_page_seconds")
+        finally:
+            stop_event.set()
+            server_process.join(timeout=5)
+
+        # 3. 合并与清理：每轮 1/10 的用户各有 3 条新记录，历史每轮重建（合并会原地修改历史）
+        history_dicts = make_synthetic_user_records(users, records_per_user)
+        now = datetime.now()
+        merge_samples, clean_samples = [], []
+        for round_index in range(rounds):
+            history = users_from_dicts(history_dicts)
+            new_records = [{
+                "user_id": user["user_id"], "user_name": user["user_name"],
+                "records": [Record(f"P{9000 + i}", (now + timedelta(minutes=round_index * 3 + i)).strftime("%Y-%m-%d %H:%M:00"), "新题目")
+                            for i in range(3, 0, -1)],
+            } for user in history[:max(1, users // 10)]]
+            gc.collect()
+            start = time.perf_counter()
+            merged = merge_records(history, new_records)
+            merge_samples.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            clean_old_records(merged, 7)
+            clean_samples.append(time.perf_counter() - start)
+        metrics["merge.p50_ms"], metrics["merge.p99_ms"] = samples_ms(merge_samples)
+        metrics["clean.p50_ms"], metrics["clean.p99_ms"] = samples_ms(clean_samples)
+
+        # 4. 排行榜查询（界面接口，需要 pywebview）：首次调用建立统计，之后每次只查询
+        try:
+            from Main import Api
+        except ImportError as e:
+            print(f"未安装界面依赖，跳过排行榜查询：{e}")
+        else:
+            with open(os.path.join(work_dir, "user_records.json"), "w", encoding="utf-8") as file:
+                json.dump(history_dicts, file, ensure_ascii=False)
+            with open(os.path.join(work_dir, "problem_list.json"), "w", encoding="utf-8") as file:
+                json.dump({f"P{1000 + n}": DIFFICULTY_NAMES[1 + n % 7] for n in range(9000)}, file, ensure_ascii=False)
+            os.chdir(work_dir)
+            try:
+                api = Api()
+                start = time.perf_counter()
+                api.get_leaderboard_data(7, 0, 6)
+                metrics["leaderboard.first_ms"] = round((time.perf_counter() - start) * 1000, 2)
+                query_samples = []
+                for _ in range(rounds):
+                    start = time.perf_counter()
+                    response = api.get_leaderboard_data(7, 0, 6)
+                    query_samples.append(time.perf_counter() - start)
+                assert response["status"] == "success"
+                metrics["leaderboard.p50_ms"], metrics["leaderboard.p99_ms"] = samples_ms(query_samples)
+            finally:
+                os.chdir(previous_cwd)
+
+    metrics["peak_rss_mb"] = peak_rss_mb()
+    report = {"config": config, "metrics": metrics}
+    print("\n基准结果：")
+    for name, value in metrics.items():
+        print(f"  {name}: {value}")
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f"已写入 {output_path}")
+    return report
+
+def compare_results(old_path, new_path, threshold=REGRESSION_THRESHOLD):
+    """
+    对比两次基准结果，打印每个指标的变化
+
+    返回:
+        list: 变差超过 threshold 的指标名（_per_minute / _per_second 越大越好，其余越小越好）
+    """
+    with open(old_path, "r", encoding="utf-8") as file:
+        old = json.load(file)
+    with open(new_path, "r", encoding="utf-8") as file:
+        new = json.load(file)
+    if old.get("config") != new.get("config"):
+        print(f"注意：两次运行的参数不同\n  旧：{old.get('config')}\n  新：{new.get('config')}")
+
+    regressions = []
+    for name, old_value in old["metrics"].items():
+        new_value = new["metrics"].get(name)
+        if not isinstance(old_value, (int, float)) or not isinstance(new_value, (int, float)) or old_value == 0:
+            print(f"  {name}: {old_value} → {new_value}")
+            continue
+        change = (new_value - old_value) / old_value
+        higher_is_better = name.endswith(("_per_minute", "_per_second"))
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > threshold:
+            regressions.append(name)
+            flag = "  ← 回退"
+        print(f"  {name}: {old_value} → {new_value}（{change:+.1%}）{flag}")
+    for name in new["metrics"].keys() - old["metrics"].keys():
+        print(f"  {name}: （新增）{new['metrics'][name]}")
+    if regressions:
+        print(f"{len(regressions)} 项指标变差超过 {threshold:.0%}：{', '.join(regressions)}")
+    else:
+        print(f"没有指标变差超过 {threshold:.0%}")
+    return regressions
+
+BENCHMARKS = {
+    "extract": benchmark_record_extraction,
+    "index": benchmark_existing_index,
+    "pipeline": benchmark_record_pipeline,
+    "merge": benchmark_merge,
+    "polling": benchmark_adaptive_polling,
+    "shards": benchmark_account_shards,
+    "workers": benchmark_crawl_workers,
+    "persist": benchmark_persistence,
+    "journal": benchmark_record_journal,
+    "detail": benchmark_record_detail,
+}
+
+if __name__ == "__main__":
+    # python Benchmark.py suite [结果.json]：离线基准套件
+    # python Benchmark.py compare 旧结果.json 新结果.json：对比两次结果，有回退时退出码为 1
+    if sys.argv[1:2] == ["suite"]:
+        asyncio.run(run_benchmark_suite(*sys.argv[2:3]))
+    elif sys.argv[1:2] == ["compare"]:
+        sys.exit(1 if compare_results(sys.argv[2], sys.argv[3]) else 0)
+    else:
+        names = sys.argv[1:] or list(BENCHMARKS)
+        for name in names:
+            asyncio.run(BENCHMARKS[name]())
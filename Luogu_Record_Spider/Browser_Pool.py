@@ -0,0 +1,174 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+from Record_Parser import LUOGU_BASE_URL
+
+# 只读取文本时用不到的资源类型
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font", "stylesheet", "texttrack", "manifest"})
+
+class ResourceBlocker:
+    """
+    浏览器上下文的请求路由：拦截用不到的资源和第三方请求，并统计流量
+
+    参数:
+        first_party_url: 站点地址，与它同一主域名（如 *.luogu.com.cn）的请求才放行
+        allow: 调试用的白名单，可以是资源类型（如 "image"）或主机名，命中的请求一律放行
+
+    功能:
+        1. 拦截图片、字体、样式表等资源类型以及统计、广告等第三方主机
+        2. 统计放行和拦截的请求数、按类型的拦截数以及接收的字节数
+    """
+    def __init__(self, first_party_url=LUOGU_BASE_URL, allow=()):
+        self.host = urlsplit(first_party_url).hostname or ""
+        self.root_domain = self.host[4:] if self.host.startswith("www.") else self.host
+        self.allow = frozenset(allow)
+        self.allowed_requests = 0
+        self.blocked_requests = 0
+        self.blocked_by_type = {}
+        self.bytes_received = 0
+
+    def should_block(self, resource_type, url):
+        host = urlsplit(url).hostname or ""
+        if resource_type in self.allow or host in self.allow:
+            return False
+        if resource_type in BLOCKED_RESOURCE_TYPES:
+            return True
+        return not (host == self.host or host == self.root_domain or host.endswith("." + self.root_domain))
+
+    async def attach(self, context):
+        """在浏览器上下文上注册请求路由和流量统计"""
+        await context.route("**/*", self._route)
+        context.on("requestfinished", self._count_bytes)
+
+    async def _route(self, route):
+        request = route.request
+        if self.should_block(request.resource_type, request.url):
+            self.blocked_requests += 1
+            self.blocked_by_type[request.resource_type] = self.blocked_by_type.get(request.resource_type, 0) + 1
+            await route.abort()
+        else:
+            self.allowed_requests += 1
+            await route.continue_()
+
+    async def _count_bytes(self, request):
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            return
+        self.bytes_received += sizes.get("responseBodySize", 0) + sizes.get("responseHeadersSize", 0)
+
+    def snapshot(self):
+        return {
+            "allowed": self.allowed_requests, "blocked": self.blocked_requests,
+            "bytes": self.bytes_received, "blocked_by_type": dict(self.blocked_by_type),
+        }
+
+    def print_report(self, since=None, label="本次爬取"):
+        """输出自 since（snapshot 的返回值）以来的请求与流量统计"""
+        now = self.snapshot()
+        since = since or {"allowed": 0, "blocked": 0, "bytes": 0, "blocked_by_type": {}}
+        by_type = {
+            resource_type: count - since["blocked_by_type"].get(resource_type, 0)
+            for resource_type, count in now["blocked_by_type"].items()
+        }
+        detail = "，".join(f"{resource_type} {count}" for resource_type, count in sorted(by_type.items()) if count)
+        print(f"{label}：放行请求 {now['allowed'] - since['allowed']} 个，拦截 {now['blocked'] - since['blocked']} 个"
+              f"{f'（{detail}）' if detail else ''}，接收 {(now['bytes'] - since['bytes']) / 1024:.1f} KB")
+
+class BrowserPool:
+    """
+    跨监控周期复用的浏览器及页面池
+
+    参数:
+        launcher: 异步函数，返回 (playwright实例, browser实例, context实例)
+        max_idle_pages: 最多保留的空闲页面数
+        resource_blocker: 可选的 ResourceBlocker，由 launcher 挂到上下文上，这里只保存以便输出统计
+
+    功能:
+        1. 浏览器只在首次使用或崩溃后启动，其余周期直接复用
+        2. 页面用完后放回池中，下一个用户直接取用
+        3. 统计启动次数以及复用节省的启动时间
+    """
+    def __init__(self, launcher, max_idle_pages=10, resource_blocker=None):
+        self.launcher = launcher
+        self.max_idle_pages = max_idle_pages
+        self.resource_blocker = resource_blocker
+        self.p, self.browser, self.context = None, None, None
+        self._idle_pages = []
+        self._crashed_pages = set()
+        self._lock = asyncio.Lock()
+        self.launch_count = 0
+        self.reuse_count = 0
+        self.last_launch_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    def is_healthy(self):
+        return self.browser is not None and self.browser.is_connected()
+
+    async def ensure(self):
+        """
+        确保浏览器可用：健康时直接复用，首次使用或崩溃后重新启动
+
+        返回:
+            float: 本次复用节省的启动时间（秒），重新启动时为 0
+        """
+        async with self._lock:
+            if self.is_healthy():
+                self.reuse_count += 1
+                self.saved_seconds += self.last_launch_seconds
+                return self.last_launch_seconds
+
+            if self.launch_count:
+                print("浏览器已断开，正在重新启动")
+            await self._shutdown()
+
+            start = time.perf_counter()
+            self.p, self.browser, self.context = await self.launcher()
+            self.last_launch_seconds = time.perf_counter() - start
+            self.launch_count += 1
+            print(f"浏览器启动完成，耗时 {self.last_launch_seconds:.2f} 秒")
+            return 0.0
+
+    async def acquire_page(self):
+        """从池中取出一个可用页面，没有时新建"""
+        while self._idle_pages:
+            page = self._idle_pages.pop()
+            if not page.is_closed() and page not in self._crashed_pages:
+                return page
+        page = await self.context.new_page()
+        page.on("crash", lambda crashed: self._crashed_pages.add(crashed))
+        return page
+
+    async def release_page(self, page):
+        """归还页面；已崩溃的页面或池已满时直接关闭"""
+        if page.is_closed():
+            self._crashed_pages.discard(page)
+            return
+        if page in self._crashed_pages or not self.is_healthy() or len(self._idle_pages) >= self.max_idle_pages:
+            self._crashed_pages.discard(page)
+            try:
+                await page.close()
+            except Exception:
+                pass
+            return
+        self._idle_pages.append(page)
+
+    async def _shutdown(self):
+        self._idle_pages.clear()
+        self._crashed_pages.clear()
+        for resource in (self.context, self.browser):
+            if resource is not None:
+                try:
+                    await resource.close()
+                except Exception:
+                    pass
+        if self.p is not None:
+            try:
+                await self.p.stop()
+            except Exception:
+                pass
+        self.p, self.browser, self.context = None, None, None
+
+    async def close(self):
+        async with self._lock:
+            await self._shutdown()
@@ -0,0 +1,121 @@
+import json
+from Data_Cache import write_json_atomic
+from Record_Types import parse_post_date
+
+class Watermark:
+    """
+    单个用户的抓取水位线：已抓取到的最新提交时间，以及该时刻的记录标识
+
+    说明:
+        同一秒内可能有多条提交，只比较时间会漏掉同一秒的新记录，
+        因此同时保存水位线时刻的全部记录标识（题号, 提交时间）
+    """
+    __slots__ = ("timestamp", "post_date", "keys")
+
+    def __init__(self, post_date, keys=()):
+        self.post_date = post_date
+        self.timestamp = parse_post_date(post_date)
+        self.keys = {tuple(key) for key in keys}
+
+    @classmethod
+    def from_records(cls, records):
+        """根据一批记录建立水位线（取时间最新的记录），没有可用记录时返回 None"""
+        newest = None
+        for record in records:
+            if record.timestamp is not None and (newest is None or record.timestamp > newest.timestamp):
+                newest = record
+        if newest is None:
+            return None
+        keys = [(r.problem_number, r.post_date) for r in records if r.timestamp == newest.timestamp]
+        return cls(newest.post_date, keys)
+
+    def crossed(self, record):
+        """记录是否已在水位线之下（即上次已经抓取过）"""
+        if record.timestamp is None:
+            return False
+        if record.timestamp != self.timestamp:
+            return record.timestamp < self.timestamp
+        return (record.problem_number, record.post_date) in self.keys
+
+    def advance(self, other):
+        """返回两条水位线中较新的一条（同一时刻时合并记录标识）"""
+        if other is None:
+            return self
+        if other.timestamp > self.timestamp:
+            return other
+        if other.timestamp == self.timestamp and not other.keys <= self.keys:
+            merged = Watermark(self.post_date, self.keys)
+            merged.keys |= other.keys
+            return merged
+        return self
+
+    def to_dict(self):
+        return {"post_date": self.post_date, "keys": sorted(list(key) for key in self.keys)}
+
+class CrawlCursors:
+    """
+    持久化的每用户抓取水位线
+
+    参数:
+        path: 水位线文件路径
+
+    功能:
+        1. 每个周期只需抓到越过水位线为止
+        2. 只有连续抓到水位线（或时间阈值、最后一页）的用户才推进水位线，
+           抓取失败、超时或达到页数上限时保持原水位线，下个周期重新补齐
+        3. 记录保存成功之后再保存水位线，水位线不会超前于已保存的记录
+    """
+    def __init__(self, path="crawl_cursors.json"):
+        self.path = path
+        self._cursors = {}
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = {}
+        for user_id, cursor in data.items():
+            watermark = Watermark(cursor.get("post_date", ""), cursor.get("keys", []))
+            if watermark.timestamp is not None:
+                self._cursors[user_id] = watermark
+
+    def get(self, user_id):
+        return self._cursors.get(str(user_id))
+
+    def seed(self, existing_records):
+        """没有水位线的用户根据已有记录建立水位线（首次启用或水位线文件丢失时）"""
+        seeded = 0
+        for user in existing_records:
+            user_id = str(user.get("user_id"))
+            if user_id in self._cursors:
+                continue
+            watermark = Watermark.from_records(user.get("records", []))
+            if watermark is not None:
+                self._cursors[user_id] = watermark
+                seeded += 1
+        return seeded
+
+    def update(self, crawl_results):
+        """根据本周期的爬取结果推进水位线，返回推进的用户数"""
+        advanced = 0
+        for result in crawl_results:
+            watermark = result.get("watermark")
+            if not result.get("complete") or watermark is None:
+                continue
+            user_id = str(result["user_id"])
+            current = self._cursors.get(user_id)
+            new = watermark if current is None else current.advance(watermark)
+            if new is not current:
+                self._cursors[user_id] = new
+                advanced += 1
+        return advanced
+
+    def save(self, writer=None):
+        """保存水位线；提供 writer（BackgroundJsonWriter）时交给后台线程，排在已提交的记录文件之后写入"""
+        data = {user_id: watermark.to_dict() for user_id, watermark in self._cursors.items()}
+        if writer is not None:
+            writer.submit(self.path, data)
+        else:
+            write_json_atomic(self.path, data)
+
+    def __len__(self):
+        return len(self._cursors)
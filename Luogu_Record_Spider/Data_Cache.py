@@ -0,0 +1,260 @@
+import json
+import os
+import threading
+import time
+import traceback
+from Metrics import METRICS
+
+class CachedJsonFile:
+    """
+    按修改时间和大小缓存的 JSON 文件
+
+    参数:
+        path: 文件路径
+        default_factory: 文件不存在时返回的默认值，例如 dict / list
+        build_index: 可选函数，每次重新加载后根据文档建立派生索引
+
+    功能:
+        1. 文件的修改时间和大小都没变时直接返回内存中的文档（命中）
+        2. 变化时重新解析并重建索引（未命中），日志中输出命中/未命中次数
+        3. 文件正在被写入导致解析失败时沿用上一次的文档，下次再重试
+    注意:
+        返回的文档和索引被多个调用方共享，调用方不能修改
+    """
+    def __init__(self, path, default_factory=dict, build_index=None):
+        self.path = path
+        self.default_factory = default_factory
+        self.build_index = build_index
+        self.hits = 0
+        self.misses = 0
+        self.version = 0
+        self._signature = None
+        self._document = default_factory()
+        self._index = build_index(self._document) if build_index else None
+        self._lock = threading.Lock()
+
+    def _current_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self):
+        signature = self._current_signature()
+        if signature == self._signature and self.version:
+            self.hits += 1
+            return
+
+        self.misses += 1
+        if signature is None:
+            document = self.default_factory()
+        else:
+            try:
+                with open(self.path, "r", encoding="utf-8") as file:
+                    document = json.load(file)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"[缓存] 读取 {self.path} 失败，沿用上一次的数据: {e}")
+                return
+
+        self._document = document
+        self._index = self.build_index(document) if self.build_index else None
+        self._signature = signature
+        self.version += 1
+        print(f"[缓存] 已重新加载 {self.path}（命中 {self.hits} 次，未命中 {self.misses} 次）")
+
+    def get(self):
+        """返回最新的文档"""
+        with self._lock:
+            self._refresh()
+            return self._document
+
+    def index(self):
+        """返回最新文档的派生索引"""
+        with self._lock:
+            self._refresh()
+            return self._index
+
+    def stats(self):
+        return {"path": self.path, "hits": self.hits, "misses": self.misses, "version": self.version}
+
+def write_json_atomic(path, data, indent=2):
+    """先写入同目录下的临时文件再替换，写入中途退出不会损坏原文件，读取方也不会读到写了一半的文件"""
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(data, file, ensure_ascii=False, indent=indent)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+def iter_json_array(file, chunk_size=1 << 20):
+    """
+    逐个解析文件中 JSON 数组的元素（元素为对象或数组），每次只读入 chunk_size 个字符，不需要整个文件的文本
+
+    文件内容不是数组或格式错误时抛出 json.JSONDecodeError
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, started = "", 0, False
+    while True:
+        # 跳过空白和分隔符，缓冲区用完时继续读
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position == len(buffer):
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise json.JSONDecodeError("数组没有结束", buffer, position)
+            buffer, position = chunk, 0
+            continue
+        if not started:
+            if buffer[position] != "[":
+                raise json.JSONDecodeError("不是 JSON 数组", buffer, position)
+            started = True
+            position += 1
+            continue
+        if buffer[position] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # 元素被读入边界截断，补读后从该元素开头重新解析
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield item
+        position = end
+
+class BackgroundJsonWriter:
+    """
+    后台 JSON 写入线程
+
+    参数:
+        indent: 写入时的缩进，默认 None（紧凑格式，序列化更快、文件更小）
+
+    功能:
+        1. submit / append 只登记任务并立即返回，生成数据、序列化和写盘都在后台线程完成，不阻塞事件循环
+        2. 任务按提交顺序执行；同一批中同一文件被多次 submit 时只写最后一次，相邻的多次 append 合并为一次写入
+        3. 每次 submit 都经 write_json_atomic（临时文件 + fsync + 替换），读取方不会读到写了一半的文件
+        4. 某个任务因磁盘错误（OSError）失败时，它和同一批中排在它之后的任务保留到下一批重试（与新提交的任务一起合并），
+           例如增量日志追加失败时不会先写入水位线；其他异常重试也无济于事，输出堆栈后只丢弃该任务，写入线程继续运行
+    注意:
+        提交的数据由写入线程读取，调用方提交后不能再修改（需要时先复制一份，或提交生成数据的函数）
+    """
+    def __init__(self, indent=None):
+        self.indent = indent
+        self.writes = 0
+        self.coalesced = 0
+        self._pending = []
+        self._failed = []
+        self._busy = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="json-writer", daemon=True)
+        self._thread.start()
+
+    def _add(self, job):
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("写入线程已关闭")
+            self._pending.append(job)
+            self._condition.notify_all()
+
+    def submit(self, path, data, before=None, after=None):
+        """
+        登记 path 的新内容，同一批中更早提交的内容不再写入
+
+        参数:
+            data: 要写入的文档，或在写入线程中调用、返回文档的无参函数
+            before / after: 可选的无参函数，在写入线程中紧接着写入之前 / 成功写入之后调用
+        """
+        self._add({"kind": "write", "path": path, "data": data, "before": before, "after": after})
+
+    def append(self, path, items, write):
+        """登记追加到 path 的若干项，写入线程调用 write(items)；与前一个任务都是追加同一文件时合并为一次调用"""
+        self._add({"kind": "append", "path": path, "items": list(items), "write": write})
+
+    def _coalesce(self, batch):
+        """去掉被同一批中后提交的内容覆盖的写入，合并相邻的追加"""
+        last_write = {job["path"]: position for position, job in enumerate(batch) if job["kind"] == "write"}
+        jobs = []
+        for position, job in enumerate(batch):
+            if job["kind"] == "write" and last_write[job["path"]] != position:
+                merged = True
+            elif job["kind"] == "append" and jobs and jobs[-1]["kind"] == "append" and jobs[-1]["path"] == job["path"]:
+                jobs[-1] = {**jobs[-1], "items": jobs[-1]["items"] + job["items"]}
+                merged = True
+            else:
+                jobs.append(job)
+                merged = False
+            if merged:
+                self.coalesced += 1
+                METRICS.counter("storage_coalesced_writes_total", "被同一批的其他提交合并、没有单独写入的次数").inc()
+        return jobs
+
+    def _execute(self, job):
+        start = time.perf_counter()
+        if job["kind"] == "append":
+            if job["items"]:
+                job["write"](job["items"])
+        else:
+            if job["before"] is not None:
+                job["before"]()
+            data = job["data"]() if callable(job["data"]) else job["data"]
+            write_json_atomic(job["path"], data, indent=self.indent)
+            if job["after"] is not None:
+                job["after"]()
+        self.writes += 1
+        METRICS.histogram("storage_write_seconds", "后台写入单个文件的耗时（秒）").observe(time.perf_counter() - start)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._closed)
+                if not self._pending and not self._failed:
+                    return
+                # 上一批失败的任务排在新任务之前；关闭时失败的任务只再试这一次
+                batch, self._pending, self._failed = self._failed + self._pending, [], []
+                closing = self._closed
+                self._busy = True
+            try:
+                jobs = self._coalesce(batch)
+                for position, job in enumerate(jobs):
+                    try:
+                        self._execute(job)
+                    except OSError as e:
+                        remaining = jobs[position:]
+                        skipped = [other["path"] for other in remaining[1:]]
+                        print(f"[写入] 保存 {job['path']} 失败: {e}" + (f"，本批未写入：{', '.join(skipped)}" if skipped else "")
+                              + ("" if closing else "，下次提交时重试"))
+                        if not closing:
+                            with self._condition:
+                                self._failed = remaining
+                        break
+                    except Exception:
+                        # 不是磁盘错误（如数据无法序列化、回调出错），重试也会再次失败：丢弃该任务，继续执行后面的任务
+                        print(f"[写入] 保存 {job['path']} 出错，已丢弃该任务:")
+                        traceback.print_exc()
+            except Exception:
+                print("[写入] 合并写入任务出错，已丢弃本批任务:")
+                traceback.print_exc()
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """等待已提交的任务全部执行完（失败保留到下一批的任务不等待），超时返回 False"""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending and not self._busy, timeout)
+
+    def close(self, timeout=None):
+        """执行完已提交的任务（包括上一批失败的任务）后结束写入线程"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+
+def build_user_index(users_data):
+    """user_records.json 的派生索引：用户ID（字符串）→ 用户对象"""
+    return {str(user.get("user_id")): user for user in users_data}
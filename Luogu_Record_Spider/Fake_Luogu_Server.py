@@ -0,0 +1,227 @@
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from Record_Parser import RECORDS_PER_PAGE, DIFFICULTY_NAMES, format_timestamp
+
+# 题目列表每页的题目数（与洛谷一致）
+PROBLEMS_PER_PAGE = 50
+
+def render_record_row(user_name, record):
+    """按洛谷记录列表的行文本格式生成一行（与 parse_record_row 的偏移量对应）"""
+    lines = [
+        "",
+        "  " + user_name,
+        "",
+        " " * 12 + record["post_date"][:16],
+        "", "", "", "",
+        "    " + record["problem_number"],
+        "    " + record["problem_name"],
+    ]
+    return "<div>" + "\n".join(lines) + "</div>"
+
+def render_record_list_page(user_name, records, payload=None):
+    """
+    生成与洛谷记录列表 DOM 结构一致的页面
+
+    参数:
+        user_name: 用户名
+        records: 记录字典列表（post_date / problem_number / problem_name）
+        payload: 可选的页面数据，写入 lentille-context 脚本标签
+    """
+    rows = "".join(render_record_row(user_name, record) for record in records)
+    context = ""
+    if payload is not None:
+        context = ('<script id="lentille-context" type="application/json">'
+                   + json.dumps({"template": "record.list", "data": payload}, ensure_ascii=False)
+                   + "</script>")
+    return (
+        '<html><head><meta charset="utf-8"></head><body><div id="app"><div></div><div><main><div><div><div>'
+        f'<div><div>{rows}</div></div><div></div>'
+        f'</div></div></div></main></div></div>{context}</body></html>'
+    )
+
+def render_problem_list_page(problems, payload=None):
+    """
+    生成与洛谷题目列表 DOM 结构一致的页面（每行第二列为题号，div.difficulty 内为难度名称）
+
+    参数:
+        problems: 本页的洛谷原始题目列表
+        payload: 可选的页面数据，写入 lentille-context 脚本标签
+    """
+    rows = "".join(
+        f'<div><div></div><div>{problem["pid"]}</div><div>{problem["title"]}</div>'
+        f'<div class="difficulty"><span><span>{DIFFICULTY_NAMES[problem["difficulty"]]}</span></span></div></div>'
+        for problem in problems
+    )
+    context = ""
+    if payload is not None:
+        context = ('<script id="lentille-context" type="application/json">'
+                   + json.dumps({"template": "problem.list", "data": payload}, ensure_ascii=False)
+                   + "</script>")
+    return (
+        '<html><head><meta charset="utf-8"></head><body><div id="app">'
+        f'<div class="list-wrap table border overflow"><div class="row-wrap">{rows}</div></div>'
+        f'</div>{context}</body></html>'
+    )
+
+def load_fixture(path):
+    """读取录制的记录列表数据：{用户ID: [洛谷原始记录, ...]}"""
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+def make_synthetic_record_rows(users, records_per_user, first_user_id=1000000, now=None):
+    """
+    生成洛谷原始记录格式的合成数据：{用户ID: [记录, ...]}，每个用户的记录按提交时间倒序、间隔 10 分钟
+    """
+    now = int(time.time()) if now is None else now
+    record_rows = {}
+    for index in range(users):
+        user_id = first_user_id + index
+        record_rows[str(user_id)] = [{
+            "id": user_id * 1000 + n, "status": 12, "score": 100, "submitTime": now - n * 600 - index,
+            "problem": {"pid": f"P{1000 + (index + n) % 9000}", "title": f"题目 {(index + n) % 9000}", "difficulty": (index + n) % 8, "type": "P"},
+            "user": {"uid": user_id, "name": f"user_{user_id}"},
+        } for n in range(records_per_user)]
+    return record_rows
+
+def make_synthetic_problems(count):
+    """生成洛谷原始题目格式的合成题库：[{pid, title, difficulty, type}, ...]，题号从 P1000 开始"""
+    return [{"pid": f"P{1000 + n}", "title": f"题目 {n}", "difficulty": n % len(DIFFICULTY_NAMES), "type": "P"}
+            for n in range(count)]
+
+class FakeLuoguServer:
+    """
+    本地洛谷模拟服务器，用于在不访问 luogu.com.cn 的情况下验证和测量爬虫
+
+    参数:
+        record_rows: {用户ID: [洛谷原始记录, ...]}，记录按提交时间倒序排列
+        host / port: 监听地址，端口为 0 时自动分配
+        latency: 每个请求返回前等待的秒数，用于模拟网络和服务端耗时
+        error_rate: 请求返回 500 的概率（固定随机种子，多次运行结果一致）
+        problems: 题库（洛谷原始题目列表），用于 /problem/list；为 None 时只有记录中出现过的题目
+
+    说明:
+        /problem/<题号> 返回题目（题号、标题、难度）
+        /problem/list?page=N 按题库顺序分页，每页 50 道
+    """
+    def __init__(self, record_rows, host="127.0.0.1", port=0, latency=0.0, error_rate=0.0, problems=None):
+        self.record_rows = record_rows
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(0)
+        self.problem_list = list(problems or [])
+        self.problems = {problem["pid"]: problem for problem in self.problem_list}
+        for rows in record_rows.values():
+            for row in rows:
+                problem = row.get("problem") or {}
+                if problem.get("pid"):
+                    self.problems.setdefault(problem["pid"], problem)
+        if not self.problem_list:
+            self.problem_list = sorted(self.problems.values(), key=lambda problem: problem["pid"])
+        self.request_count = 0
+        self.error_count = 0
+        self.requests_by_cookie = {}
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                cookie = self.headers.get("Cookie", "")
+                with server._lock:
+                    server.request_count += 1
+                    server.requests_by_cookie[cookie] = server.requests_by_cookie.get(cookie, 0) + 1
+                    failed = server.error_rate > 0 and server._random.random() < server.error_rate
+                    if failed:
+                        server.error_count += 1
+                if server.latency > 0:
+                    time.sleep(server.latency)
+                if failed:
+                    status, content_type, body = 500, "text/plain", "internal server error"
+                else:
+                    status, content_type, body = server.handle(self.path)
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handle(self, raw_path):
+        parts = urlsplit(raw_path)
+        query = parse_qs(parts.query)
+        if parts.path == "/problem/list":
+            return self.handle_problem_list(query)
+        if parts.path.startswith("/problem/"):
+            return self.handle_problem(parts.path[len("/problem/"):])
+        if parts.path != "/record/list":
+            return 404, "text/plain", "not found"
+
+        user_id = query.get("user", [""])[0]
+        page_num = int(query.get("page", ["1"])[0])
+        rows = self.record_rows.get(user_id, [])
+        start = (page_num - 1) * RECORDS_PER_PAGE
+        page_rows = rows[start:start + RECORDS_PER_PAGE]
+        payload = {"records": {"result": page_rows, "count": len(rows), "perPage": RECORDS_PER_PAGE}}
+
+        if query.get("_contentOnly"):
+            document = {"code": 200, "currentTemplate": "RecordList", "currentData": payload}
+            return 200, "application/json; charset=utf-8", json.dumps(document, ensure_ascii=False)
+
+        records = [{
+            "post_date": format_timestamp(row["submitTime"]),
+            "problem_number": row["problem"]["pid"],
+            "problem_name": row["problem"]["title"],
+        } for row in page_rows]
+        user_name = page_rows[0]["user"]["name"] if page_rows else ""
+        return 200, "text/html; charset=utf-8", render_record_list_page(user_name, records, payload)
+
+    def handle_problem_list(self, query):
+        page_num = int(query.get("page", ["1"])[0])
+        start = (page_num - 1) * PROBLEMS_PER_PAGE
+        page_problems = self.problem_list[start:start + PROBLEMS_PER_PAGE]
+        payload = {"problems": {"result": page_problems, "count": len(self.problem_list), "perPage": PROBLEMS_PER_PAGE}}
+        if query.get("_contentOnly"):
+            document = {"code": 200, "currentTemplate": "ProblemList", "currentData": payload}
+            return 200, "application/json; charset=utf-8", json.dumps(document, ensure_ascii=False)
+        return 200, "text/html; charset=utf-8", render_problem_list_page(page_problems, payload)
+
+    def handle_problem(self, problem_number):
+        problem = self.problems.get(problem_number)
+        if problem is None:
+            return 404, "text/plain", "not found"
+        document = {"code": 200, "currentTemplate": "ProblemShow", "currentData": {"problem": problem}}
+        return 200, "application/json; charset=utf-8", json.dumps(document, ensure_ascii=False)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+if __name__ == "__main__":
+    server = FakeLuoguServer(load_fixture("fixtures/record_list.json"), port=8765).start()
+    print(f"模拟服务器已启动：{server.base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
@@ -3,118 +3,220 @@ import json
 import time
 import os
 from datetime import datetime, timedelta
-from playwright.async_api import async_playwright,expect
+from Spider_Scheduler import SpiderScheduler
+from Problem_Checkpoint import ProblemCrawlCheckpoint
+from Data_Cache import write_json_atomic
+from Problem_Refresh import merge_fetch_times
+from Browser_Pool import ResourceBlocker
+from Metrics import METRICS
+from Record_Parser import LUOGU_BASE_URL, parse_problem_list_payload
 
-async def create_browser_context(headless=True):
-    # 启动Playwright和浏览器
+# 题目列表页面路径及每页的题目数
+PROBLEM_LIST_PATH = "/problem/list?type=luogu&page={page}"
+PROBLEMS_PER_PAGE = 50
+PROBLEM_ROWS_SELECTOR = "div.list-wrap.table.border.overflow > div.row-wrap"
+
+# 页面内嵌数据或题目列表容器出现后即可读取（列表末尾之后的页没有行，但有内嵌数据）
+PROBLEM_LIST_READY_SCRIPT = "(rowsSelector) => !!(document.getElementById('lentille-context') || window._feInjection || document.querySelector(rowsSelector))"
+
+# 一次 evaluate 取出整页数据：优先读取页面内嵌的 JSON，同时读取每行的题号和难度文本
+PROBLEM_LIST_EXTRACT_SCRIPT = """
+(rowsSelector) => {
+    const result = {payload: null, rows: null};
+    const context = document.getElementById('lentille-context');
+    if (context) {
+        try { result.payload = JSON.parse(context.textContent).data; } catch (e) {}
+    }
+    if (!result.payload && window._feInjection) {
+        result.payload = window._feInjection.currentData;
+    }
+    const container = document.querySelector(rowsSelector);
+    if (container) {
+        result.rows = Array.from(container.children, row => {
+            const problem = row.querySelector(':scope > div:nth-child(2)');
+            const difficulty = row.querySelector(':scope > div.difficulty > span > span');
+            return [problem ? problem.textContent.trim() : '', difficulty ? difficulty.textContent.trim() : ''];
+        });
+    }
+    return result;
+}
+"""
+
+async def create_browser_context(headless=True, resource_blocker=None):
+    # 启动Playwright和浏览器（只在用到浏览器时导入）
+    from playwright.async_api import async_playwright
     p = await async_playwright().start()
     browser = await p.chromium.launch(headless=headless)
     
-    # 创建上下文并添加cookies
+    # 创建上下文（可选拦截图片、字体、样式表和第三方请求）
     context = await browser.new_context()
+    if resource_blocker is not None:
+        await resource_blocker.attach(context)
     return p, browser, context
 
-async def visit_problem_list(context, spider_page):
-    should_stop = False
-    problem_dict = {}
+def read_problem_rows(result, spider_page):
+    """
+    从一次批量读取的结果中取出本页的题目
+
+    返回:
+        tuple: (题目字典, 是否到达列表末尾, 结果是否确定)，页面还没渲染完整时返回 None；
+        来自页面内嵌数据的结果是确定的，来自行文本且不满一页时需要再读一次确认
+    """
+    page_data = parse_problem_list_payload(result.get("payload"))
+    if page_data is not None and len(page_data["problems"]) == page_data["row_count"]:
+        count = page_data["count"]
+        reached_end = page_data["row_count"] < PROBLEMS_PER_PAGE or (isinstance(count, int) and spider_page * PROBLEMS_PER_PAGE >= count)
+        return page_data["problems"], reached_end, True
+
+    rows = result.get("rows")
+    if rows is None or any(not problem or not difficulty for problem, difficulty in rows):
+        return None
+    return dict(rows), len(rows) < PROBLEMS_PER_PAGE, len(rows) == PROBLEMS_PER_PAGE
+
+async def visit_problem_list(context, spider_page, attempts=5, backoff=0.25, deadline=60, base_url=LUOGU_BASE_URL):
+    """
+    爬取一页题目列表
+
+    参数:
+        context: 浏览器上下文
+        spider_page: 页码
+        attempts: 读取的最多次数，页面未渲染完整时按 backoff × 2^n 秒退避后重读
+        backoff: 首次退避的秒数
+        deadline: 本页的总时限（秒），包括打开页面和所有重读
+        base_url: 站点地址（基准测试时指向本地模拟服务器）
+
+    返回:
+        list: [是否到达列表末尾, {题号: 难度}]；超过次数或时限仍不完整时抛出异常，由调用方记为失败页
+    """
+    loop = asyncio.get_running_loop()
+    deadline_at = loop.time() + deadline
     page = await context.new_page()
-    url = f"https://www.luogu.com.cn/problem/list?type=luogu&page={spider_page}"
-    await page.goto(url)
+    try:
+        await page.goto(base_url + PROBLEM_LIST_PATH.format(page=spider_page), timeout=deadline * 1000)
+        await page.wait_for_function(PROBLEM_LIST_READY_SCRIPT, arg=PROBLEM_ROWS_SELECTOR, timeout=max(deadline_at - loop.time(), 0.001) * 1000)
 
-    # 等待页面加载完成的断言
-    await expect(page).to_have_url(url)
-    
-    # 等待主要内容区域加载完成
-    main_content_locator = page.locator("#app > div.main-container.lside-nav > main > div > div > div > div.l-card.main")
-    await expect(main_content_locator).to_be_visible()
-    await expect(main_content_locator).not_to_be_empty()
-    
-    # 等待问题列表加载完成
-    problem_list_locator = page.locator("div.list-wrap.table.border.overflow > div.row-wrap")
-    await expect(problem_list_locator).to_be_visible()
-    await expect(problem_list_locator).not_to_be_empty()
-
-    print(f"已访问 问题 第 {spider_page} 页")
-    page.wait_for_timeout(1000)
-
-    for i in range(1, 51):
-        # print("sgsdggf")
-        # 尝试定位第i条记录
-        problem_locator = page.locator(f"#app > div.main-container.lside-nav > main > div > div > div > div.l-card.main > div > div.list-wrap.table.border.overflow > div.row-wrap > div:nth-child({i}) > div:nth-child(2)")
-        difficulty_locator = page.locator(f"#app > div.main-container.lside-nav > main > div > div > div > div.l-card.main > div > div.list-wrap.table.border.overflow > div.row-wrap > div:nth-child({i}) > div.difficulty > span > span")
-        
-        # 增加expect断言
-        try:
-            await expect(problem_locator).to_be_visible()
-            await expect(difficulty_locator).to_be_visible()
-        except:
-            should_stop = True
-            break
-
-        # 增加expect断言
-        is_ture = False
-        while not is_ture:
-            try:        
-                problem = await problem_locator.text_content()
-                difficulty = await difficulty_locator.text_content()
-                await expect(problem_locator).not_to_be_empty()
-                await expect(difficulty_locator).not_to_be_empty()
-                is_ture = True
-            except:
-                pass
-        
-        print(problem, difficulty)
-        problem_dict.update({problem: difficulty})
-    
-    print(problem_dict)
-    await page.close()
-    return [should_stop, problem_dict]
+        previous = None
+        for attempt in range(attempts):
+            parsed = read_problem_rows(await page.evaluate(PROBLEM_LIST_EXTRACT_SCRIPT, PROBLEM_ROWS_SELECTOR), spider_page)
+            if parsed is not None:
+                problems, reached_end, certain = parsed
+                # 不满一页的行文本可能是渲染到一半的列表，两次读取一致才当作列表末尾
+                if certain or problems == previous:
+                    print(f"已访问 问题 第 {spider_page} 页，{len(problems)} 道题目")
+                    return [reached_end, problems]
+                previous = problems
 
-async def get_problem():
-    p, browser, context = await create_browser_context(headless=False)
+            remaining = deadline_at - loop.time()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(backoff * 2 ** attempt, remaining))
+        raise RuntimeError(f"读取 {attempts} 次后题目列表仍不完整")
+    finally:
+        await page.close()
 
-    if os.path.exists("problem_list.json"):
-        with open("problem_list.json", "r", encoding="utf-8") as file:
+async def get_problem(max_in_flight=10, requests_per_second=5, task_timeout=120, contexts=4, headless=True, checkpoint_dir="problem_checkpoint", output_path="problem_list.json", meta_path="problem_list_meta.json", page_deadline=60, retry_passes=1, block_resources=True, resource_allowlist=(), base_url=LUOGU_BASE_URL):
+    """
+    爬取题目列表及难度（可断点续爬）
+
+    参数:
+        max_in_flight: 同时爬取的最大页数
+        requests_per_second: 全局每秒最多请求页数
+        task_timeout: 单页的爬取超时时间（秒）
+        contexts: 浏览器上下文数量，页面按页码轮流分配到各个上下文
+        headless: 是否无头模式
+        checkpoint_dir: 断点目录，每页完成后立即保存；中断后重新运行只爬未完成的页
+        output_path: 题目难度文件路径，全部页面完成后写入
+        meta_path: 每道题难度的获取时间文件（与 Problem_Refresh 共用）
+        page_deadline: 单页读取的总时限（秒），超过后记为失败页
+        retry_passes: 首轮结束后对失败页重新爬取的轮数
+        block_resources: 是否拦截图片、字体、样式表和第三方请求
+        resource_allowlist: 调试时放行的资源类型或主机名
+        base_url: 站点地址（基准测试时指向本地模拟服务器）
+    """
+    checkpoint = ProblemCrawlCheckpoint(checkpoint_dir)
+    done_before = checkpoint.completed_count()
+    if done_before:
+        total = f"，列表共 {checkpoint.end_page} 页" if checkpoint.end_page else ""
+        print(f"从断点继续：已完成 {done_before} 页{total}")
+
+    resource_blocker = ResourceBlocker(first_party_url=base_url, allow=resource_allowlist) if block_resources else None
+    p, browser, context = await create_browser_context(headless=headless, resource_blocker=resource_blocker)
+    browser_contexts = [context]
+    for _ in range(contexts - 1):
+        browser_context = await browser.new_context()
+        if resource_blocker is not None:
+            await resource_blocker.attach(browser_context)
+        browser_contexts.append(browser_context)
+
+    scheduler = SpiderScheduler(max_in_flight, requests_per_second, task_timeout)
+    print(f"使用 {len(browser_contexts)} 个浏览器上下文，最多同时 {max_in_flight} 页，限速每秒 {requests_per_second} 页")
+    start_time = time.perf_counter()
+    finished_pages = 0
+
+    page_seconds = 0.0
+
+    def print_throughput():
+        elapsed = time.perf_counter() - start_time
+        average = f"，平均每页加载 {page_seconds / finished_pages:.2f} 秒" if finished_pages else ""
+        print(f"已完成 {finished_pages} 页，速度 {finished_pages / elapsed * 60:.1f} 页/分钟{average}")
+
+    async def crawl_page(spider_page):
+        nonlocal finished_pages, page_seconds
+        await scheduler.limiter.acquire()
+        page_start = time.perf_counter()
+        result = await visit_problem_list(browser_contexts[spider_page % len(browser_contexts)], spider_page, deadline=page_deadline, base_url=base_url)
+        elapsed = time.perf_counter() - page_start
+        page_seconds += elapsed
+        METRICS.histogram("crawler_problem_page_seconds", "题目列表单页的读取耗时（秒）").observe(elapsed)
+        # 每页完成后立即写入断点
+        checkpoint.mark_done(spider_page, result[1], reached_end=result[0])
+        finished_pages += 1
+        if finished_pages % 10 == 0:
+            print_throughput()
+        return result
+
+    try:
+        # 任一页面到达列表末尾后不再领取新页面
+        results = await scheduler.run(checkpoint.pending_pages(), crawl_page, stop_when=lambda result: result[0])
+        failed_pages = [spider_page for spider_page, result in results if result is None]
+
+        # 失败页集中重爬，列表末尾之后的页不再重试
+        for retry_pass in range(1, retry_passes + 1):
+            failed_pages = [spider_page for spider_page in failed_pages if checkpoint.end_page is None or spider_page <= checkpoint.end_page]
+            if not failed_pages:
+                break
+            print(f"第 {retry_pass} 轮重试 {len(failed_pages)} 个失败页：{failed_pages}")
+            results = await scheduler.run(failed_pages, crawl_page)
+            failed_pages = [spider_page for spider_page, result in results if result is None]
+    finally:
+        for browser_context in browser_contexts:
+            await browser_context.close()
+        await browser.close()
+        await p.stop()
+
+    for spider_page in failed_pages:
+        print(f"第 {spider_page} 页爬取失败")
+    print_throughput()
+    if resource_blocker is not None:
+        resource_blocker.print_report(label="浏览器流量")
+
+    # 已完成的页合并到题目难度文件中
+    if os.path.exists(output_path):
+        with open(output_path, "r", encoding="utf-8") as file:
             all_problem_dict = json.load(file)
     else:
         all_problem_dict = {}
+    problems, fetched_at = checkpoint.merged_problems()
+    all_problem_dict.update(problems)
+    write_json_atomic(output_path, all_problem_dict)
+    # 每道题的获取时间供按需补全判断是否过期
+    merge_fetch_times(meta_path, fetched_at)
 
-    for i in range(len(all_problem_dict)//50 +1, 1000, 10):
-        # 获取当前批次的用户ID
-        print(f"正在爬取第 {i//10 + 1} 批问题，从 第 {i}到{i + 9} 页 共 10 个页面")
-            
-        # 2. 创建任务列表（当前批次）
-        tasks = []
-        for j in range(i, i+10):
-            # 为每个用户创建异步任务，传递停止条件参数
-            task = asyncio.create_task(
-                visit_problem_list(
-                    context, 
-                    j, 
-                )
-            )
-            tasks.append(task)
-            
-        # 3. 并行执行当前批次的所有任务
-        batch_results = await asyncio.gather(*tasks)
-        # all_problem_dict.update(batch_results[1])
-        should_stop = False
-        for j in batch_results:
-            all_problem_dict.update(j[1])
-            should_stop |= j[0]
-            
-        print(f"第 {i//10 + 1} 批题目爬取完成")
-        if should_stop == True:
-            break
-        # 如果不是最后一批，等待一下再开始下一批
-        await asyncio.sleep(0.5)  # 批次间等待0.5秒
-
-    print(f"爬取结束！共 {len(all_problem_dict)} 道题目")
-    with open("problem_list.json", "w", encoding="utf-8") as file:
-        json.dump(all_problem_dict, file, ensure_ascii=False, indent=2)
-    await context.close()
-    await browser.close()
-    await p.stop()
+    if checkpoint.is_finished():
+        checkpoint.remove()
+        print(f"爬取结束！共 {len(all_problem_dict)} 道题目")
+    else:
+        print(f"本次未全部完成（失败 {len(failed_pages)} 页），已保存 {len(all_problem_dict)} 道题目，重新运行即可从断点继续")
 
 if __name__ == "__main__":
     asyncio.run(get_problem())
@@ -1,193 +1,430 @@
 import asyncio
 import json
+import multiprocessing
+import queue
 import time
 from datetime import datetime, timedelta
-from playwright.async_api import async_playwright,expect
+from Record_Parser import LUOGU_BASE_URL, RECORD_LIST_PATH, RECORDS_PER_PAGE, extract_page_payload, parse_record_payload, parse_record_rows
+from Http_Fetcher import HttpProblemFetcher, HttpRecordFetcher, load_cookie_header
+from Browser_Pool import BrowserPool, ResourceBlocker
+from Spider_Scheduler import SpiderScheduler
+from Record_Store import JsonRecordStore, open_record_store
+from Data_Cache import BackgroundJsonWriter
+from Record_Types import to_seconds
+from Crawl_Cursor import CrawlCursors, Watermark
+from Adaptive_Poller import AdaptivePoller
+from Problem_Refresh import ProblemDifficultyRefresher
+from Account_Shards import assign_shards, load_valid_accounts, union_watch_list
+from Metrics import METRICS
 
-async def visit_user_record_list(context, user_id, max_pages=5, existing_records_path="user_records.json", days_threshold=60):
+# 记录列表容器及“暂无记录”提示的 XPath
+RECORD_CONTAINER_XPATH = '//*[@id="app"]/div[2]/main/div/div/div/div[1]/div'
+NO_RECORD_XPATH = '//*[@id="app"]/div[2]/main/div/div/div/div[2]'
+NO_RECORD_TEXT = "暂时没有符合该筛选条件的提交记录"
+
+# 一次 evaluate 取出整页数据：优先读取页面内嵌的 JSON，其次读取所有行的文本
+BULK_EXTRACT_SCRIPT = """
+([containerXPath, noRecordXPath, noRecordText, maxRows]) => {
+    const result = {payload: null, rows: null, empty: false};
+    const context = document.getElementById('lentille-context');
+    if (context) {
+        try { result.payload = JSON.parse(context.textContent).data; } catch (e) {}
+    }
+    if (!result.payload && window._feInjection) {
+        result.payload = window._feInjection.currentData;
+    }
+    const byXPath = (path) => document.evaluate(path, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    const container = byXPath(containerXPath);
+    if (container) {
+        result.rows = Array.from(container.querySelectorAll(':scope > div')).slice(0, maxRows).map(row => row.textContent);
+    }
+    const tip = byXPath(noRecordXPath);
+    if (tip && tip.textContent.includes(noRecordText)) {
+        result.empty = true;
+    }
+    return result;
+}
+"""
+
+# 页面就绪的判断：内嵌数据已出现、记录行已渲染或显示“暂无记录”提示
+RECORD_READY_SCRIPT = """
+([containerXPath, noRecordXPath, noRecordText]) => {
+    if (document.getElementById('lentille-context') || window._feInjection) {
+        return true;
+    }
+    const byXPath = (path) => document.evaluate(path, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    const container = byXPath(containerXPath);
+    if (container && container.querySelector(':scope > div')) {
+        return true;
+    }
+    const tip = byXPath(noRecordXPath);
+    return !!(tip && tip.textContent.includes(noRecordText));
+}
+"""
+
+async def extract_page_records_bulk(page, stats=None):
+    """
+    通过一次 page.evaluate 提取当前页的全部记录
+
+    参数:
+        page: 已打开记录列表的页面
+        stats: 可选的统计字典，记录与浏览器的往返次数
+
+    返回:
+        dict: {"user_name", "records", "row_count", "skipped", "empty"}
+    """
+    result = await page.evaluate(BULK_EXTRACT_SCRIPT, [RECORD_CONTAINER_XPATH, NO_RECORD_XPATH, NO_RECORD_TEXT, RECORDS_PER_PAGE])
+    if stats is not None:
+        stats["round_trips"] = stats.get("round_trips", 0) + 1
+
+    page_data = parse_record_payload(result.get("payload"))
+    if page_data is None:
+        page_data = parse_record_rows(result.get("rows"))
+    page_data["empty"] = result.get("empty", False)
+    return page_data
+
+async def extract_page_records_by_locator(page, user_id, page_num, stats=None):
+    """
+    逐行定位提取当前页的记录（批量提取失败时的备用方案）
+
+    参数:
+        page: 已打开记录列表的页面
+        user_id: 用户ID（仅用于输出提示）
+        page_num: 页码（仅用于输出提示）
+        stats: 可选的统计字典，记录与浏览器的往返次数
+
+    返回:
+        dict: {"user_name", "records", "row_count", "skipped", "empty"}
+    """
+    from playwright.async_api import expect
+
+    def count_round_trip():
+        if stats is not None:
+            stats["round_trips"] = stats.get("round_trips", 0) + 1
+
+    texts = []
+    empty = False
+
+    # 检查是否有记录容器
+    record_count = await page.locator(RECORD_CONTAINER_XPATH).count()
+    count_round_trip()
+    if record_count == 0:
+        return {"user_name": "", "records": [], "row_count": 0, "skipped": 0, "empty": False}
+
+    # 检查是否显示"暂时没有符合该筛选条件的提交记录"
+    try:
+        no_record_text = await page.locator(NO_RECORD_XPATH).text_content()
+        count_round_trip()
+        if no_record_text and NO_RECORD_TEXT in no_record_text:
+            empty = True
+    except:
+        pass
+
+    # 循环提取当前页的记录（最多20条）
+    for i in range(1, RECORDS_PER_PAGE + 1):
+        try:
+            # 尝试定位第i条记录
+            record_locator = page.locator(f'{RECORD_CONTAINER_XPATH}/div[{i}]')
+            await expect(record_locator).to_be_visible()
+            count_round_trip()
+            # 检查元素是否存在
+            count = await record_locator.count()
+            count_round_trip()
+            if count == 0:
+                break  # 没有更多记录了
+            texts.append(await record_locator.text_content())
+            count_round_trip()
+        except Exception:
+            print(f"用户 {user_id} 第 {page_num} 页第 {i} 条记录获取失败，跳过")
+            continue
+
+    page_data = parse_record_rows(texts)
+    page_data["empty"] = empty
+    return page_data
+
+async def extract_page_records(page, user_id, page_num, stats=None):
+    """优先批量提取当前页记录，失败时退回逐行提取"""
+    try:
+        return await extract_page_records_bulk(page, stats)
+    except Exception as e:
+        print(f"用户 {user_id} 第 {page_num} 页批量提取失败，改为逐行提取: {str(e)[:50]}")
+        METRICS.counter("crawler_retries_total", "重试次数", kind="locator_fallback").inc()
+        return await extract_page_records_by_locator(page, user_id, page_num, stats)
+
+class PlaywrightRecordFetcher:
+    """
+    基于浏览器的记录抓取后端
+
+    参数:
+        context: 浏览器上下文对象
+        base_url: 站点地址
+        owned: 关闭后端时需要一并关闭的 (playwright实例, browser实例)
+        browser_pool: 可选的 BrowserPool，页面从池中取用并归还，浏览器由池管理
+        ready_timeout: 等待页面就绪的最长时间（秒），超时后直接提取
+        intercept_response: 是否直接解析页面文档的响应正文（其中内嵌了记录数据），解析成功时不等待渲染
+        resource_blocker: 上下文上挂载的 ResourceBlocker（可选），用于输出本次爬取的请求与流量统计
+
+    功能:
+        不再固定等待，按响应正文、页面就绪信号依次尝试；分阶段（打开页面、等待就绪、提取）累计耗时
+    """
+    name = "playwright"
+
+    def __init__(self, context, base_url=LUOGU_BASE_URL, owned=None, browser_pool=None, ready_timeout=10, intercept_response=True, resource_blocker=None):
+        self.context = context
+        self.base_url = base_url
+        self.owned = owned
+        self.browser_pool = browser_pool
+        self.ready_timeout = ready_timeout
+        self.intercept_response = intercept_response
+        self.phase_seconds = {"navigate": 0.0, "ready": 0.0, "extract": 0.0}
+        self.pages = 0
+        self.intercepted_pages = 0
+        self.resource_blocker = resource_blocker
+        self._traffic_start = resource_blocker.snapshot() if resource_blocker else None
+
+    async def open_session(self, user_id):
+        # 每个用户使用一个页面，翻页时复用
+        if self.browser_pool:
+            return await self.browser_pool.acquire_page()
+        return await self.context.new_page()
+
+    async def close_session(self, page):
+        if self.browser_pool:
+            await self.browser_pool.release_page(page)
+        else:
+            await page.close()
+
+    async def fetch_record_page(self, page, user_id, page_num):
+        # 构建用户记录页面URL
+        url = self.base_url + RECORD_LIST_PATH.format(user_id=user_id, page_num=page_num)
+        start = time.perf_counter()
+        # 解析响应正文时只需等到响应开始返回，不必等页面加载完成
+        response = await page.goto(url, wait_until="commit" if self.intercept_response else "load")
+        navigated = time.perf_counter()
+        self._record_phase("navigate", navigated - start)
+        self.pages += 1
+
+        if self.intercept_response and response is not None and response.ok:
+            try:
+                page_data = parse_record_payload(extract_page_payload(await response.text()))
+            except Exception:
+                page_data = None
+            self._record_phase("extract", time.perf_counter() - navigated)
+            if page_data is not None:
+                page_data["empty"] = page_data["row_count"] == 0
+                self.intercepted_pages += 1
+                return page_data
+            navigated = time.perf_counter()
+
+        # 等待页面就绪，超时后仍尝试提取
+        try:
+            await page.wait_for_function(RECORD_READY_SCRIPT, arg=[RECORD_CONTAINER_XPATH, NO_RECORD_XPATH, NO_RECORD_TEXT], timeout=self.ready_timeout * 1000)
+        except Exception:
+            print(f"用户 {user_id} 第 {page_num} 页 {self.ready_timeout} 秒内未就绪，直接提取")
+        ready = time.perf_counter()
+        self._record_phase("ready", ready - navigated)
+
+        page_data = await extract_page_records(page, user_id, page_num)
+        self._record_phase("extract", time.perf_counter() - ready)
+        return page_data
+
+    def _record_phase(self, phase, seconds):
+        self.phase_seconds[phase] += seconds
+        METRICS.histogram("crawler_page_phase_seconds", "每页各阶段耗时（秒）", backend=self.name, phase=phase).observe(seconds)
+
+    def print_phase_timings(self):
+        """输出各阶段的累计耗时、每页平均耗时以及请求与流量统计"""
+        if not self.pages:
+            return
+        phases = "，".join(
+            f"{label} {self.phase_seconds[phase]:.2f} 秒（每页 {self.phase_seconds[phase] / self.pages * 1000:.0f} 毫秒）"
+            for phase, label in (("navigate", "打开页面"), ("ready", "等待就绪"), ("extract", "提取"))
+        )
+        print(f"浏览器抓取 {self.pages} 页，其中 {self.intercepted_pages} 页直接解析响应正文：{phases}")
+        if self.resource_blocker is not None:
+            self.resource_blocker.print_report(self._traffic_start, "浏览器流量")
+
+    async def close(self):
+        if self.browser_pool:
+            return  # 浏览器由 BrowserPool 跨周期管理
+        await self.context.close()
+        if self.owned:
+            p, browser = self.owned
+            await browser.close()
+            await p.stop()
+
+def record_key(record):
+    """使用题目编号和提交日期作为记录的唯一标识"""
+    return record.problem_number, record.post_date
+
+def load_existing_records(existing_records_path="user_records.json"):
+    """读取已存在的记录文件及其增量日志（记录转换为 Record），文件不存在或损坏时返回空列表"""
+    return JsonRecordStore(existing_records_path).load_users()
+
+def build_existing_record_index(existing_records):
+    """
+    一次性为所有用户建立已存在记录的索引
+
+    参数:
+        existing_records: 用户记录列表（与 user_records.json 结构相同）
+
+    返回:
+        dict: {用户ID: 记录唯一标识集合}
+    """
+    index = {}
+    for user_data in existing_records:
+        keys = index.setdefault(user_data.get("user_id"), set())
+        for record in user_data.get("records", []):
+            keys.add(record_key(record))
+    return index
+
+async def visit_user_record_list(context, user_id, max_pages=5, existing_records_path="user_records.json", days_threshold=60, rate_limiter=None, existing_record_keys=None, watermark=None):
     """
     访问单个用户的记录列表页面并提取数据
     
     参数:
-        context: 浏览器上下文对象
+        context: 记录抓取后端（PlaywrightRecordFetcher / HttpRecordFetcher），也可以直接传入浏览器上下文对象
         user_id: 用户ID
         max_pages: 最大爬取页数
         existing_records_path: 已存在记录文件路径
         days_threshold: 时间阈值（天），超过这个天数的记录停止爬取
+        rate_limiter: 可选的全局限速器，每次请求前调用
+        existing_record_keys: 该用户已存在记录的唯一标识集合，由 run_spider 统一建立；
+            未提供时才读取 existing_records_path
+        watermark: 该用户上次的抓取水位线（Watermark），越过水位线即停止
     
     功能:
         1. 打开新页面访问用户记录页面
-        2. 循环提取多页记录内容
+        2. 循环提取多页记录内容（每页一次批量提取）
         3. 根据停止条件提前结束爬取
+    
+    返回:
+        dict: {"user_id", "user_name", "records", "pages_fetched", "complete", "watermark"}
+            complete 表示是否连续抓到了水位线、已有记录、时间阈值或最后一页，
+            只有为 True 时才用 watermark（本次新记录的水位线）推进该用户的水位线
     """
-    # 创建新页面
-    page = await context.new_page()
+    fetcher = context if hasattr(context, "fetch_record_page") else PlaywrightRecordFetcher(context)
     
     user_record = []
     user_name = ""
-    table_head = ["post_date", "problem_number", "problem_name"]
     
-    # 加载已存在的记录
-    existing_records = []
-    try:
-        with open(existing_records_path, "r", encoding="utf-8") as file:
-            existing_data = json.load(file)
-            # 查找当前用户的已存在记录
-            for user_data in existing_data:
-                if user_data.get("user_id") == user_id:
-                    existing_records = user_data.get("records", [])
-                    break
-    except (FileNotFoundError, json.JSONDecodeError):
-        existing_records = []
-    
-    # 将已存在记录转换为集合以便快速查找
-    existing_record_set = set()
-    for record in existing_records:
-        # 使用题目编号和提交日期作为唯一标识
-        record_key = f"{record.get('problem_number', '')}_{record.get('post_date', '')}"
-        existing_record_set.add(record_key)
+    # 已存在记录的集合，用于快速查找
+    if existing_record_keys is not None:
+        existing_record_set = existing_record_keys
+    else:
+        existing_data = load_existing_records(existing_records_path)
+        existing_record_set = build_existing_record_index(existing_data).get(user_id, set())
 
     new_existing_record_set = set()
     
     # 计算日期阈值
-    threshold_date = datetime.now() - timedelta(days=days_threshold)
+    threshold_seconds = to_seconds(datetime.now() - timedelta(days=days_threshold))
     
     # 爬取多页数据
     should_stop = False
-    
-    for page_num in range(1, max_pages + 1):
-        if should_stop:
-            break
-            
-        # 构建用户记录页面URL
-        url = f"https://www.luogu.com.cn/record/list?user={user_id}&status=12&page={page_num}"
-        await page.goto(url)
-        print(f"已访问用户 {user_id} 第 {page_num} 页")
-        
-        # 等待页面加载
-        await page.wait_for_timeout(1000)
-        
-        # 检查是否有记录
-        try:
-            # 检查是否有记录容器
-            record_container = page.locator('//*[@id="app"]/div[2]/main/div/div/div/div[1]/div')
-            record_count = await record_container.count()
+    complete = False
+    pages_fetched = 0
+
+    user_start = time.perf_counter()
+    # 创建新页面（HTTP 后端不需要页面）
+    session = await fetcher.open_session(user_id)
+    try:
+        for page_num in range(1, max_pages + 1):
+            if should_stop:
+                break
             
-            if record_count == 0:
+            if rate_limiter:
+                await rate_limiter.acquire()
+            try:
+                page_data = await fetcher.fetch_record_page(session, user_id, page_num)
+            except Exception as e:
+                print(f"用户 {user_id} 第 {page_num} 页访问失败: {str(e)[:50]}")
+                METRICS.counter("crawler_page_failures_total", "访问失败的页数").inc()
+                break
+            pages_fetched += 1
+            METRICS.counter("crawler_pages_fetched_total", "抓取的页数").inc()
+            METRICS.counter("crawler_rows_parsed_total", "解析的记录行数").inc(page_data["row_count"])
+            if page_data["skipped"]:
+                METRICS.counter("crawler_parse_failures_total", "数据不完整、解析失败的记录行数").inc(page_data["skipped"])
+            print(f"已访问用户 {user_id} 第 {page_num} 页")
+
+            if page_data["row_count"] == 0:
                 print(f"用户 {user_id} 第 {page_num} 页没有记录")
+                complete = True
                 break
+            if page_data["empty"]:
+                print(f"用户 {user_id} 没有提交记录")
+                complete = True
+                break
+            if page_data["skipped"]:
+                print(f"用户 {user_id} 第 {page_num} 页有 {page_data['skipped']} 条记录数据不完整，跳过")
+
+            if page_num == 1:  # 只在第一页获取用户名
+                user_name = page_data["user_name"]
+
+            page_records = 0
+            for record in page_data["records"]:
+                post_date_str = record.post_date
             
-            # 检查是否显示"暂时没有符合该筛选条件的提交记录"
-            try:
-                no_record_text = await page.locator('//*[@id="app"]/div[2]/main/div/div/div/div[2]').text_content()
-                if "暂时没有符合该筛选条件的提交记录" in no_record_text:
-                    print(f"用户 {user_id} 没有提交记录")
+                # 检查是否越过上次的水位线
+                if watermark is not None and watermark.crossed(record):
+                    print(f"用户 {user_id} 记录 {post_date_str} 已越过水位线 {watermark.post_date}，停止爬取")
+                    should_stop = True
                     break
-            except:
-                pass
-                
-            # 循环提取当前页的记录（最多20条）
-            page_records = 0
-            for i in range(1, 21):  # 每页最多20条记录
-                if should_stop:
+            
+                # 检查日期是否超过阈值
+                if post_date_str:
+                    if record.timestamp is None:
+                        print(f"用户 {user_id} 记录日期格式异常: {post_date_str}")
+                    # 检查是否超过60天
+                    elif record.timestamp < threshold_seconds:
+                        print(f"用户 {user_id} 记录 {post_date_str} 超过 {days_threshold} 天，停止爬取")
+                        should_stop = True
+                        break
+            
+                # 检查记录是否已存在
+                key = record_key(record)
+                if key in existing_record_set:
+                    print(f"用户 {user_id} 记录 {key} 已存在，停止爬取")
+                    should_stop = True
                     break
-                    
-                try:
-                    # 尝试定位第i条记录
-                    record_locator = page.locator(f'//*[@id="app"]/div[2]/main/div/div/div/div[1]/div/div[{i}]')
-                    await expect(record_locator).to_be_visible()
-                    # 检查元素是否存在
-                    count = await record_locator.count()
-                    if count == 0:
-                        break  # 没有更多记录了
-                        
-                    text = await record_locator.text_content()
-                    
-                    # 按换行符分割文本
-                    format_text = text.split("\n")
-                    
-                    # 检查是否有足够的数据
-                    if len(format_text) >= 10:
-                        if page_num == 1 and i == 1:  # 只在第一页第一条记录获取用户名
-                            user_name = format_text[1][2:] if len(format_text[1]) > 2 else "未知用户"
-                        
-                        post_date_str = format_text[3][12:] if len(format_text[3]) > 12 else ""
-                        if post_date_str.count("-") == 1:
-                            post_date_str = str(datetime.now().year) + "-" + post_date_str
-                        else:
-                            post_date_str = post_date_str + ":00"
-
-                        problem_number = format_text[8][4:] if len(format_text[8]) > 4 else ""
-
-                        problem_name = format_text[9][4:] if len(format_text[9]) > 4 else ""
-                        
-                        # 检查日期是否超过阈值
-                        if post_date_str:
-                            try:
-                                record_date = datetime.strptime(post_date_str, "%Y-%m-%d %H:%M:%S")
-                                
-                                # 检查是否超过60天
-                                if record_date < threshold_date:
-                                    print(f"用户 {user_id} 记录 {post_date_str} 超过 {days_threshold} 天，停止爬取")
-                                    should_stop = True
-                                    break
-                            except ValueError:
-                                print(f"用户 {user_id} 记录日期格式异常: {post_date_str}")
-                        
-                        # 检查记录是否已存在
-                        record_key = f"{problem_number}_{post_date_str}"
-                        if record_key in existing_record_set:
-                            print(f"用户 {user_id} 记录 {record_key} 已存在，停止爬取")
-                            should_stop = True
-                            break
-                        
-                        # 创建记录字典（保持原有格式）
-                        table_content = [post_date_str, problem_number, problem_name]
-                        record_dict = dict(zip(table_head, table_content))
-                        
-                        user_record.append(record_dict)
-                        page_records += 1
-                        
-                        # 将新记录添加到已存在记录集合，避免同一页面内重复
-                        new_existing_record_set.add(record_key)
-                        
-                        # 每条记录等待0.05秒（原代码逻辑）
-                        await page.wait_for_timeout(0.05)
-                    else:
-                        # 修改为更友好的提示
-                        print(f"用户 {user_id} 第 {page_num} 页第 {i} 条记录数据不完整，跳过")
-                        
-                except Exception as e:
-                    # 修改为更友好的提示
-                    print(f"用户 {user_id} 第 {page_num} 页第 {i} 条记录获取失败，跳过")
-                    continue
             
-            print(f"用户 {user_id} 第 {page_num} 页爬取了 {page_records} 条记录")
+                user_record.append(record)
+                page_records += 1
             
-            # 如果当前页记录少于20条，可能没有下一页了
-            if page_records < 20:
+                # 将新记录添加到已存在记录集合，避免同一页面内重复
+                new_existing_record_set.add(key)
+        
+            print(f"用户 {user_id} 第 {page_num} 页爬取了 {page_records} 条记录")
+        
+            if should_stop:
+                complete = True
                 break
-                
-        except Exception as e:
-            print(f"用户 {user_id} 第 {page_num} 页访问失败: {str(e)[:50]}")
-            break
+            # 当前页的行数（包括解析失败的行）少于20条，说明没有下一页了
+            if page_data["row_count"] < RECORDS_PER_PAGE:
+                complete = True
+                break
+    finally:
+        # 关闭页面
+        await fetcher.close_session(session)
+        METRICS.histogram("crawler_user_seconds", "单个用户的爬取耗时（秒）").observe(time.perf_counter() - user_start)
     
     existing_record_set.update(new_existing_record_set)
-    await page.wait_for_timeout(500)
-    # 最后等待0.5秒
-    
-    # 关闭页面
-    await page.close()
 
-    return {"user_id": user_id, "user_name": user_name, "records": user_record}
+    return {
+        "user_id": user_id, "user_name": user_name, "records": user_record,
+        "pages_fetched": pages_fetched, "complete": complete,
+        "watermark": Watermark.from_records(user_record),
+    }
 
-async def create_browser_context(login_user_id, cookie_path="cookies.json", headless=True):
+async def create_browser_context(login_user_id, cookie_path="cookies.json", headless=True, resource_blocker=None):
     """
     创建浏览器上下文并加载cookies
     
     参数:
         cookie_path: cookies.json文件路径
         headless: 是否无头模式
+        resource_blocker: 可选的 ResourceBlocker，拦截图片、字体、样式表和第三方请求
     
     返回:
         tuple: (playwright实例, browser实例, context实例)
@@ -201,17 +438,61 @@ async def create_browser_context(login_user_id, cookie_path="cookies.json", head
         if cookies[i].get("user_id") == login_user_id:
             cookies_list = cookies[i].get("cookies")
     
-    # 启动Playwright和浏览器
+    # 启动Playwright和浏览器（只在用到浏览器时导入，合并、清理等纯 Python 部分不依赖 Playwright）
+    from playwright.async_api import async_playwright
     p = await async_playwright().start()
     browser = await p.chromium.launch(headless=headless)
     
     # 创建上下文并添加cookies
     context = await browser.new_context()
     await context.add_cookies(cookies_list)
+    if resource_blocker is not None:
+        await resource_blocker.attach(context)
     
     return p, browser, context
 
-async def run_spider(login_user_id, user_ids, cookie_path="cookies.json", max_pages_per_user=10, existing_records_path="user_records.json", days_threshold=60):
+def create_browser_pool(login_user_id, cookie_path="cookies.json", headless=True, base_url=LUOGU_BASE_URL, block_resources=True, resource_allowlist=()):
+    """
+    创建跨监控周期复用的浏览器池（首次使用时才真正启动浏览器）
+
+    参数:
+        block_resources: 是否拦截图片、字体、样式表和第三方请求
+        resource_allowlist: 调试时放行的资源类型或主机名
+    """
+    resource_blocker = ResourceBlocker(base_url, resource_allowlist) if block_resources else None
+    return BrowserPool(lambda: create_browser_context(login_user_id, cookie_path, headless=headless, resource_blocker=resource_blocker),
+                       resource_blocker=resource_blocker)
+
+async def create_record_fetcher(backend, login_user_id, cookie_path="cookies.json", base_url=LUOGU_BASE_URL, browser_pool=None):
+    """
+    按名称创建记录抓取后端
+
+    参数:
+        backend: "playwright"（浏览器）或 "http"（直接请求，失败时自动改用浏览器）
+        login_user_id：登录的用户ID
+        cookie_path: cookies.json文件路径
+        base_url: 站点地址
+        browser_pool: 可选的 BrowserPool，提供时复用其中的浏览器
+
+    返回:
+        PlaywrightRecordFetcher 或 HttpRecordFetcher
+    """
+    async def create_playwright_fetcher():
+        if browser_pool is not None:
+            await browser_pool.ensure()
+            return PlaywrightRecordFetcher(browser_pool.context, base_url, browser_pool=browser_pool, resource_blocker=browser_pool.resource_blocker)
+        resource_blocker = ResourceBlocker(base_url)
+        p, browser, context = await create_browser_context(login_user_id, cookie_path, headless=True, resource_blocker=resource_blocker)
+        return PlaywrightRecordFetcher(context, base_url, owned=(p, browser), resource_blocker=resource_blocker)
+
+    if backend == "http":
+        cookie_header = load_cookie_header(login_user_id, cookie_path)
+        return HttpRecordFetcher(cookie_header, base_url, fallback_factory=create_playwright_fetcher)
+    if backend == "playwright":
+        return await create_playwright_fetcher()
+    raise ValueError(f"未知的抓取后端：{backend}")
+
+async def run_spider(login_user_id, user_ids, cookie_path="cookies.json", max_pages_per_user=10, existing_records_path="user_records.json", days_threshold=60, backend="playwright", base_url=LUOGU_BASE_URL, browser_pool=None, max_in_flight=10, requests_per_second=5, task_timeout=120, existing_records=None, cursors=None):
     """
     主爬虫执行函数
     
@@ -222,148 +503,473 @@ async def run_spider(login_user_id, user_ids, cookie_path="cookies.json", max_pa
         max_pages_per_user: 每个用户最大爬取页数
         existing_records_path: 已存在记录文件路径
         days_threshold: 时间阈值（天），超过这个天数的记录停止爬取
+        backend: 抓取后端，"playwright" 或 "http"
+        base_url: 站点地址（可指向本地模拟服务器）
+        browser_pool: 可选的 BrowserPool，提供时复用其中的浏览器，结束后不关闭
+        max_in_flight: 同时爬取的最大用户数
+        requests_per_second: 全局每秒最多请求页数
+        task_timeout: 单个用户的爬取超时时间（秒）
+        existing_records: 内存中已有的用户记录列表；未提供时读取一次 existing_records_path
+        cursors: 可选的 CrawlCursors，每个用户抓到越过水位线为止（水位线由调用方在保存记录后推进）
     
     流程:
-        1. 创建浏览器上下文
-        2. 为每个用户ID创建异步任务（每10个用户一组）
-        3. 并行执行每组任务，组间串行执行
+        1. 创建抓取后端（浏览器上下文或 HTTP 连接池）
+        2. 所有用户放入有界并发的任务队列，一个用户完成立即开始下一个
+        3. 每次翻页前经过全局限速，超时的用户本次跳过
         4. 清理资源
     
     返回:
         list: 爬取的用户记录列表
     """
     # 初始化变量
-    p, browser, context = None, None, None
+    fetcher = None
     
     try:
-        # 1. 创建浏览器上下文
-        
-        p, browser, context = await create_browser_context(login_user_id, cookie_path, headless=True)
-        
-        # 所有用户的结果
-        all_user_record_list = []
+        # 1. 创建抓取后端
+        fetcher = await create_record_fetcher(backend, login_user_id, cookie_path, base_url, browser_pool)
+        print(f"抓取后端：{fetcher.name}")
         
-        # 2. 分批处理用户列表（每10个用户一组）
-        for i in range(0, len(user_ids), 10):
-            # 获取当前批次的用户ID
-            batch_user_ids = user_ids[i:i+10]
-            print(f"正在爬取第 {i//10 + 1} 批用户，共 {len(batch_user_ids)} 个用户")
-            print(f"每用户最多 {max_pages_per_user} 页，时间阈值 {days_threshold} 天")
-            
-            # 2. 创建任务列表（当前批次）
-            tasks = []
-            for user_id in batch_user_ids:
-                # 为每个用户创建异步任务，传递停止条件参数
-                task = asyncio.create_task(
-                    visit_user_record_list(
-                        context, 
-                        user_id, 
-                        max_pages_per_user,
-                        existing_records_path,
-                        days_threshold
-                    )
-                )
-                tasks.append(task)
-            
-            # 3. 并行执行当前批次的所有任务
-            batch_results = await asyncio.gather(*tasks)
-            all_user_record_list.extend(batch_results)
-            
-            print(f"第 {i//10 + 1} 批用户爬取完成")
-            
-            # 如果不是最后一批，等待一下再开始下一批
-            if i + 10 < len(user_ids):
-                await asyncio.sleep(1)  # 批次间等待1秒
+        # 已存在记录的索引只建立一次，每个用户只拿到自己的部分
+        if existing_records is None:
+            existing_records = load_existing_records(existing_records_path)
+        existing_index = build_existing_record_index(existing_records)
+
+        # 2. 有界并发的任务队列
+        scheduler = SpiderScheduler(max_in_flight, requests_per_second, task_timeout)
+        print(f"正在爬取 {len(user_ids)} 个用户，最多同时 {max_in_flight} 个，限速每秒 {requests_per_second} 页")
+        print(f"每用户最多 {max_pages_per_user} 页，时间阈值 {days_threshold} 天")
+
+        async def crawl_user(user_id):
+            # 为每个用户创建任务，传递停止条件参数
+            return await visit_user_record_list(
+                fetcher,
+                user_id,
+                max_pages_per_user,
+                existing_records_path,
+                days_threshold,
+                scheduler.limiter,
+                existing_index.get(user_id, set()),
+                cursors.get(user_id) if cursors is not None else None
+            )
+
+        # 3. 执行所有任务，超时或出错的用户本次跳过
+        results = await scheduler.run(user_ids, crawl_user)
+        all_user_record_list = [result for _, result in results if result is not None]
+        print(f"用户爬取完成，成功 {len(all_user_record_list)} 个，跳过 {len(results) - len(all_user_record_list)} 个")
+        print_pages_fetched(all_user_record_list)
+        if isinstance(fetcher, PlaywrightRecordFetcher):
+            fetcher.print_phase_timings()
 
         return all_user_record_list
         
     finally:
         # 4. 确保资源被清理（即使出错）
-        if context:
-            await context.close()
-        if browser:
-            await browser.close()
-        if p:
-            await p.stop()
+        if fetcher:
+            await fetcher.close()
+
+def combine_shard_results(shard_results):
+    """
+    合并各账号的爬取结果；同一用户出现在多个结果中时只保留一份记录（按题号和提交时间去重）
+    """
+    combined = {}
+    for results in shard_results:
+        for result in results:
+            current = combined.get(result["user_id"])
+            if current is None:
+                combined[result["user_id"]] = result
+                continue
+            keys = {record_key(record) for record in current["records"]}
+            current["records"].extend(r for r in result["records"] if record_key(r) not in keys)
+            current["user_name"] = current["user_name"] or result["user_name"]
+            current["pages_fetched"] += result["pages_fetched"]
+            current["complete"] = current["complete"] and result["complete"]
+    return list(combined.values())
+
+async def run_sharded_spider(account_ids, user_ids, cookie_path="cookies.json", max_pages_per_user=10, existing_records_path="user_records.json", days_threshold=60, backend="playwright", base_url=LUOGU_BASE_URL, browser_pools=None, max_in_flight_per_account=5, requests_per_second_per_account=2, task_timeout=120, existing_records=None, cursors=None):
+    """
+    用多个登录账号分片爬取
+
+    参数:
+        account_ids: 参与爬取的账号用户ID列表（见 load_valid_accounts）
+        user_ids: 需要爬取的用户ID列表，轮流分配给各个账号
+        browser_pools: 可选的 {账号用户ID: BrowserPool}，每个账号使用自己的浏览器上下文
+        max_in_flight_per_account: 每个账号同时爬取的最大用户数
+        requests_per_second_per_account: 每个账号每秒最多请求的页数，各账号的限速互相独立
+        其余参数与 run_spider 相同
+
+    说明:
+        每个账号运行一个独立的 run_spider（自己的 cookies、上下文和限速器），
+        总吞吐量随账号数近似线性增长，而单个账号的请求频率不变；
+        某个账号的分片出错时只跳过该分片，其他账号的结果照常返回
+
+    返回:
+        list: 合并后的用户记录列表
+    """
+    if not account_ids:
+        raise ValueError("没有可用的登录账号")
+    browser_pools = browser_pools or {}
+    shards = assign_shards(user_ids, account_ids)
+    print(f"使用 {len(account_ids)} 个账号分片爬取 {len(user_ids)} 个用户，"
+          f"每个账号限速每秒 {requests_per_second_per_account} 页："
+          + "，".join(f"{account_id} {len(shard)} 个" for account_id, shard in shards.items()))
+
+    async def crawl_shard(account_id, shard):
+        if not shard:
+            return []
+        return await run_spider(
+            account_id, shard, cookie_path, max_pages_per_user, existing_records_path, days_threshold,
+            backend, base_url, browser_pools.get(account_id),
+            max_in_flight_per_account, requests_per_second_per_account, task_timeout,
+            existing_records, cursors
+        )
+
+    shard_results = await asyncio.gather(*(crawl_shard(account_id, shard) for account_id, shard in shards.items()), return_exceptions=True)
+    successful = []
+    for account_id, results in zip(shards, shard_results):
+        if isinstance(results, Exception):
+            print(f"账号 {account_id} 的分片爬取出错，本周期跳过 {len(shards[account_id])} 个用户: {str(results)[:50]}")
+        else:
+            successful.append(results)
+    return combine_shard_results(successful)
+
+def crawl_worker(worker_index, login_user_id, options, task_queue, result_queue):
+    """
+    常驻爬虫工作进程的入口：反复从 task_queue 领取一组用户爬取，每完成一个用户立即把结果放入队列，收到 None 时退出
+
+    任务为 (用户ID列表, 本周期参数, 已有记录索引, 水位线)；
+    队列消息为 (类型, 工作进程序号, 内容)，类型为 "result"（一个用户的结果）、"metrics"（本进程指标的增量）、
+    "error"（本组出错）或 "done"（本组结束）
+    """
+    try:
+        asyncio.run(crawl_worker_loop(worker_index, login_user_id, options, task_queue, result_queue))
+    except Exception as e:
+        result_queue.put(("error", worker_index, str(e)))
+
+async def crawl_worker_loop(worker_index, login_user_id, options, task_queue, result_queue):
+    """工作进程的事件循环：浏览器池在进程内跨周期复用，只在首次使用或崩溃后启动"""
+    browser_pool = create_browser_pool(login_user_id, options["cookie_path"], base_url=options["base_url"])
+    try:
+        while True:
+            task = await asyncio.to_thread(task_queue.get)
+            if task is None:
+                return
+            user_ids, cycle_options, existing_index, watermarks = task
+            try:
+                await crawl_partition(worker_index, login_user_id, user_ids, {**options, **cycle_options},
+                                      existing_index, watermarks, result_queue, browser_pool)
+            except Exception as e:
+                result_queue.put(("error", worker_index, str(e)))
+            finally:
+                # 关闭抓取后端时记录的指标随本组最后一批增量发回
+                result_queue.put(("metrics", worker_index, METRICS.drain()))
+                result_queue.put(("done", worker_index, None))
+    finally:
+        await browser_pool.close()
+
+async def crawl_partition(worker_index, login_user_id, user_ids, options, existing_index, watermarks, result_queue, browser_pool=None):
+    """在工作进程中用自己的抓取后端（浏览器池或 HTTP 连接池）和限速器爬取一组用户"""
+    fetcher = await create_record_fetcher(options["backend"], login_user_id, options["cookie_path"], options["base_url"], browser_pool=browser_pool)
+    try:
+        scheduler = SpiderScheduler(options["max_in_flight"], options["requests_per_second"], options["task_timeout"])
 
-def merge_records(existing_records, new_records):
+        async def crawl_user(user_id):
+            result = await visit_user_record_list(
+                fetcher,
+                user_id,
+                options["max_pages_per_user"],
+                options["existing_records_path"],
+                options["days_threshold"],
+                scheduler.limiter,
+                existing_index.get(user_id, set()),
+                watermarks.get(user_id)
+            )
+            result_queue.put(("result", worker_index, result))
+            # 每个用户完成后把指标增量发回主进程，界面的指标面板在周期进行中也能看到
+            result_queue.put(("metrics", worker_index, METRICS.drain()))
+            return result
+
+        await scheduler.run(user_ids, crawl_user)
+    finally:
+        await fetcher.close()
+
+class CrawlWorkerPool:
+    """
+    跨监控周期常驻的爬虫工作进程
+
+    参数:
+        login_user_id：登录的用户ID
+        workers: 工作进程数，每个进程有自己的事件循环和跨周期复用的浏览器池
+        cookie_path / backend / base_url: 与 run_spider 相同
+
+    功能:
+        1. 进程在首次爬取时启动（spawn 方式，与 Windows 一致），之后每个周期只通过队列下发用户，
+           不再重复支付解释器和浏览器的启动开销
+        2. 进程异常退出或某个周期没有正常收尾（出错、被取消）时结束全部进程，下个周期重新启动，
+           避免上个周期残留的消息混入结果
+    """
+    def __init__(self, login_user_id, workers=4, cookie_path="cookies.json", backend="playwright", base_url=LUOGU_BASE_URL):
+        self.login_user_id = login_user_id
+        self.workers = workers
+        self.options = {"backend": backend, "cookie_path": cookie_path, "base_url": base_url}
+        self.launch_count = 0
+        self._context = multiprocessing.get_context("spawn")
+        self._result_queue = None
+        self._processes = []
+        self._task_queues = []
+
+    def _ensure(self):
+        if self._processes and all(process.is_alive() for process in self._processes):
+            return
+        self.close()
+        self._result_queue = self._context.Queue()
+        for worker_index in range(self.workers):
+            task_queue = self._context.Queue()
+            process = self._context.Process(target=crawl_worker, daemon=True, args=(
+                worker_index, self.login_user_id, self.options, task_queue, self._result_queue))
+            process.start()
+            self._processes.append(process)
+            self._task_queues.append(task_queue)
+        self.launch_count += 1
+
+    async def crawl(self, partitions, cycle_options, existing_index, cursors=None, on_result=None):
+        """
+        把各组用户下发给工作进程，汇总它们陆续返回的结果
+
+        参数:
+            partitions: 每个工作进程的用户ID列表（数量不超过 workers，空列表的进程本周期空闲）
+            cycle_options: 本周期的爬取参数（页数、限速等）
+            existing_index: 已有记录索引；每个进程只拿到自己用户的部分
+
+        返回:
+            list: 爬取的用户记录列表（按完成顺序）
+        """
+        self._ensure()
+        running = set()
+        for worker_index, partition in enumerate(partitions):
+            if not partition:
+                continue
+            # 每个进程只拿到自己用户的已有记录索引和水位线
+            self._task_queues[worker_index].put((
+                partition, cycle_options,
+                {user_id: existing_index.get(user_id, set()) for user_id in partition},
+                {user_id: cursors.get(user_id) for user_id in partition} if cursors is not None else {},
+            ))
+            running.add(worker_index)
+
+        results = []
+        finished = False
+        try:
+            while running:
+                try:
+                    kind, worker_index, payload = await asyncio.to_thread(self._result_queue.get, True, 1)
+                except queue.Empty:
+                    for worker_index in list(running):
+                        if not self._processes[worker_index].is_alive():
+                            print(f"工作进程 {worker_index} 异常退出（退出码 {self._processes[worker_index].exitcode}）")
+                            running.discard(worker_index)
+                    continue
+                if kind == "result":
+                    results.append(payload)
+                    if on_result is not None:
+                        on_result(payload)
+                elif kind == "metrics":
+                    METRICS.merge(payload)
+                elif kind == "error":
+                    print(f"工作进程 {worker_index} 出错: {payload[:50]}")
+                else:
+                    running.discard(worker_index)
+            finished = all(process.is_alive() for process in self._processes)
+        finally:
+            if not finished:
+                await asyncio.to_thread(self.close)
+        return results
+
+    def close(self, timeout=5):
+        """通知工作进程退出（各自关闭浏览器），超时未退出的进程强制结束"""
+        for process, task_queue in zip(self._processes, self._task_queues):
+            if process.is_alive():
+                task_queue.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes, self._task_queues, self._result_queue = [], [], None
+
+async def run_multiprocess_spider(login_user_id, user_ids, workers=4, cookie_path="cookies.json", max_pages_per_user=10, existing_records_path="user_records.json", days_threshold=60, backend="playwright", base_url=LUOGU_BASE_URL, max_in_flight_per_worker=10, requests_per_second=5, task_timeout=120, existing_records=None, cursors=None, on_result=None, worker_pool=None):
+    """
+    多进程爬虫的协调者：把用户分给多个工作进程，汇总它们陆续返回的结果
+
+    参数:
+        workers: 工作进程数，每个进程有自己的事件循环和抓取后端（提供 worker_pool 时取其进程数）
+        max_in_flight_per_worker: 每个工作进程同时爬取的最大用户数
+        requests_per_second: 所有工作进程合计的每秒请求页数（同一账号），平均分给各进程
+        on_result: 可选的回调函数，每收到一个用户的结果调用一次
+        worker_pool: 可选的 CrawlWorkerPool，提供时复用其中的常驻进程和浏览器，否则本次临时启动、结束后关闭
+        其余参数与 run_spider 相同
+
+    说明:
+        工作进程只负责抓取和解析，合并与保存仍由调用方在当前进程中完成（只有一个写入者）；
+        异常退出的进程中未返回的用户本次跳过
+
+    返回:
+        list: 爬取的用户记录列表（按完成顺序）
+    """
+    if existing_records is None:
+        existing_records = load_existing_records(existing_records_path)
+    existing_index = build_existing_record_index(existing_records)
+    pool = worker_pool if worker_pool is not None else CrawlWorkerPool(login_user_id, workers, cookie_path, backend, base_url)
+    shards = assign_shards(user_ids, list(range(pool.workers)))
+    partitions = [shards[worker_index] for worker_index in range(pool.workers)]
+    active = sum(1 for partition in partitions if partition)
+    if not active:
+        return []
+
+    cycle_options = {
+        "max_pages_per_user": max_pages_per_user, "existing_records_path": existing_records_path,
+        "days_threshold": days_threshold, "max_in_flight": max_in_flight_per_worker,
+        "requests_per_second": requests_per_second / active if requests_per_second else requests_per_second,
+        "task_timeout": task_timeout,
+    }
+    print(f"使用 {active} 个工作进程爬取 {len(user_ids)} 个用户，合计限速每秒 {requests_per_second} 页")
+
+    try:
+        results = await pool.crawl(partitions, cycle_options, existing_index, cursors, on_result)
+    finally:
+        if worker_pool is None:
+            await asyncio.to_thread(pool.close)
+
+    print(f"用户爬取完成，成功 {len(results)} 个，跳过 {len(user_ids) - len(results)} 个")
+    print_pages_fetched(results)
+    return results
+
+def summarize_pages_fetched(crawl_results):
+    """
+    统计本周期每个用户抓取的页数
+
+    返回:
+        dict: {"users", "pages", "single_page_users", "max_pages", "incomplete_users"}
+    """
+    pages = [result.get("pages_fetched", 0) for result in crawl_results]
+    return {
+        "users": len(pages),
+        "pages": sum(pages),
+        "single_page_users": sum(1 for count in pages if count <= 1),
+        "max_pages": max(pages, default=0),
+        "incomplete_users": sum(1 for result in crawl_results if not result.get("complete")),
+    }
+
+def print_pages_fetched(crawl_results):
+    summary = summarize_pages_fetched(crawl_results)
+    if not summary["users"]:
+        return
+    print(f"抓取页数：共 {summary['pages']} 页，平均每用户 {summary['pages'] / summary['users']:.2f} 页，"
+          f"只抓 1 页的用户 {summary['single_page_users']}/{summary['users']} 个，单个用户最多 {summary['max_pages']} 页，"
+          f"未抓到水位线的用户 {summary['incomplete_users']} 个")
+
+def record_sort_key(record):
+    """记录按时间排序的键，日期无法解析的记录排在最旧的位置"""
+    return record.timestamp if record.timestamp is not None else float("-inf")
+
+def merge_sorted_records(existing_list, new_list):
+    """
+    将新记录归并到已有记录中（直接修改 existing_list）
+
+    参数:
+        existing_list: 已有记录，按时间倒序排列（最新的在前面）
+        new_list: 新爬取的记录，按时间倒序排列
+
+    返回:
+        list: 实际新增的记录
+
+    说明:
+        只逐条比较时间不早于最旧一条新记录的已有记录，归并好的开头部分整段替换回去，
+        其余已有记录原地不动；新记录通常都比已有记录新，耗时只与新记录数有关
+    """
+    merged = []
+    added = []
+    added_keys = set()
+    i = 0
+    n = len(existing_list)
+    for record in new_list:
+        timestamp = record_sort_key(record)
+        # 比这条新记录更新的已有记录先放入结果
+        while i < n and record_sort_key(existing_list[i]) > timestamp:
+            merged.append(existing_list[i])
+            i += 1
+        # 同一时间的已有记录才可能重复
+        key = record_key(record)
+        duplicate = key in added_keys
+        k = i
+        while not duplicate and k < n and record_sort_key(existing_list[k]) == timestamp:
+            duplicate = record_key(existing_list[k]) == key
+            k += 1
+        if not duplicate:
+            merged.append(record)
+            added.append(record)
+            added_keys.add(key)
+    existing_list[:i] = merged
+    return added
+
+def merge_records(existing_records, new_records, leaderboard=None, notifier=None, added_records=None):
     """
     合并新旧记录，避免重复
     
     参数:
-        existing_records: 已存在的记录列表
+        existing_records: 已存在的记录列表（每个用户的记录按时间倒序排列）
         new_records: 新爬取的记录列表
+        leaderboard: 可选的 LeaderboardAggregate，新合并的记录同步计入排行榜统计
+        notifier: 可选的 NewRecordQueue，新合并的记录同时发布给通知线程
+        added_records: 可选的列表，有新记录的用户以 {user_id, user_name, records} 追加到其中
+            （只含实际新合并的记录，供 JSON 存储写入增量日志）
     
     返回:
-        list: 合并后的记录列表
+        list: 合并后的记录列表（有新记录的用户直接在原记录列表上归并，没有新记录的用户不做任何处理）
     """
-    # 如果没有旧记录，直接返回新记录
-    if not existing_records:
-        return new_records
+    # 没有旧记录时同样逐个用户归并：爬取结果中的记录未必有序、可能重复，且带有 pages_fetched 等只用于爬取的字段
+    # 用户ID到列表位置的映射，只替换有变化的用户
+    merged_records = list(existing_records)
+    user_positions = {user["user_id"]: position for position, user in enumerate(existing_records)}
     
-    # 创建用户ID到记录的映射
-    user_records_map = {}
-    
-    # 首先加载所有已存在的记录
-    for record in existing_records:
-        user_id = record["user_id"]
-        user_records_map[user_id] = {
-            "user_id": user_id,
-            "user_name": record["user_name"],
-            "records": record["records"]
-        }
-    
-    # 然后合并新记录
     for new_record in new_records:
         user_id = new_record["user_id"]
+        new_list = sorted(new_record["records"], key=record_sort_key, reverse=True)
+        position = user_positions.get(user_id)
         
-        # 如果用户已存在，合并记录
-        if user_id in user_records_map:
-            existing_record_set = set()
-            existing_records_list = user_records_map[user_id]["records"]
-            
-            # 将已有记录转换为集合以便快速查找
-            for record in existing_records_list:
-                record_key = f"{record.get('problem_number', '')}_{record.get('post_date', '')}"
-                existing_record_set.add(record_key)
-            
-            # 添加新记录（如果不存在）
-            for record in new_record["records"]:
-                record_key = f"{record.get('problem_number', '')}_{record.get('post_date', '')}"
-                if record_key not in existing_record_set:
-                    existing_records_list.append(record)
-                    existing_record_set.add(record_key)
-            
+        # 如果用户已存在，归并记录
+        if position is not None:
+            user = merged_records[position]
+            user_name = user["user_name"]
             # 更新用户名（如果有新用户名）
             if new_record["user_name"] and new_record["user_name"] != "未知用户":
-                user_records_map[user_id]["user_name"] = new_record["user_name"]
+                user_name = new_record["user_name"]
+            added = merge_sorted_records(user["records"], new_list) if new_list else []
+            if user_name != user["user_name"]:
+                merged_records[position] = {"user_id": user_id, "user_name": user_name, "records": user["records"]}
         else:
-            # 新用户，直接添加
-            user_records_map[user_id] = new_record
-    
-    # 转换回列表
-    merged_records = list(user_records_map.values())
-    
-    # 对每个用户的记录按时间倒序排序（最新的在前面）
-    for record in merged_records:
-        if record["records"]:
-            try:
-                record["records"].sort(
-                    key=lambda x: datetime.strptime(x["post_date"], "%Y-%m-%d %H:%M:%S") if x["post_date"] else datetime.min,
-                    reverse=True
-                )
-            except:
-                pass
+            # 新用户，归并到空列表（同时去掉重复记录）
+            user_name = new_record["user_name"]
+            records = []
+            added = merge_sorted_records(records, new_list)
+            user_positions[user_id] = len(merged_records)
+            merged_records.append({"user_id": user_id, "user_name": user_name, "records": records})
+
+        if leaderboard is not None:
+            leaderboard.add(user_id, user_name, added)
+        if notifier is not None and added:
+            notifier.publish(user_id, user_name, added)
+        if added_records is not None and added:
+            added_records.append({"user_id": user_id, "user_name": user_name, "records": added})
     
     return merged_records
 
-def clean_old_records(records, days_threshold=60):
+def clean_old_records(records, days_threshold=60, leaderboard=None):
     """
     清理60天以前的旧记录
     
     参数:
         records: 用户记录列表
         days_threshold: 时间阈值（天）
+        leaderboard: 可选的 LeaderboardAggregate，被清理的记录同步移出排行榜统计
     
     返回:
         list: 清理后的记录列表
@@ -372,7 +978,7 @@ def clean_old_records(records, days_threshold=60):
         return records
     
     # 计算截止日期
-    cutoff_date = datetime.now() - timedelta(days=days_threshold)
+    cutoff_seconds = to_seconds(datetime.now() - timedelta(days=days_threshold))
     
     # 统计清理前的记录总数
     total_before = sum(len(user["records"]) for user in records)
@@ -386,16 +992,16 @@ def clean_old_records(records, days_threshold=60):
         
         # 过滤掉60天以前的记录
         new_records = []
+        removed_records = []
         for record in old_records:
-            try:
-                record_date = datetime.strptime(record["post_date"], "%Y-%m-%d %H:%M:%S")
-                if record_date >= cutoff_date:
-                    new_records.append(record)
-                else:
-                    removed_count += 1
-            except (ValueError, KeyError):
-                # 如果日期格式错误，保留记录
+            # 如果日期格式错误，保留记录
+            if record.timestamp is None or record.timestamp >= cutoff_seconds:
                 new_records.append(record)
+            else:
+                removed_records.append(record)
+        removed_count += len(removed_records)
+        if leaderboard is not None and removed_records:
+            leaderboard.remove(user_id, removed_records)
         
         # 只保留有记录的用户
         if new_records:
@@ -413,7 +1019,14 @@ def clean_old_records(records, days_threshold=60):
     
     return cleaned_records
 
-async def schedule_monitoring(login_user_name, interval_minutes=5, user_ids_file="user_ids.json", cookie_path="cookies.json"):
+async def refresh_problem_difficulty(refresher, users_data):
+    """补全题目难度；失败只输出日志，不影响本周期的记录保存"""
+    try:
+        await refresher.refresh(users_data)
+    except Exception as e:
+        print(f"[题目难度] 补全失败：{e}")
+
+async def schedule_monitoring(login_user_name, interval_minutes=5, user_ids_file="user_ids.json", cookie_path="cookies.json", backend="playwright", storage="json", leaderboard=None, notifier=None, adaptive_polling=False, max_poll_interval_minutes=None, refresh_difficulty=False, shard_accounts=False, crawl_workers=1):
     """
     定时异步监控函数
     
@@ -421,6 +1034,15 @@ async def schedule_monitoring(login_user_name, interval_minutes=5, user_ids_file
         interval_minutes: 监控间隔时间（分钟）
         user_ids_file: 用户ID列表文件路径
         cookie_path: cookies.json文件路径
+        backend: 抓取后端，"playwright" 或 "http"
+        storage: 记录存储，"json"（整个 user_records.json）或 "sqlite"（增量写入 user_records.db）
+        leaderboard: 可选的 LeaderboardAggregate，随合并与清理增量更新
+        notifier: 可选的 NewRecordQueue，每周期新合并的记录发布到该队列
+        adaptive_polling: 是否按用户活跃程度调整轮询间隔（不活跃的用户逐步降低频率）
+        max_poll_interval_minutes: 不活跃用户的最长轮询间隔（分钟），为 None 时取监控间隔的 16 倍；超过 10 分钟时不活跃用户的第一条新记录可能不弹出通知
+        refresh_difficulty: 是否按需补全 problem_list.json 中缺失或过期的题目难度
+        shard_accounts: 是否把所有账号监控列表的并集分给 cookies.json 中全部有效账号分片爬取
+        crawl_workers: 爬取用的工作进程数，大于 1 时由多个常驻进程分担抓取和解析（与 shard_accounts 同时设置时输出警告并忽略）
     
     功能:
         每5分钟执行一次爬虫任务，并将结果保存到带有时间戳的文件中
@@ -436,99 +1058,206 @@ async def schedule_monitoring(login_user_name, interval_minutes=5, user_ids_file
         
     interval_seconds = int(interval_minutes * 60)
     
-    # 加载已存在的记录
-    existing_records = []
-    try:
-        with open("user_records.json", "r", encoding="utf-8") as file:
-            existing_records = json.load(file)
-        print(f"已加载 {len(existing_records)} 条已有用户记录")
-    except (FileNotFoundError, json.JSONDecodeError):
-        print("未找到已有记录文件，将创建新文件")
-        existing_records = []
+    # 加载已存在的记录；JSON 记录和水位线由后台线程原子写入，保存时不阻塞事件循环
+    writer = BackgroundJsonWriter()
+    record_store = open_record_store(storage, writer=writer)
+    # 只在读取时把记录字典转换为 Record，之后全程比较整数时间，写入时再转换回来（JSON 存储同时重放增量日志）
+    existing_records = record_store.load_users()
+    if existing_records:
+        print(f"已加载 {len(existing_records)} 条已有用户记录（{record_store.name} 存储）")
+    else:
+        print("未找到已有记录，将创建新记录")
+    
+    # 每个用户的抓取水位线，没有水位线的用户根据已有记录建立
+    cursors = CrawlCursors()
+    seeded = cursors.seed(existing_records)
+    print(f"已加载 {len(cursors)} 个用户的抓取水位线（其中 {seeded} 个根据已有记录建立）")
+    
+    # 按活跃程度安排每个用户的轮询间隔
+    poller = None
+    if adaptive_polling:
+        poller = AdaptivePoller(interval_seconds, max_poll_interval_minutes * 60 if max_poll_interval_minutes is not None else None)
+        poller.seed(existing_records, to_seconds(datetime.now()))
+    
+    # 常驻的爬虫工作进程，各自的浏览器跨周期复用
+    worker_pool = None
+    if shard_accounts and crawl_workers > 1:
+        print(f"[警告] 同时设置了按账号分片和 {crawl_workers} 个工作进程：按账号分片爬取，工作进程数设置不生效")
+    elif crawl_workers > 1:
+        worker_pool = CrawlWorkerPool(login_user_id, crawl_workers, cookie_path, backend)
+    
+    # 新记录中的题目在通知之前补全难度，其余题目在定期清理时检查是否过期
+    refresher = None
+    if refresh_difficulty:
+        refresher = ProblemDifficultyRefresher(HttpProblemFetcher(load_cookie_header(login_user_id, cookie_path)))
     
     cleanup_counter = 6
     cleanup_interval = 6  # 每6次监控执行一次清理（大约每30分钟一次）
-    while True:
-        try:
-            # 记录开始时间
-            start_time = datetime.now()
-            timestamp = start_time.strftime("%Y%m%d_%H%M%S")
-            print(f"\n{'='*60}")
-            print(f"开始执行定时监控任务，时间：{start_time.strftime('%Y-%m-%d %H:%M:%S')}")
-            print(f"{'='*60}")
+    # 浏览器跨周期复用，只在首次使用或崩溃后启动
+    browser_pools = {login_user_id: create_browser_pool(login_user_id, cookie_path)}
+    try:
+        while True:
+            try:
+                # 记录开始时间
+                start_time = datetime.now()
+                METRICS.begin_cycle()
+                timestamp = start_time.strftime("%Y%m%d_%H%M%S")
+                print(f"\n{'='*60}")
+                print(f"开始执行定时监控任务，时间：{start_time.strftime('%Y-%m-%d %H:%M:%S')}")
+                print(f"{'='*60}")
             
-            # 读取用户ID列表
-            with open(user_ids_file, "r") as file:
-                user_ids_list = json.load(file)
-            user_ids = user_ids_list.get(login_user_id)
-            print(user_ids)
-            print(f"本次监控用户数量：{len(user_ids)}")
+                # 读取用户ID列表
+                with open(user_ids_file, "r") as file:
+                    user_ids_list = json.load(file)
+                if shard_accounts:
+                    # 每个周期重新读取有效账号，新登录的账号下个周期即参与分片
+                    account_ids = load_valid_accounts(cookie_path)
+                    user_ids = union_watch_list(user_ids_list)
+                    for account_id in account_ids:
+                        if account_id not in browser_pools:
+                            browser_pools[account_id] = create_browser_pool(account_id, cookie_path)
+                else:
+                    user_ids = user_ids_list.get(login_user_id)
+                print(user_ids)
+                cycle_seconds = to_seconds(start_time)
+                if poller is not None:
+                    watched_count = len(user_ids)
+                    user_ids = poller.due_users(user_ids, cycle_seconds)
+                    print(f"本次监控用户数量：{len(user_ids)}（共监控 {watched_count} 个，其余用户未到轮询时间）")
+                else:
+                    print(f"本次监控用户数量：{len(user_ids)}")
             
-            # 执行爬虫任务，可以指定每个用户爬取的页数和停止条件
-            max_pages_per_user = 5  # 可以调整这个值
-            days_threshold = 60  # 60天阈值
-            existing_records_path = "user_records.json"  # 已存在记录文件
+                # 执行爬虫任务，可以指定每个用户爬取的页数和停止条件
+                max_pages_per_user = 5  # 可以调整这个值
+                days_threshold = 60  # 60天阈值
+                existing_records_path = "user_records.json"  # 已存在记录文件
+                saved_seconds_before = sum(pool.saved_seconds for pool in browser_pools.values())
             
-            new_user_record_list = await run_spider(
-                login_user_id,
-                user_ids, 
-                cookie_path, 
-                max_pages_per_user,
-                existing_records_path,
-                days_threshold
-            )
+                with METRICS.time("monitor_phase_seconds", "监控周期各阶段耗时（秒）", phase="crawl"):
+                    if shard_accounts:
+                        new_user_record_list = await run_sharded_spider(
+                            account_ids,
+                            user_ids,
+                            cookie_path,
+                            max_pages_per_user,
+                            existing_records_path,
+                            days_threshold,
+                            backend,
+                            browser_pools=browser_pools,
+                            existing_records=existing_records,
+                            cursors=cursors
+                        )
+                    elif worker_pool is not None:
+                        new_user_record_list = await run_multiprocess_spider(
+                            login_user_id,
+                            user_ids,
+                            crawl_workers,
+                            cookie_path,
+                            max_pages_per_user,
+                            existing_records_path,
+                            days_threshold,
+                            backend,
+                            existing_records=existing_records,
+                            cursors=cursors,
+                            worker_pool=worker_pool
+                        )
+                    else:
+                        new_user_record_list = await run_spider(
+                            login_user_id,
+                            user_ids, 
+                            cookie_path, 
+                            max_pages_per_user,
+                            existing_records_path,
+                            days_threshold,
+                            backend,
+                            browser_pool=browser_pools[login_user_id],
+                            existing_records=existing_records,
+                            cursors=cursors
+                        )
+                if refresher is not None:
+                    await refresh_problem_difficulty(refresher, new_user_record_list)
             
-            # 合并新旧记录
-            merged_records = merge_records(existing_records, new_user_record_list)
-            # 每6次监控执行一次清理（大约每30分钟一次）
-            cleanup_counter += 1
-            if cleanup_counter >= cleanup_interval:
-                print(f"\n执行定期清理：删除超过 {days_threshold} 天的旧记录")
-                cleaned_records = clean_old_records(merged_records, days_threshold)
-                merged_records = cleaned_records
-                cleanup_counter = 0  # 重置计数器
+                # 合并新旧记录
+                added_records = []
+                with METRICS.time("monitor_phase_seconds", "监控周期各阶段耗时（秒）", phase="merge"):
+                    merged_records = merge_records(existing_records, new_user_record_list, leaderboard, notifier, added_records)
+                # 每6次监控执行一次清理（大约每30分钟一次）
+                cleanup_counter += 1
+                cutoff_date = None
+                if cleanup_counter >= cleanup_interval:
+                    print(f"\n执行定期清理：删除超过 {days_threshold} 天的旧记录")
+                    cutoff_date = (datetime.now() - timedelta(days=days_threshold)).strftime("%Y-%m-%d %H:%M:%S")
+                    with METRICS.time("monitor_phase_seconds", "监控周期各阶段耗时（秒）", phase="clean"):
+                        cleaned_records = clean_old_records(merged_records, days_threshold, leaderboard)
+                    merged_records = cleaned_records
+                    cleanup_counter = 0  # 重置计数器
+                    if refresher is not None:
+                        await refresh_problem_difficulty(refresher, merged_records)
             
-            # 保存结果到文件（带有时间戳）
-            # backup_file = f"user_records_{timestamp}.json"
-            # with open(backup_file, "w", encoding="utf-8") as file:
-            #     json.dump(merged_records, file, ensure_ascii=False, indent=2)
+                # 保存结果到文件（带有时间戳）
+                # backup_file = f"user_records_{timestamp}.json"
+                # with open(backup_file, "w", encoding="utf-8") as file:
+                #     json.dump(merged_records, file, ensure_ascii=False, indent=2)
             
-            # 更新主记录文件
-            with open("user_records.json", "w", encoding="utf-8") as file:
-                json.dump(merged_records, file, ensure_ascii=False, indent=2)
+                # 更新主记录（SQLite 存储只写入新记录，JSON 存储只追加增量日志、清理时压缩为快照）
+                with METRICS.time("monitor_phase_seconds", "监控周期各阶段耗时（秒）", phase="persist"):
+                    record_store.save(merged_records, new_user_record_list, cutoff_date, added_records)
+                    # 记录保存成功后再推进水位线
+                    advanced = cursors.update(new_user_record_list)
+                    cursors.save(writer)
+                if poller is not None:
+                    poller.observe_results(new_user_record_list, cycle_seconds)
             
-            # 更新existing_records，以便下次使用
-            existing_records = merged_records
+                # 更新existing_records，以便下次使用
+                existing_records = merged_records
             
-            # 计算执行时间
-            end_time = datetime.now()
-            execution_time = (end_time - start_time).total_seconds()
-            print(f"本次监控任务完成，耗时：{execution_time:.2f}秒")
-            # print(f"备份文件已保存到：{backup_file}")
-            print(f"主记录文件已更新：user_records.json")
-            print(f"总用户记录数：{len(merged_records)}")
+                # 计算执行时间
+                end_time = datetime.now()
+                execution_time = (end_time - start_time).total_seconds()
+                print(f"本次监控任务完成，耗时：{execution_time:.2f}秒")
+                launch_count = sum(pool.launch_count for pool in browser_pools.values())
+                if launch_count:
+                    saved_seconds = sum(pool.saved_seconds for pool in browser_pools.values())
+                    reuse_count = sum(pool.reuse_count for pool in browser_pools.values())
+                    print(f"浏览器复用：本次节省启动时间 {saved_seconds - saved_seconds_before:.2f}秒，累计节省 {saved_seconds:.2f}秒"
+                          f"（启动 {launch_count} 次，复用 {reuse_count} 次）")
+                # print(f"备份文件已保存到：{backup_file}")
+                print(f"主记录已更新（{record_store.name} 存储）")
+                print(f"总用户记录数：{len(merged_records)}")
             
-            # 统计新爬取的记录数
-            new_records_count = sum(len(user["records"]) for user in new_user_record_list)
-            total_records_count = sum(len(user["records"]) for user in merged_records)
-            print(f"本次新爬取记录数：{new_records_count}")
-            print(f"总记录数：{total_records_count}")
+                # 统计新爬取的记录数
+                new_records_count = sum(len(user["records"]) for user in new_user_record_list)
+                total_records_count = sum(len(user["records"]) for user in merged_records)
+                print(f"本次新爬取记录数：{new_records_count}，推进水位线的用户 {advanced} 个")
+                print(f"总记录数：{total_records_count}")
+                METRICS.histogram("monitor_cycle_seconds", "监控周期总耗时（秒）").observe(execution_time)
+                METRICS.end_cycle(users=len(user_ids), new_records=new_records_count, total_records=total_records_count, advanced_users=advanced)
             
-            # 显示下一次执行时间
-            next_time = end_time.timestamp() + interval_seconds
-            next_time_str = datetime.fromtimestamp(next_time).strftime("%Y-%m-%d %H:%M:%S")
-            print(f"下一次监控将在 {interval_minutes} 分钟后执行，预计时间：{next_time_str}")
-            print(f"{'='*60}\n")
+                # 显示下一次执行时间
+                next_time = end_time.timestamp() + interval_seconds
+                next_time_str = datetime.fromtimestamp(next_time).strftime("%Y-%m-%d %H:%M:%S")
+                print(f"下一次监控将在 {interval_minutes} 分钟后执行，预计时间：{next_time_str}")
+                print(f"{'='*60}\n")
             
-            # 等待指定的时间间隔
-            await asyncio.sleep(interval_seconds)
+                # 等待指定的时间间隔
+                await asyncio.sleep(interval_seconds)
             
-        except Exception as e:
-            print(f"监控任务执行出错：{e}")
-            import traceback
-            traceback.print_exc()
-            print(f"将在1分钟后重试...")
-            await asyncio.sleep(60)  # 出错时等待1分钟再重试
+            except Exception as e:
+                print(f"监控任务执行出错：{e}")
+                import traceback
+                traceback.print_exc()
+                print(f"将在1分钟后重试...")
+                await asyncio.sleep(60)  # 出错时等待1分钟再重试
+    finally:
+        for browser_pool in browser_pools.values():
+            await browser_pool.close()
+        if worker_pool is not None:
+            await asyncio.to_thread(worker_pool.close)
+        # 停止监控前写完已提交的记录和水位线
+        await asyncio.to_thread(writer.close)
+        record_store.close()
+        if refresher is not None:
+            await refresher.fetcher.close()
 
 # async def single_run(user_ids_file="user_ids.json", cookie_path="cookies.json", max_pages_per_user=5):
 #     """
@@ -0,0 +1,216 @@
+import asyncio
+import http.client
+import json
+import socket
+import time
+from urllib.parse import urlsplit
+from Metrics import METRICS
+from Record_Parser import LUOGU_BASE_URL, PROBLEM_PATH, RECORD_LIST_PATH, extract_page_payload, parse_problem_payload, parse_record_payload
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept": "application/json, text/html;q=0.9",
+    "Accept-Language": "zh-CN,zh;q=0.9",
+    "Connection": "keep-alive",
+}
+
+def load_cookie_header(login_user_id, cookie_path="cookies.json"):
+    """
+    从 cookies.json 中读取指定账号的 cookies 并拼接成 Cookie 请求头
+
+    参数:
+        login_user_id: 登录的用户ID
+        cookie_path: cookies.json文件路径
+
+    返回:
+        str: Cookie 请求头，找不到账号时返回空字符串
+    """
+    with open(cookie_path, "r") as file:
+        cookies = json.load(file)
+
+    for account in cookies:
+        if account.get("user_id") == login_user_id:
+            return "; ".join(f"{c['name']}={c['value']}" for c in account.get("cookies", []) if "name" in c)
+    return ""
+
+class HttpConnectionPool:
+    """
+    基于 http.client 的长连接池
+
+    每个连接同一时间只被一个请求使用，阻塞的收发放到线程中执行，不占用事件循环
+    """
+    def __init__(self, base_url=LUOGU_BASE_URL, size=10, timeout=15):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.size = size
+        self.timeout = timeout
+        self._idle = []
+        self._semaphore = asyncio.Semaphore(size)
+
+    def _new_connection(self):
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    @staticmethod
+    def _send(connection, method, path, headers):
+        connection.request(method, path, headers=headers)
+        response = connection.getresponse()
+        body = response.read()
+        return response.status, body.decode("utf-8", errors="replace")
+
+    @staticmethod
+    def _abort(connection):
+        # 请求被取消时线程可能仍阻塞在收发上：先 shutdown 让它立即出错返回，再关闭连接
+        sock = connection.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        connection.close()
+
+    async def request(self, method, path, headers=None):
+        """
+        发送请求并返回 (状态码, 响应正文)
+
+        复用空闲连接；若空闲连接已被服务器断开，换一个新连接重试一次
+        """
+        async with self._semaphore:
+            connection = self._idle.pop() if self._idle else None
+            reused = connection is not None
+            if connection is None:
+                connection = self._new_connection()
+            try:
+                result = await asyncio.to_thread(self._send, connection, method, path, headers or {})
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                connection.close()
+                if not reused:
+                    raise
+                METRICS.counter("crawler_retries_total", "重试次数", kind="reconnect").inc()
+                connection = self._new_connection()
+                try:
+                    result = await asyncio.to_thread(self._send, connection, method, path, headers or {})
+                except BaseException:
+                    self._abort(connection)
+                    raise
+            except BaseException:
+                # 包括被取消（如调度器的 task_timeout）：连接不再放回空闲列表
+                self._abort(connection)
+                raise
+            self._idle.append(connection)
+            return result
+
+    def close(self):
+        for connection in self._idle:
+            connection.close()
+        self._idle.clear()
+
+class HttpRecordFetcher:
+    """
+    直接请求记录列表数据的抓取后端，不启动浏览器
+
+    参数:
+        cookie_header: Cookie 请求头
+        base_url: 站点地址（可指向本地模拟服务器）
+        pool_size: 连接池大小
+        fallback_factory: 可选的异步工厂函数，HTTP 获取失败时用它创建浏览器后端兜底
+    """
+    name = "http"
+
+    def __init__(self, cookie_header, base_url=LUOGU_BASE_URL, pool_size=10, fallback_factory=None):
+        self.base_url = base_url
+        self.headers = dict(DEFAULT_HEADERS)
+        if cookie_header:
+            self.headers["Cookie"] = cookie_header
+        self.pool = HttpConnectionPool(base_url, size=pool_size)
+        self.fallback_factory = fallback_factory
+        self._fallback = None
+        self._fallback_lock = asyncio.Lock()
+
+    async def open_session(self, user_id):
+        return None
+
+    async def close_session(self, session):
+        pass
+
+    async def fetch_record_page(self, session, user_id, page_num):
+        """
+        获取一页记录
+
+        返回:
+            dict: {"user_name", "records", "row_count", "skipped", "empty"}
+        """
+        try:
+            return await self._fetch_json_page(user_id, page_num)
+        except Exception as e:
+            if self.fallback_factory is None:
+                raise
+            print(f"用户 {user_id} 第 {page_num} 页 HTTP 获取失败，改用浏览器: {str(e)[:50]}")
+            METRICS.counter("crawler_retries_total", "重试次数", kind="browser_fallback").inc()
+            fallback = await self._get_fallback()
+            page = await fallback.open_session(user_id)
+            try:
+                return await fallback.fetch_record_page(page, user_id, page_num)
+            finally:
+                await fallback.close_session(page)
+
+    async def _fetch_json_page(self, user_id, page_num):
+        path = RECORD_LIST_PATH.format(user_id=user_id, page_num=page_num) + "&_contentOnly=1"
+        start = time.perf_counter()
+        status, body = await self.pool.request("GET", path, self.headers)
+        received = time.perf_counter()
+        METRICS.histogram("crawler_page_phase_seconds", "每页各阶段耗时（秒）", backend=self.name, phase="navigate").observe(received - start)
+        if status != 200:
+            raise RuntimeError(f"HTTP 状态码 {status}")
+
+        page_data = parse_record_payload(extract_page_payload(body))
+        METRICS.histogram("crawler_page_phase_seconds", "每页各阶段耗时（秒）", backend=self.name, phase="extract").observe(time.perf_counter() - received)
+        if page_data is None:
+            raise ValueError("响应中没有记录数据")
+        page_data["empty"] = page_data["row_count"] == 0
+        return page_data
+
+    async def _get_fallback(self):
+        async with self._fallback_lock:
+            if self._fallback is None:
+                self._fallback = await self.fallback_factory()
+            return self._fallback
+
+    async def close(self):
+        self.pool.close()
+        if self._fallback is not None:
+            await self._fallback.close()
+            self._fallback = None
+
+class HttpProblemFetcher:
+    """
+    直接请求题目页面数据获取题目难度，不启动浏览器
+
+    参数:
+        cookie_header: Cookie 请求头（可为空）
+        base_url: 站点地址（可指向本地模拟服务器）
+        pool_size: 连接池大小
+    """
+    def __init__(self, cookie_header="", base_url=LUOGU_BASE_URL, pool_size=10):
+        self.headers = dict(DEFAULT_HEADERS)
+        if cookie_header:
+            self.headers["Cookie"] = cookie_header
+        self.pool = HttpConnectionPool(base_url, size=pool_size)
+
+    async def fetch_difficulty(self, problem_number):
+        """获取一道题目的难度名称"""
+        path = PROBLEM_PATH.format(problem_number=problem_number) + "?_contentOnly=1"
+        status, body = await self.pool.request("GET", path, self.headers)
+        if status != 200:
+            raise RuntimeError(f"HTTP 状态码 {status}")
+
+        parsed = parse_problem_payload(extract_page_payload(body))
+        if parsed is None:
+            raise ValueError("响应中没有题目难度")
+        return parsed[1]
+
+    async def close(self):
+        self.pool.close()
@@ -0,0 +1,174 @@
+import threading
+from bisect import bisect_right
+from datetime import datetime
+from Record_Types import SECONDS_PER_DAY, as_record, to_seconds
+
+class LeaderboardAggregate:
+    """
+    排行榜增量统计：按 用户 × 日期 × 难度等级 维护通过数
+
+    参数:
+        level_of: 函数，输入题号返回难度等级（未知难度返回 -1，不计入排行榜）
+        num_levels: 难度等级数
+
+    功能:
+        1. merge_records 合并新记录时调用 add，clean_old_records 清理时调用 remove
+        2. 每个用户按日期维护各等级的前缀和，查询时只需 O(用户数 × 等级数)
+        3. 起始日当天的记录单独保存时间戳，保证与逐条比较的结果一致
+        4. 首次使用时 rebuild 从磁盘建立统计，之后难度表更新只需 relevel 重新分级
+    """
+    def __init__(self, level_of, num_levels=7):
+        self.level_of = level_of
+        self.num_levels = num_levels
+        self._lock = threading.Lock()
+        self._users = {}
+        # 从磁盘重建期间被移除的记录：(用户, 记录键)，换入新统计时排除
+        self._removed_during_rebuild = None
+
+    @staticmethod
+    def _user(users, user_id, user_name=None):
+        user = users.get(user_id)
+        if user is None:
+            user = {"user_name": user_name or "", "keys": {}, "days": {}, "stamps": {}, "prefix": None}
+            users[user_id] = user
+        elif user_name and user_name != "未知用户":
+            user["user_name"] = user_name
+        return user
+
+    def _level(self, problem_number):
+        level = self.level_of(problem_number)
+        return level if 0 <= level < self.num_levels else -1
+
+    def _insert(self, user, key, timestamp, level):
+        # 未知难度的记录也保留键和时间，难度表更新后可以直接重新分级
+        user["keys"][key] = (timestamp, level)
+        if level < 0:
+            return
+        day = timestamp // SECONDS_PER_DAY
+        user["days"].setdefault(day, [0] * self.num_levels)[level] += 1
+        user["stamps"].setdefault(day, []).append((timestamp, level))
+        user["prefix"] = None
+
+    def _add_records(self, users, user_id, user_name, records):
+        user = self._user(users, user_id, user_name)
+        for record in records:
+            key = (record.problem_number, record.post_date)
+            if key in user["keys"] or record.timestamp is None:
+                continue
+            self._insert(user, key, record.timestamp, self._level(record.problem_number))
+
+    def add(self, user_id, user_name, records):
+        """加入一个用户的新记录 Record（已统计过的记录会被忽略）"""
+        with self._lock:
+            self._add_records(self._users, user_id, user_name, records)
+
+    def _discard(self, user, key):
+        parsed = user["keys"].pop(key, None)
+        if parsed is None or parsed[1] < 0:
+            return
+        timestamp, level = parsed
+        day = timestamp // SECONDS_PER_DAY
+        counts = user["days"][day]
+        counts[level] -= 1
+        user["stamps"][day].remove(parsed)
+        if not any(counts):
+            del user["days"][day]
+            del user["stamps"][day]
+        user["prefix"] = None
+
+    def remove(self, user_id, records):
+        """移除一个用户被清理掉的记录 Record"""
+        with self._lock:
+            user = self._users.get(user_id)
+            for record in records:
+                key = (record.problem_number, record.post_date)
+                if self._removed_during_rebuild is not None:
+                    self._removed_during_rebuild.add((user_id, key))
+                if user is not None:
+                    self._discard(user, key)
+
+    def _merge_keys(self, users, source, removed=()):
+        # 把 source 中已统计的记录按当前难度表重新分级后并入 users
+        for user_id, old in source.items():
+            user = self._user(users, user_id, old["user_name"])
+            for key, (timestamp, _) in old["keys"].items():
+                if key not in user["keys"] and (user_id, key) not in removed:
+                    self._insert(user, key, timestamp, self._level(key[0]))
+
+    def rebuild(self, users_data):
+        """
+        根据全部用户记录重新统计（记录可以是字典或 Record）
+
+        磁盘上的记录可能落后于已经合并的记录（后台写入和日志尚未落盘），
+        所以新统计在锁外单独建立，换入前再并入内存中已有的记录；
+        重建期间调用 remove 移除的记录不会被带回。查询始终看到完整的旧统计或新统计。
+        """
+        with self._lock:
+            self._removed_during_rebuild = set()
+        users = {}
+        try:
+            for user in users_data:
+                self._add_records(users, user.get("user_id"), user.get("user_name"),
+                                  [as_record(record) for record in user.get("records", [])])
+        except BaseException:
+            with self._lock:
+                self._removed_during_rebuild = None
+            raise
+        with self._lock:
+            removed, self._removed_during_rebuild = self._removed_during_rebuild, None
+            for user_id, key in removed:
+                if user_id in users:
+                    self._discard(users[user_id], key)
+            self._merge_keys(users, self._users, removed)
+            self._users = users
+
+    def relevel(self):
+        """题目难度表更新后，按新难度重新分级已统计的记录，不需要重新读取磁盘"""
+        with self._lock:
+            users = {}
+            self._merge_keys(users, self._users)
+            self._users = users
+
+    def _prefix(self, user):
+        # prefix[level][i] 为按日期升序排列的前 i 天该等级的通过数之和
+        if user["prefix"] is None:
+            days = sorted(user["days"])
+            prefix = [[0] * (len(days) + 1) for _ in range(self.num_levels)]
+            for i, day in enumerate(days):
+                counts = user["days"][day]
+                for level in range(self.num_levels):
+                    prefix[level][i + 1] = prefix[level][i] + counts[level]
+            user["prefix"] = (days, prefix)
+        return user["prefix"]
+
+    def query(self, days, min_lv, max_lv, now=None):
+        """
+        查询近 days 天内难度在 [min_lv, max_lv] 的通过数
+
+        返回:
+            list: [{"user_id", "user_name", "count"}, ...]，按通过数从高到低排列，不含通过数为 0 的用户
+        """
+        now = now or datetime.now()
+        start_seconds = to_seconds(now) - days * SECONDS_PER_DAY
+        start_day = int(start_seconds // SECONDS_PER_DAY)
+        min_lv = max(min_lv, 0)
+        max_lv = min(max_lv, self.num_levels - 1)
+
+        leaderboard = []
+        with self._lock:
+            for user_id, user in self._users.items():
+                sorted_days, prefix = self._prefix(user)
+                # 起始日之后的整天直接用前缀和
+                index = bisect_right(sorted_days, start_day)
+                count = 0
+                for level in range(min_lv, max_lv + 1):
+                    count += prefix[level][-1] - prefix[level][index]
+                # 起始日当天逐条比较时间
+                for timestamp, level in user["stamps"].get(start_day, []):
+                    if timestamp >= start_seconds and min_lv <= level <= max_lv:
+                        count += 1
+                if count > 0:
+                    leaderboard.append({"user_id": user_id, "user_name": user["user_name"], "count": count})
+
+        leaderboard.sort(key=lambda x: x['count'], reverse=True)
+        return leaderboard
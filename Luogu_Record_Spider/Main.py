@@ -1,12 +1,20 @@
 import webview
 import asyncio
 import threading
+import multiprocessing
 import json
 import os
 import time
 from datetime import datetime, timedelta
 from Get_Cookies import Recent_Login, Get_New_Cookies
 from Get_Record import schedule_monitoring
+from Record_Store import open_record_store
+from Leaderboard import LeaderboardAggregate
+from Record_Index import UserRecordIndex
+from Data_Cache import CachedJsonFile, write_json_atomic
+from Record_Notifier import NewRecordQueue, RecentKeySet
+from Record_Types import Record, to_seconds
+from Metrics import METRICS, MetricsServer
 
 # ==========================================
 # --- 1. 配置区域 ---
@@ -37,6 +45,43 @@ DIFFICULTY_LEVELS = {
 # 反向映射用于前端下拉框生成
 LEVELS_TO_NAME = {v: k for k, v in DIFFICULTY_LEVELS.items()}
 
+# 题目不在难度表中时使用的 (难度, 难度等级, 颜色)
+UNKNOWN_PROBLEM = ("未知", -1, DEFAULT_COLOR)
+
+def build_problem_index(problem_map):
+    """problem_list.json 的派生索引：题号 → (难度, 难度等级, 颜色)"""
+    return {
+        p_num: (diff, DIFFICULTY_LEVELS.get(diff, -1), DIFFICULTY_COLORS.get(diff, DEFAULT_COLOR))
+        for p_num, diff in problem_map.items()
+    }
+
+# 记录抓取后端："playwright"（浏览器）或 "http"（直接请求，失败时自动改用浏览器）
+CRAWL_BACKEND = "playwright"
+
+# 记录存储："json"（user_records.json）或 "sqlite"（user_records.db，首次使用时自动导入 JSON）
+RECORD_STORAGE = "json"
+
+# 按活跃程度调整每个用户的轮询间隔：活跃用户每个周期轮询，不活跃的用户逐步降低到最长 MAX_POLL_INTERVAL_MINUTES 分钟一次；会推迟不活跃用户新提交的通知，默认关闭
+ADAPTIVE_POLLING = False
+
+# 不活跃用户的最长轮询间隔（分钟）；通知只提示10分钟内的提交，不超过10分钟才能保证新提交都弹出通知。为 None 时取监控间隔的 16 倍
+MAX_POLL_INTERVAL_MINUTES = 8
+
+# 新记录中的题目不在 problem_list.json 中（或难度已超过 30 天未更新）时，只查询这些题目的难度；会额外请求题目页面，默认关闭
+REFRESH_DIFFICULTY = False
+
+# 把所有账号监控列表的并集分给 cookies.json 中全部有效账号爬取，每个账号独立的浏览器上下文和限速
+SHARD_ACCOUNTS = False
+
+# 爬取用的工作进程数：监控几百个用户时单个进程的解析和浏览器通信会占满一个核，可调大分给多个常驻进程；与 SHARD_ACCOUNTS 同时开启时只按账号分片
+CRAWL_WORKERS = 1
+
+# 本机指标接口端口（Prometheus 文本格式，如 9464 对应 http://127.0.0.1:9464/metrics），为 None 时不开启
+METRICS_PORT = None
+
+# 每个监控周期的指标汇总追加写入的 JSON Lines 文件（如 "metrics.jsonl"，不会自动轮换），为 None 时不写文件
+METRICS_LOG_PATH = None
+
 # 桌面右下角弹窗模板 (颜色已更新)
 TOAST_HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -105,8 +150,22 @@ class Api:
         self.loop = None
         self.monitor_task = None
         self.current_username = None 
-        self.notified_records = set() 
+        # 已通知记录只需保留到超出10分钟的通知窗口
+        self.notified_records = RecentKeySet(ttl_seconds=15 * 60)
+        self.new_record_queue = NewRecordQueue()
+        self.monitor_generation = 0
         self.monitoring_active = False 
+        # 界面线程只读，按修改时间缓存
+        self.record_store = open_record_store(RECORD_STORAGE, cached=True)
+        self.problem_cache = CachedJsonFile('problem_list.json', dict, build_problem_index)
+        self.problem_index = {}
+        self.problem_index_version = -1
+        # 用户详情页按用户建立的索引（难度和颜色预先算好）
+        self.record_index = UserRecordIndex(self.record_store, self.problem_cache, UNKNOWN_PROBLEM)
+        self.leaderboard = LeaderboardAggregate(lambda p_num: self.problem_index.get(p_num, UNKNOWN_PROBLEM)[1], len(DIFFICULTY_LEVELS))
+        self.leaderboard_lock = threading.Lock()
+        self.leaderboard_loaded = False
+        self.metrics_server = None
 
     def set_window(self, window):
         self._window = window
@@ -133,13 +192,22 @@ class Api:
         print(f"[系统] 准备启动监控: {username}")
         self.stop_monitoring()
         self.monitoring_active = True 
+        self.monitor_generation += 1
+        generation = self.monitor_generation
+        self._ensure_leaderboard()
+        METRICS.log_path = METRICS_LOG_PATH
+        if METRICS_PORT and self.metrics_server is None:
+            try:
+                self.metrics_server = MetricsServer(METRICS, port=METRICS_PORT).start()
+            except OSError as e:
+                print(f"[错误] 指标接口启动失败: {e}")
 
         # 线程1: 爬虫
         def crawler_thread_target():
             new_loop = asyncio.new_event_loop()
             asyncio.set_event_loop(new_loop)
             self.loop = new_loop
-            self.monitor_task = new_loop.create_task(schedule_monitoring(username, 0.5))
+            self.monitor_task = new_loop.create_task(schedule_monitoring(username, 0.5, backend=CRAWL_BACKEND, storage=RECORD_STORAGE, leaderboard=self.leaderboard, notifier=self.new_record_queue, adaptive_polling=ADAPTIVE_POLLING, max_poll_interval_minutes=MAX_POLL_INTERVAL_MINUTES, refresh_difficulty=REFRESH_DIFFICULTY, shard_accounts=SHARD_ACCOUNTS, crawl_workers=CRAWL_WORKERS))
             try:
                 new_loop.run_until_complete(self.monitor_task)
             except: pass
@@ -147,15 +215,21 @@ class Api:
                 if new_loop.is_running(): new_loop.stop()
                 new_loop.close()
 
-        # 线程2: 通知检测
+        # 线程2: 通知检测（启动时补查一次最近记录，之后消费爬虫发布的新记录）
         def notification_checker_target():
             print("[系统] 弹窗检测服务已启动")
-            while self.monitoring_active:
+            try:
+                self.check_and_notify()
+            except Exception as e:
+                print(f"[错误] 检测通知出错: {e}")
+            # 重新启动监控后旧线程自行退出，避免两个线程同时消费
+            while self.monitoring_active and generation == self.monitor_generation:
+                item = self.new_record_queue.get(timeout=1)
+                if item is None: continue
                 try:
-                    self.check_and_notify()
+                    self.notify_record(*item)
                 except Exception as e:
                     print(f"[错误] 检测通知出错: {e}")
-                time.sleep(10)
 
         t1 = threading.Thread(target=crawler_thread_target, daemon=True)
         t1.start()
@@ -172,46 +246,48 @@ class Api:
             self.monitor_task = None
 
     def check_and_notify(self):
-        problem_map = self._load_json('problem_list.json')
-        users_data = self._load_json('user_records.json')
-        if not users_data: return
-
         now = datetime.now()
 
+        # 只需要最近10分钟的记录
+        users_data = self.record_store.load_since((now - timedelta(minutes=10)).strftime("%Y-%m-%d %H:%M:%S"))
+        if not users_data: return
+
         for user in users_data:
             uid = user.get('user_id')
             uname = user.get('user_name')
             for record in user.get('records', []):
-                p_num = record.get('problem_number')
-                p_name = record.get('problem_name')
-                post_date_str = record.get('post_date')
-                
-                record_id = f"{uid}_{p_num}_{post_date_str}"
-                
-                if record_id in self.notified_records: continue
-                
-                try:
-                    record_time = datetime.strptime(post_date_str, "%Y-%m-%d %H:%M:%S")
-                    if now - record_time < timedelta(minutes=10):
-                        self.notified_records.add(record_id)
-                        
-                        difficulty = problem_map.get(p_num, "未知")
-                        color = DIFFICULTY_COLORS.get(difficulty, DEFAULT_COLOR)
-                        time_display = post_date_str.split(" ")[1]
-
-                        # 1. 桌面弹窗
-                        self.show_desktop_toast(uname, p_num, p_name, time_display, difficulty, color)
-
-                        # 2. 应用内弹窗
-                        notify_data = {
-                            "user_name": uname, "problem_number": p_num, "problem_name": p_name,
-                            "time_str": time_display, "difficulty": difficulty, "color": color
-                        }
-                        if self._window:
-                            self._window.evaluate_js(f'createNotificationCard({json.dumps(notify_data)})')
-                        
-                        time.sleep(1) 
-                except ValueError: continue
+                self.notify_record(uid, uname, Record.from_dict(record), now)
+
+    def notify_record(self, uid, uname, record, now=None):
+        """对一条新记录 Record 弹出通知（超过10分钟或已通知过的记录跳过）"""
+        now = now or datetime.now()
+        p_num = record.problem_number
+        p_name = record.problem_name
+        post_date_str = record.post_date
+
+        record_id = f"{uid}_{p_num}_{post_date_str}"
+
+        if record_id in self.notified_records: return
+
+        if record.timestamp is None: return
+        if to_seconds(now) - record.timestamp >= 10 * 60: return
+        self.notified_records.add(record_id)
+
+        difficulty, _, color = self.problem_cache.index().get(p_num, UNKNOWN_PROBLEM)
+        time_display = post_date_str.split(" ")[1]
+
+        # 1. 桌面弹窗
+        self.show_desktop_toast(uname, p_num, p_name, time_display, difficulty, color)
+
+        # 2. 应用内弹窗
+        notify_data = {
+            "user_name": uname, "problem_number": p_num, "problem_name": p_name,
+            "time_str": time_display, "difficulty": difficulty, "color": color
+        }
+        if self._window:
+            self._window.evaluate_js(f'createNotificationCard({json.dumps(notify_data)})')
+
+        time.sleep(1)
 
     def show_desktop_toast(self, uname, p_num, p_name, t_str, diff, col):
         screens = webview.screens
@@ -242,6 +318,19 @@ class Api:
                 return json.load(f)
         except: return {} if 'list' in filename else []
 
+    def _ensure_leaderboard(self):
+        """首次使用时从记录建立排行榜统计，题目难度表更新后按新难度重新分级；之后由爬虫线程增量更新"""
+        with self.leaderboard_lock:
+            problem_index = self.problem_cache.index()
+            if self.problem_cache.version == self.problem_index_version: return
+            self.problem_index = problem_index
+            if self.leaderboard_loaded:
+                self.leaderboard.relevel()
+            else:
+                self.leaderboard.rebuild(self.record_store.load())
+                self.leaderboard_loaded = True
+            self.problem_index_version = self.problem_cache.version
+
     def get_leaderboard_data(self, days, min_lv, max_lv):
         """获取排行榜数据"""
         try:
@@ -252,85 +341,39 @@ class Api:
         except:
             return {"status": "error", "message": "参数错误"}
 
-        users_data = self._load_json('user_records.json')
-        problem_map = self._load_json('problem_list.json')
-        
-        now = datetime.now()
-        start_date = now - timedelta(days=days)
-        
-        leaderboard = []
-
-        for user in users_data:
-            valid_count = 0
-            uid = user.get('user_id')
-            uname = user.get('user_name')
-            
-            for record in user.get('records', []):
-                # 1. 时间筛选
-                p_date_str = record.get('post_date')
-                try:
-                    p_date = datetime.strptime(p_date_str, "%Y-%m-%d %H:%M:%S")
-                    if p_date < start_date: continue
-                except: continue
-
-                # 2. 难度筛选
-                p_num = record.get('problem_number')
-                difficulty = problem_map.get(p_num, "未知")
-                
-                # 如果是未知难度，通常不计入等级筛选，或者你可以决定是否计入
-                # 这里假设只统计有明确等级的题目
-                level = DIFFICULTY_LEVELS.get(difficulty, -1)
-                
-                if level != -1 and min_lv <= level <= max_lv:
-                    valid_count += 1
-            
-            if valid_count > 0:
-                leaderboard.append({
-                    "user_id": uid,
-                    "user_name": uname,
-                    "count": valid_count
-                })
-
-        # 排序
-        leaderboard.sort(key=lambda x: x['count'], reverse=True)
+        # 排行榜由增量统计直接给出，不再逐条扫描记录
+        self._ensure_leaderboard()
+        leaderboard = self.leaderboard.query(days, min_lv, max_lv)
         return {"status": "success", "data": leaderboard}
 
-    def get_user_records_page(self, uid, page, page_size=10):
-        """获取单个用户的详细记录（分页）"""
-        users_data = self._load_json('user_records.json')
-        problem_map = self._load_json('problem_list.json')
-        
-        target_user = next((u for u in users_data if str(u.get('user_id')) == str(uid)), None)
-        
-        if not target_user:
+    def get_user_records_page(self, uid, page=1, page_size=10, cursor=None, filters=None):
+        """
+        获取单个用户的详细记录（分页）
+
+        参数:
+            page: 页码，没有 cursor 时按页码跳过前面的记录
+            cursor: 上一页返回的 next_cursor（[提交时间, 题号]），翻到下一页时传入
+            filters: 可选的筛选条件 {"min_lv", "max_lv", "date_from", "date_to", "prefix"}，空值表示不限
+        """
+        filters = filters or {}
+        try:
+            page, page_size = max(int(page), 1), int(page_size)
+            if cursor not in (None, ""):
+                post_date, problem_number = cursor
+                cursor = (str(post_date), str(problem_number))
+            else:
+                cursor = None
+            min_lv = int(filters["min_lv"]) if filters.get("min_lv") not in (None, "") else None
+            max_lv = int(filters["max_lv"]) if filters.get("max_lv") not in (None, "") else None
+        except (TypeError, ValueError):
+            return {"status": "error", "message": "参数错误"}
+
+        result = self.record_index.query(uid, cursor, page_size, (page - 1) * page_size, min_lv, max_lv,
+                                         filters.get("date_from") or None, filters.get("date_to") or None,
+                                         (filters.get("prefix") or "").strip())
+        if result is None:
             return {"status": "error", "message": "用户未找到"}
-        
-        all_records = target_user.get('records', [])
-        total = len(all_records)
-        
-        # 计算分页
-        start = (page - 1) * page_size
-        end = start + page_size
-        paged_records = all_records[start:end]
-        
-        # 补充难度颜色信息
-        processed_records = []
-        for r in paged_records:
-            p_num = r.get('problem_number')
-            diff = problem_map.get(p_num, "未知")
-            color = DIFFICULTY_COLORS.get(diff, DEFAULT_COLOR)
-            
-            r_copy = r.copy()
-            r_copy['difficulty'] = diff
-            r_copy['color'] = color
-            processed_records.append(r_copy)
-            
-        return {
-            "status": "success",
-            "data": processed_records,
-            "total": total,
-            "user_name": target_user.get('user_name')
-        }
+        return {"status": "success", **result}
 
     # ==========================================
     # --- 4. 配置管理 (增强) ---
@@ -355,7 +398,7 @@ class Api:
         except: pass
         
         # --- 增强：匹配用户名 ---
-        users_records = self._load_json('user_records.json')
+        users_records = self.record_store.load()
         # 创建 ID -> Name 映射
         id_name_map = {str(u['user_id']): u['user_name'] for u in users_records}
         
@@ -376,13 +419,37 @@ class Api:
         
         data[str(uid)] = new_list
         try:
-            with open('user_ids.json', 'w', encoding='utf-8') as f: json.dump(data, f, indent=4)
+            write_json_atomic('user_ids.json', data, indent=4)
         except Exception as e: return {"status": "error", "message": str(e)}
         
         print(f"[系统] 配置更新，重启监控...")
         self.start_monitoring(self.current_username)
         return {"status": "success"}
 
+    def get_metrics_history(self, limit=20):
+        """最近几个监控周期的抓取指标（新的在前）"""
+        def timing(cycle, series):
+            return round(cycle["timings"].get(series, {}).get("sum", 0) * 1000)
+
+        def counter(cycle, name):
+            return sum(value for series, value in cycle["counters"].items() if series.split("{")[0] == name)
+
+        cycles = []
+        for cycle in METRICS.history(int(limit)):
+            cycles.append({
+                "started_at": cycle["started_at"], "seconds": cycle["seconds"],
+                "users": cycle.get("users", 0), "new_records": cycle.get("new_records", 0),
+                "pages": counter(cycle, "crawler_pages_fetched_total"),
+                "rows": counter(cycle, "crawler_rows_parsed_total"),
+                "failures": counter(cycle, "crawler_page_failures_total") + counter(cycle, "crawler_parse_failures_total"),
+                "retries": counter(cycle, "crawler_retries_total"),
+                "crawl_ms": timing(cycle, 'monitor_phase_seconds{phase="crawl"}'),
+                "merge_ms": timing(cycle, 'monitor_phase_seconds{phase="merge"}'),
+                "clean_ms": timing(cycle, 'monitor_phase_seconds{phase="clean"}'),
+                "persist_ms": timing(cycle, 'monitor_phase_seconds{phase="persist"}'),
+            })
+        return {"status": "success", "data": cycles}
+
     # --- 其他 ---
     def logout(self):
         self.stop_monitoring()
@@ -391,6 +458,8 @@ class Api:
     def close_app(self): self._window.destroy()
 
 if __name__ == '__main__':
+    # 打包成 exe 后，多进程爬取的工作进程也从这里启动，必须先交给 multiprocessing 处理，否则会再打开一个窗口
+    multiprocessing.freeze_support()
     api = Api() 
     window = webview.create_window(
         'Luogu Monitor Pro', 'web/index.html',
@@ -0,0 +1,284 @@
+import bisect
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# 耗时直方图的默认分桶上限（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+def percentile(sorted_values, q):
+    """已排序数据的分位数（最近秩法），数据为空时返回 None"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(q * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+class Counter:
+    """只增不减的计数器"""
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def drain(self):
+        """取出当前值并清零"""
+        with self._lock:
+            value, self.value = self.value, 0
+        return value
+
+class Histogram:
+    """
+    分桶直方图（与 Prometheus 的 histogram 相同：每个桶统计不超过上限的观测次数）
+
+    参数:
+        buckets: 递增的分桶上限，最后自动追加 +Inf
+        sample_size: 保留最近多少个原始观测值，用于计算分位数
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS, sample_size=2048):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=sample_size)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self.recent.append(value)
+
+    def drain(self):
+        """取出各桶计数、总数、总和与最近观测值并清零"""
+        with self._lock:
+            state = {"counts": self.counts, "count": self.count, "sum": self.sum, "recent": list(self.recent)}
+            self.counts = [0] * len(self.counts)
+            self.count = 0
+            self.sum = 0.0
+            self.recent.clear()
+        return state
+
+    def merge(self, state):
+        """累加另一个同样分桶的直方图 drain 出的数据"""
+        with self._lock:
+            self.counts = [a + b for a, b in zip(self.counts, state["counts"])]
+            self.count += state["count"]
+            self.sum += state["sum"]
+            self.recent.extend(state["recent"])
+
+    def quantile(self, q):
+        """最近 sample_size 个观测值的分位数，没有观测时返回 None"""
+        with self._lock:
+            samples = sorted(self.recent)
+        return percentile(samples, q)
+
+class MetricsRegistry:
+    """
+    爬虫的指标登记处
+
+    参数:
+        log_path: 每个周期的汇总追加写入的 JSON Lines 文件，为 None 时不写文件
+        history_size: 内存中保留的最近周期数（供界面查询）
+
+    功能:
+        1. counter / histogram 按名称和标签取得（不存在时创建）指标，可在任意线程中更新
+        2. render_prometheus 输出 Prometheus 文本格式，供本地 /metrics 接口使用
+        3. begin_cycle / end_cycle 记录一个监控周期内各计数器的增量和各耗时的次数与总和
+    """
+    def __init__(self, log_path=None, history_size=50):
+        self.log_path = log_path
+        self.recent_cycles = deque(maxlen=history_size)
+        self._metrics = {}
+        self._help = {}
+        self._lock = threading.Lock()
+        self._cycle_start = None
+
+    def _get(self, kind, name, help_text, labels, factory):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = self._metrics[key] = factory()
+                self._help.setdefault(name, (kind, help_text))
+            return metric
+
+    def counter(self, name, help_text="", **labels):
+        return self._get("counter", name, help_text, labels, Counter)
+
+    def histogram(self, name, help_text="", buckets=DEFAULT_BUCKETS, **labels):
+        return self._get("histogram", name, help_text, labels, lambda: Histogram(buckets))
+
+    @contextmanager
+    def time(self, name, help_text="", **labels):
+        """统计代码块的耗时（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(name, help_text, **labels).observe(time.perf_counter() - start)
+
+    def render_prometheus(self):
+        """输出 Prometheus 文本格式"""
+        with self._lock:
+            items = sorted(self._metrics.items(), key=lambda item: item[0])
+        lines = []
+        described = set()
+        for (name, labels), metric in items:
+            if name not in described:
+                kind, help_text = self._help[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                described.add(name)
+            if isinstance(metric, Counter):
+                lines.append(f"{name}{format_labels(labels)} {metric.value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + ("+Inf",), metric.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {metric.sum}")
+            lines.append(f"{name}_count{format_labels(labels)} {metric.count}")
+        return "\n".join(lines) + "\n"
+
+    def _snapshot(self):
+        with self._lock:
+            items = list(self._metrics.items())
+        counters, timings = {}, {}
+        for (name, labels), metric in items:
+            series = name + format_labels(labels)
+            if isinstance(metric, Counter):
+                counters[series] = metric.value
+            else:
+                timings[series] = (metric.count, metric.sum)
+        return counters, timings
+
+    def begin_cycle(self):
+        self._cycle_start = (time.time(), self._snapshot())
+
+    def end_cycle(self, **fields):
+        """
+        结束一个监控周期：计算本周期的增量，保存到最近周期列表并追加到日志文件
+
+        参数:
+            fields: 调用方补充的字段（例如监控用户数、新记录数）
+
+        返回:
+            dict: 本周期的汇总
+        """
+        if self._cycle_start is None:
+            return None
+        started_at, (counters_before, timings_before) = self._cycle_start
+        counters, timings = self._snapshot()
+        summary = {
+            "started_at": datetime.fromtimestamp(started_at).strftime("%Y-%m-%d %H:%M:%S"),
+            "seconds": round(time.time() - started_at, 3),
+            **fields,
+            "counters": {series: value - counters_before.get(series, 0)
+                         for series, value in counters.items() if value != counters_before.get(series, 0)},
+            "timings": {series: {"count": count - timings_before.get(series, (0, 0.0))[0],
+                                 "sum": round(total - timings_before.get(series, (0, 0.0))[1], 4)}
+                        for series, (count, total) in timings.items() if count != timings_before.get(series, (0, 0.0))[0]},
+        }
+        self._cycle_start = None
+        self.recent_cycles.append(summary)
+        if self.log_path:
+            try:
+                with open(self.log_path, "a", encoding="utf-8") as file:
+                    file.write(json.dumps(summary, ensure_ascii=False) + "\n")
+            except OSError as e:
+                print(f"[指标] 写入 {self.log_path} 失败: {e}")
+        return summary
+
+    def get(self, name, **labels):
+        """按名称和标签取得已有的指标，不存在时返回 None"""
+        with self._lock:
+            return self._metrics.get((name, tuple(sorted(labels.items()))))
+
+    def drain(self):
+        """
+        取出各指标自上次 drain 以来的增量并清零（多进程爬取时工作进程把增量发回主进程）
+
+        返回:
+            list: [(类型, 名称, 说明, 标签, 分桶上限, 增量)]，可以跨进程传递，交给主进程的 merge
+        """
+        with self._lock:
+            items = list(self._metrics.items())
+        deltas = []
+        for (name, labels), metric in items:
+            kind, help_text = self._help[name]
+            delta = metric.drain()
+            if kind == "counter" and delta:
+                deltas.append((kind, name, help_text, labels, None, delta))
+            elif kind == "histogram" and delta["count"]:
+                deltas.append((kind, name, help_text, labels, metric.buckets, delta))
+        return deltas
+
+    def merge(self, deltas):
+        """累加另一个进程 drain 出的增量"""
+        for kind, name, help_text, labels, buckets, delta in deltas:
+            if kind == "counter":
+                self.counter(name, help_text, **dict(labels)).inc(delta)
+            else:
+                self.histogram(name, help_text, buckets, **dict(labels)).merge(delta)
+
+    def reset(self):
+        """清空所有指标（用于基准测试的各轮之间）"""
+        with self._lock:
+            self._metrics.clear()
+
+    def history(self, limit=20):
+        """最近 limit 个周期的汇总（新的在前）"""
+        return list(self.recent_cycles)[-limit:][::-1]
+
+class MetricsServer:
+    """
+    本地指标接口：GET /metrics 返回 Prometheus 文本格式
+
+    参数:
+        registry: MetricsRegistry
+        host / port: 监听地址，默认只监听本机
+    """
+    def __init__(self, registry, host="127.0.0.1", port=9464):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                data = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        host, port = self.httpd.server_address[:2]
+        print(f"[指标] 指标接口：http://{host}:{port}/metrics")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+# 进程内共用的指标登记处（多进程爬取时工作进程经 drain / merge 把增量汇总到主进程）
+METRICS = MetricsRegistry()
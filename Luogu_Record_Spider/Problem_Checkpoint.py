@@ -0,0 +1,102 @@
+import base64
+import json
+import os
+import shutil
+from Data_Cache import write_json_atomic
+
+class ProblemCrawlCheckpoint:
+    """
+    题目列表爬取的断点记录
+
+    参数:
+        directory: 断点目录，每页的结果保存为 page_<页码>.json，进度保存为 progress.json
+
+    功能:
+        1. 每爬完一页立即写入该页的结果，再在已完成页位图中标记（都是原子写入）
+        2. 重新运行时只爬位图中未完成的页，不依赖已有题目数量推算起始页
+        3. 记录列表末尾所在的页，之后的页不再领取
+        4. 全部页面完成后合并写入 problem_list.json 并删除断点目录
+    """
+    def __init__(self, directory="problem_checkpoint"):
+        self.directory = directory
+        self.progress_path = os.path.join(directory, "progress.json")
+        self.completed = bytearray()
+        self.end_page = None
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(self.progress_path, "r", encoding="utf-8") as file:
+                progress = json.load(file)
+            self.completed = bytearray(base64.b64decode(progress.get("bitmap", "")))
+            self.end_page = progress.get("end_page")
+        except (FileNotFoundError, json.JSONDecodeError, ValueError):
+            pass
+
+    def _page_path(self, page):
+        return os.path.join(self.directory, f"page_{page}.json")
+
+    def is_done(self, page):
+        index, bit = divmod(page, 8)
+        return index < len(self.completed) and bool(self.completed[index] >> bit & 1)
+
+    def completed_count(self):
+        """已完成的页数（已知列表末尾时不计末尾之后的空页）"""
+        if self.end_page is None:
+            return sum(bin(byte).count("1") for byte in self.completed)
+        return sum(1 for page in range(1, self.end_page + 1) if self.is_done(page))
+
+    def pending_pages(self, first_page=1, last_page=999):
+        """按页码顺序返回未完成的页（惰性），已知列表末尾时不超过末尾页"""
+        end = last_page if self.end_page is None else min(last_page, self.end_page)
+        return (page for page in range(first_page, end + 1) if not self.is_done(page))
+
+    def mark_done(self, page, problems, reached_end=False):
+        """
+        保存一页的结果并标记完成
+
+        参数:
+            page: 页码
+            problems: 该页的 {题号: 难度}
+            reached_end: 该页是否已是列表末尾
+        """
+        write_json_atomic(self._page_path(page), problems, indent=None)
+        index, bit = divmod(page, 8)
+        if index >= len(self.completed):
+            self.completed.extend(bytes(index + 1 - len(self.completed)))
+        self.completed[index] |= 1 << bit
+        if reached_end and (self.end_page is None or page < self.end_page):
+            self.end_page = page
+        self._save_progress()
+
+    def _save_progress(self):
+        write_json_atomic(self.progress_path, {
+            "bitmap": base64.b64encode(bytes(self.completed)).decode("ascii"),
+            "end_page": self.end_page,
+        })
+
+    def is_finished(self):
+        """已知列表末尾且末尾之前的页全部完成"""
+        return self.end_page is not None and next(self.pending_pages(), None) is None
+
+    def merged_problems(self):
+        """
+        按页码顺序合并所有已完成页的结果
+
+        返回:
+            tuple: ({题号: 难度}, {题号: 获取时间（秒级时间戳，即该页结果的写入时间）})
+        """
+        problems, fetched_at = {}, {}
+        pages = sorted(int(name[5:-5]) for name in os.listdir(self.directory)
+                       if name.startswith("page_") and name.endswith(".json"))
+        for page in pages:
+            if not self.is_done(page):
+                continue
+            path = self._page_path(page)
+            with open(path, "r", encoding="utf-8") as file:
+                page_problems = json.load(file)
+            problems.update(page_problems)
+            page_time = int(os.path.getmtime(path))
+            fetched_at.update((number, page_time) for number in page_problems)
+        return problems, fetched_at
+
+    def remove(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
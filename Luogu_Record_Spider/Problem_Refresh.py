@@ -0,0 +1,164 @@
+import asyncio
+import json
+import sys
+import time
+from Data_Cache import CachedJsonFile, write_json_atomic
+from Http_Fetcher import HttpProblemFetcher, load_cookie_header
+from Record_Store import JsonRecordStore
+from Spider_Scheduler import SpiderScheduler
+
+def merge_fetch_times(meta_path, fetched_at):
+    """
+    把若干道题的获取时间合并进 problem_list_meta.json 并原子写入
+
+    参数:
+        fetched_at: {题号: 获取时间（秒级时间戳）}
+
+    返回:
+        dict: 合并后的全部获取时间
+    """
+    try:
+        with open(meta_path, "r", encoding="utf-8") as file:
+            merged = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        merged = {}
+    merged.update(fetched_at)
+    write_json_atomic(meta_path, merged, indent=None)
+    return merged
+
+class ProblemDifficultyRefresher:
+    """
+    按需补全 problem_list.json 中的题目难度，不再为个别题目整站重爬题目列表
+
+    参数:
+        fetcher: 提供 async fetch_difficulty(题号) 的抓取对象（如 HttpProblemFetcher）
+        problem_path: 题目难度文件
+        meta_path: 每道题难度的获取时间（秒级时间戳），补全和 get_problem 合并题目时写入；
+            problem_list.json 中已有、但没有获取时间的题目（如首次建立该文件时）以当前时间记入，视为未过期
+        ttl_days: 难度的有效天数，超过后重新获取
+        max_per_cycle: 每次最多查询的题目数，缺失的题目优先
+        max_in_flight / requests_per_second: 并发数与每秒请求数
+        retry_after: 查询失败的题目在这段时间（秒）内不再重试
+
+    功能:
+        1. 只查询记录中出现、但 problem_list.json 里没有或已过期的题目
+        2. 一批查询完成后合并进原有的难度表，在线程中一次性原子写入，不阻塞事件循环；界面按修改时间自动重新读取
+    """
+    def __init__(self, fetcher, problem_path="problem_list.json", meta_path="problem_list_meta.json",
+                 ttl_days=30, max_per_cycle=100, max_in_flight=5, requests_per_second=3, retry_after=3600):
+        self.fetcher = fetcher
+        self.problem_path = problem_path
+        self.meta_path = meta_path
+        self.ttl = ttl_days * 86400
+        self.max_per_cycle = max_per_cycle
+        self.scheduler = SpiderScheduler(max_in_flight, requests_per_second, task_timeout=30)
+        self.retry_after = retry_after
+        self.problems = CachedJsonFile(problem_path, dict)
+        self._failed_at = {}
+        # 以当前时间补记、尚未写入 meta_path 的获取时间
+        self._seeded = {}
+        try:
+            with open(meta_path, "r", encoding="utf-8") as file:
+                self.fetched_at = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.fetched_at = {}
+
+    def stale_problems(self, users_data, now=None):
+        """
+        找出需要查询难度的题目
+
+        参数:
+            users_data: 用户记录列表（记录为 Record）
+            now: 当前时间（秒级时间戳），默认取当前时间
+
+        返回:
+            tuple: (缺失的题号列表, 过期的题号列表)，按在记录中首次出现的顺序排列
+        """
+        now = time.time() if now is None else now
+        problems = self.problems.get()
+
+        missing, stale = [], []
+        seen = set()
+        for user in users_data:
+            for record in user.get("records", []):
+                problem_number = record.problem_number
+                if problem_number in seen or not problem_number:
+                    continue
+                seen.add(problem_number)
+                if now - self._failed_at.get(problem_number, float("-inf")) < self.retry_after:
+                    continue
+                if problem_number not in problems:
+                    missing.append(problem_number)
+                    continue
+                if problem_number not in self.fetched_at:
+                    self.fetched_at[problem_number] = self._seeded[problem_number] = int(now)
+                if now - self.fetched_at[problem_number] > self.ttl:
+                    stale.append(problem_number)
+        return missing, stale
+
+    async def refresh(self, users_data):
+        """
+        查询并合并缺失或过期的题目难度
+
+        返回:
+            int: 写入 problem_list.json 的题目数
+        """
+        missing, stale = self.stale_problems(users_data)
+        pending = (missing + stale)[:self.max_per_cycle]
+        if not pending:
+            if self._seeded:
+                await asyncio.to_thread(self._save, {}, {})
+            return 0
+
+        async def fetch(problem_number):
+            await self.scheduler.limiter.acquire()
+            return await self.fetcher.fetch_difficulty(problem_number)
+
+        results = await self.scheduler.run(pending, fetch)
+        now = time.time()
+        found = {}
+        for problem_number, difficulty in results:
+            if difficulty is None:
+                self._failed_at[problem_number] = now
+            else:
+                found[problem_number] = difficulty
+                self._failed_at.pop(problem_number, None)
+
+        changed = 0
+        if found or self._seeded:
+            changed = await asyncio.to_thread(self._save, found, {number: int(now) for number in found})
+
+        missing_set = set(missing)
+        added = sum(1 for number in found if number in missing_set)
+        print(f"[题目难度] 查询 {len(pending)} 道（缺失 {len(missing)} 道，过期 {len(stale)} 道）："
+              f"补全 {added} 道，刷新 {len(found) - added} 道（其中难度变化 {changed - added} 道），"
+              f"失败 {len(pending) - len(found)} 道")
+        return len(found)
+
+    def _save(self, found, fetched_at):
+        """合并并原子写入难度表和获取时间（在线程中运行），返回难度发生变化的题目数"""
+        changed = 0
+        if found:
+            # 缓存的文档被多个调用方共享，复制后再合并
+            problems = dict(self.problems.get())
+            changed = sum(1 for number, difficulty in found.items() if problems.get(number) != difficulty)
+            problems.update(found)
+            write_json_atomic(self.problem_path, problems)
+        seeded, self._seeded = self._seeded, {}
+        # 重新读取再合并，保留 get_problem 期间写入的获取时间
+        self.fetched_at = merge_fetch_times(self.meta_path, {**seeded, **fetched_at})
+        return changed
+
+async def refresh_from_records(login_user_id="", records_path="user_records.json", cookie_path="cookies.json"):
+    """根据 user_records.json（及其增量日志）中出现的题目补全一次难度"""
+    users_data = JsonRecordStore(records_path).load_users()
+    cookie_header = load_cookie_header(login_user_id, cookie_path) if login_user_id else ""
+    fetcher = HttpProblemFetcher(cookie_header)
+    try:
+        refresher = ProblemDifficultyRefresher(fetcher, max_per_cycle=1000)
+        return await refresher.refresh(users_data)
+    finally:
+        await fetcher.close()
+
+if __name__ == "__main__":
+    asyncio.run(refresh_from_records(*sys.argv[1:2]))
@@ -0,0 +1,139 @@
+import bisect
+import threading
+
+# 比任何题号都大的字符串，用于定位某个提交时间的最后一行
+MAX_KEY = "\U0010ffff"
+
+def row_key(record):
+    """详情页的排序键 (提交时间, 题号)"""
+    return record.get("post_date", ""), record.get("problem_number", "")
+
+class UserRecordIndex:
+    """
+    用户详情页的按用户索引（界面线程使用）
+
+    参数:
+        record_store: 只读的记录存储（open_record_store(..., cached=True)）
+        problem_cache: problem_list.json 的 CachedJsonFile，索引为 题号 → (难度, 难度等级, 颜色)
+        unknown: 题目不在难度表中时的 (难度, 难度等级, 颜色)
+
+    功能:
+        1. 每个用户首次查询时建立一次行列表，难度、等级和颜色预先算好，之后每页直接返回这些行，不再逐条复制
+        2. 记录或难度表变化后，只有再次查询到的用户才重建（用户对象没变时沿用原来的行）
+        3. 游标分页：行按 (提交时间, 题号) 倒序排列，游标是本页最后一行的 (提交时间, 题号)，下一页从比它更早的行开始；
+           新记录插到最前面时已经翻过的页不会重复或遗漏。游标和日期范围都用二分查找定位，不筛选难度和题号时每页只取 limit 行
+        4. 按难度等级范围、日期范围、题号前缀筛选，筛选结果的总数按 (用户, 筛选条件) 缓存
+    注意:
+        返回的行被多次查询共享，调用方不能修改
+    """
+    def __init__(self, record_store, problem_cache, unknown):
+        self.record_store = record_store
+        self.problem_cache = problem_cache
+        self.unknown = unknown
+        self.builds = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, uid):
+        """取得用户的索引，存储或难度表变化后按需重建；用户不存在时返回 None"""
+        problem_index = self.problem_cache.index()
+        store_version = self.record_store.version()
+        entry = self._entries.get(uid)
+        if entry is not None and store_version is not None and entry["versions"] == (store_version, self.problem_cache.version):
+            return entry
+
+        user = self.record_store.get_user(uid)
+        if user is None:
+            self._entries.pop(uid, None)
+            return None
+        if entry is not None and entry["user"] is user and entry["versions"][1] == self.problem_cache.version:
+            entry["versions"] = (store_version, self.problem_cache.version)
+            return entry
+
+        # 记录已按时间倒序排列，再按题号区分同一时间的记录，使排序键唯一
+        records = sorted(user.get("records", []), key=row_key, reverse=True)
+        rows, levels = [], []
+        for record in records:
+            difficulty, level, color = problem_index.get(record.get("problem_number"), self.unknown)
+            rows.append({**record, "difficulty": difficulty, "color": color})
+            levels.append(level)
+        # 二分查找使用升序的排序键
+        keys = [row_key(record) for record in reversed(records)]
+        entry = {"user": user, "user_name": user.get("user_name"), "rows": rows, "levels": levels, "keys": keys,
+                 "totals": {}, "versions": (store_version, self.problem_cache.version)}
+        self._entries[uid] = entry
+        self.builds += 1
+        return entry
+
+    @staticmethod
+    def _date_bounds(entry, date_from, date_to):
+        """日期范围对应的行区间 [start, end)（行按时间倒序）"""
+        keys = entry["keys"]
+        count = len(keys)
+        start = count - bisect.bisect_right(keys, (date_to, MAX_KEY)) if date_to else 0
+        end = count - bisect.bisect_left(keys, (date_from, "")) if date_from else count
+        return start, end
+
+    @staticmethod
+    def _after(entry, cursor):
+        """排在游标（上一页最后一行的排序键）之后、即比它更早的第一行的位置"""
+        return len(entry["keys"]) - bisect.bisect_left(entry["keys"], cursor)
+
+    def query(self, uid, cursor=None, limit=10, offset=0, min_lv=None, max_lv=None, date_from=None, date_to=None, prefix=""):
+        """
+        查询一页记录
+
+        参数:
+            uid: 用户ID
+            cursor: 上一页返回的 next_cursor，即上一页最后一行的 (提交时间, 题号)；为 None 时从第一条符合条件的记录开始，并跳过 offset 条
+            limit: 每页行数
+            min_lv / max_lv: 难度等级范围（含两端），都为 None 时不按难度筛选（包括未知难度的题目）
+            date_from / date_to: 提交日期范围（含两端），"YYYY-MM-DD" 或 "YYYY-MM-DD HH:MM:SS"
+            prefix: 题号前缀，例如 "P1"、"CF"
+
+        返回:
+            dict: {"user_name", "data": 行列表, "next_cursor": 下一页的游标 [提交时间, 题号]（没有下一页时为 None）, "total": 符合条件的总数}；
+            用户不存在时返回 None
+        """
+        if date_to and len(date_to) == 10:
+            date_to += " 23:59:59"
+        with self._lock:
+            entry = self._entry(str(uid))
+            if entry is None:
+                return None
+            rows, levels = entry["rows"], entry["levels"]
+            start, end = self._date_bounds(entry, date_from, date_to)
+            filtered = min_lv is not None or max_lv is not None or bool(prefix)
+            low = min_lv if min_lv is not None else float("-inf")
+            high = max_lv if max_lv is not None else float("inf")
+
+            def matches(position):
+                return (not filtered or low <= levels[position] <= high) and rows[position]["problem_number"].startswith(prefix)
+
+            position = start if cursor is None else max(start, self._after(entry, tuple(cursor)))
+            if not filtered:
+                if cursor is None:
+                    position += offset
+                page = rows[position:min(position + limit, end)]
+                has_more = position + limit < end
+                total = max(end - start, 0)
+            else:
+                skip = offset if cursor is None else 0
+                page = []
+                has_more = False
+                while position < end:
+                    if matches(position):
+                        if skip:
+                            skip -= 1
+                        elif len(page) == limit:
+                            has_more = True
+                            break
+                        else:
+                            page.append(rows[position])
+                    position += 1
+                key = (low, high, date_from, date_to, prefix)
+                total = entry["totals"].get(key)
+                if total is None:
+                    total = entry["totals"][key] = sum(1 for p in range(start, end) if matches(p))
+            next_cursor = list(row_key(page[-1])) if has_more and page else None
+            return {"user_name": entry["user_name"], "data": page, "next_cursor": next_cursor, "total": total}
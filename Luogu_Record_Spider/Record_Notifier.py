@@ -0,0 +1,69 @@
+import queue
+import time
+from collections import OrderedDict
+
+class RecentKeySet:
+    """
+    有界、按时间淘汰的去重集合
+
+    参数:
+        ttl_seconds: 键的保留时间（秒），超过后自动淘汰
+        max_size: 最多保留的键数，超过时淘汰最早加入的键
+    """
+    def __init__(self, ttl_seconds=900, max_size=10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._keys = OrderedDict()
+
+    def _evict(self, now):
+        while self._keys:
+            key, added_at = next(iter(self._keys.items()))
+            if now - added_at < self.ttl_seconds and len(self._keys) <= self.max_size:
+                break
+            self._keys.popitem(last=False)
+
+    def add(self, key, now=None):
+        """加入一个键，返回 True；键已存在时返回 False"""
+        now = time.monotonic() if now is None else now
+        self._evict(now)
+        if key in self._keys:
+            return False
+        self._keys[key] = now
+        self._evict(now)
+        return True
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+class NewRecordQueue:
+    """
+    新记录通知队列：爬虫线程发布 merge_records 新合并的记录，通知线程直接消费
+
+    功能:
+        1. 线程安全，发布方不等待消费方
+        2. 每条消息为 (用户ID, 用户名, 记录)，只包含本周期新增的记录
+    """
+    def __init__(self):
+        self._queue = queue.Queue()
+        self.published_count = 0
+
+    def publish(self, user_id, user_name, records):
+        """发布一个用户本周期新合并的记录"""
+        for record in records:
+            self._queue.put((user_id, user_name, record))
+            self.published_count += 1
+
+    def get(self, timeout=None):
+        """取出一条新记录，超时时返回 None"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def clear(self):
+        """丢弃尚未消费的记录"""
+        while self.get(timeout=0) is not None:
+            pass
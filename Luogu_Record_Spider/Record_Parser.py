@@ -0,0 +1,195 @@
+import json
+import re
+from datetime import datetime
+from urllib.parse import unquote
+from Record_Types import Record
+
+# 洛谷站点地址及记录列表页面路径
+LUOGU_BASE_URL = "https://www.luogu.com.cn"
+RECORD_LIST_PATH = "/record/list?user={user_id}&status=12&page={page_num}"
+PROBLEM_PATH = "/problem/{problem_number}"
+
+# 记录列表每页最多的记录条数
+RECORDS_PER_PAGE = 20
+
+# 洛谷题目难度编号对应的名称（与 problem_list.json 中的写法一致）
+DIFFICULTY_NAMES = ["暂无评定", "入门", "普及−", "普及/提高−", "普及+/提高", "提高+/省选−", "省选/NOI−", "NOI/NOI+/CTSC"]
+
+# 洛谷页面中内嵌数据的两种写法
+LENTILLE_CONTEXT_PATTERN = re.compile(r'<script[^>]*id="lentille-context"[^>]*>(.*?)</script>', re.S)
+FE_INJECTION_PATTERN = re.compile(r'window\._feInjection\s*=\s*JSON\.parse\(decodeURIComponent\("(.*?)"\)\)', re.S)
+
+
+def format_timestamp(timestamp):
+    """将秒级时间戳转换为记录文件使用的日期字符串"""
+    return datetime.fromtimestamp(int(timestamp)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def parse_record_row(text):
+    """
+    解析记录列表中单行记录的文本
+
+    参数:
+        text: 行元素的 textContent
+
+    返回:
+        tuple: (用户名, Record)，数据不完整时返回 None
+    """
+    # 按换行符分割文本
+    format_text = (text or "").split("\n")
+
+    # 检查是否有足够的数据
+    if len(format_text) < 10:
+        return None
+
+    user_name = format_text[1][2:] if len(format_text[1]) > 2 else "未知用户"
+
+    post_date_str = format_text[3][12:] if len(format_text[3]) > 12 else ""
+    if post_date_str.count("-") == 1:
+        post_date_str = str(datetime.now().year) + "-" + post_date_str
+    else:
+        post_date_str = post_date_str + ":00"
+
+    problem_number = format_text[8][4:] if len(format_text[8]) > 4 else ""
+    problem_name = format_text[9][4:] if len(format_text[9]) > 4 else ""
+
+    record = Record(problem_number, post_date_str, problem_name)
+    return user_name, record
+
+
+def parse_record_rows(texts):
+    """
+    一次性解析一页中所有行的文本
+
+    返回:
+        dict: {"user_name", "records", "row_count", "skipped"}
+    """
+    texts = texts or []
+    user_name = ""
+    records = []
+    skipped = 0
+    for index, text in enumerate(texts):
+        parsed = parse_record_row(text)
+        if parsed is None:
+            skipped += 1
+            continue
+        if index == 0:
+            user_name = parsed[0]
+        records.append(parsed[1])
+    return {"user_name": user_name, "records": records, "row_count": len(texts), "skipped": skipped}
+
+
+def extract_page_payload(body):
+    """
+    从页面源码（或 _contentOnly 接口返回的 JSON）中取出页面数据
+
+    参数:
+        body: 响应正文字符串
+
+    返回:
+        dict: 页面数据（包含 records / problems 等字段），找不到时返回 None
+    """
+    if not body:
+        return None
+
+    text = body.strip()
+    if text.startswith("{"):
+        try:
+            document = json.loads(text)
+        except json.JSONDecodeError:
+            return None
+        return document.get("currentData") or document.get("data")
+
+    match = LENTILLE_CONTEXT_PATTERN.search(body)
+    if match:
+        try:
+            return json.loads(match.group(1)).get("data")
+        except json.JSONDecodeError:
+            pass
+
+    match = FE_INJECTION_PATTERN.search(body)
+    if match:
+        try:
+            return json.loads(unquote(match.group(1))).get("currentData")
+        except json.JSONDecodeError:
+            pass
+
+    return None
+
+
+def parse_record_payload(payload):
+    """
+    解析页面数据中的提交记录
+
+    参数:
+        payload: extract_page_payload 返回的页面数据
+
+    返回:
+        dict: {"user_name", "records", "row_count", "skipped"}，页面数据中没有记录列表时返回 None
+    """
+    if not isinstance(payload, dict):
+        return None
+    records_block = payload.get("records")
+    if not isinstance(records_block, dict) or not isinstance(records_block.get("result"), list):
+        return None
+
+    user_name = ""
+    records = []
+    skipped = 0
+    rows = records_block["result"]
+    for index, row in enumerate(rows):
+        problem = row.get("problem") or {}
+        submit_time = row.get("submitTime")
+        if submit_time is None or not problem.get("pid"):
+            skipped += 1
+            continue
+        if index == 0:
+            user_name = (row.get("user") or {}).get("name") or "未知用户"
+        records.append(Record(problem.get("pid", ""), format_timestamp(submit_time), problem.get("title", "")))
+    return {"user_name": user_name, "records": records, "row_count": len(rows), "skipped": skipped}
+
+
+def parse_problem_payload(payload):
+    """
+    解析题目页面数据中的题号和难度
+
+    参数:
+        payload: extract_page_payload 返回的页面数据
+
+    返回:
+        tuple: (题号, 难度名称)，页面数据中没有题目或难度无法识别时返回 None
+    """
+    if not isinstance(payload, dict):
+        return None
+    problem = payload.get("problem")
+    if not isinstance(problem, dict) or not problem.get("pid"):
+        return None
+    difficulty = problem.get("difficulty")
+    if not isinstance(difficulty, int) or not 0 <= difficulty < len(DIFFICULTY_NAMES):
+        return None
+    return problem["pid"], DIFFICULTY_NAMES[difficulty]
+
+
+def parse_problem_list_payload(payload):
+    """
+    解析题目列表页面数据中的题号和难度
+
+    参数:
+        payload: extract_page_payload 返回的页面数据
+
+    返回:
+        dict: {"problems": {题号: 难度名称}, "row_count", "count"}，页面数据中没有题目列表时返回 None
+    """
+    if not isinstance(payload, dict):
+        return None
+    problems_block = payload.get("problems")
+    if not isinstance(problems_block, dict) or not isinstance(problems_block.get("result"), list):
+        return None
+
+    problems = {}
+    rows = problems_block["result"]
+    for row in rows:
+        difficulty = row.get("difficulty")
+        if row.get("pid") and isinstance(difficulty, int) and 0 <= difficulty < len(DIFFICULTY_NAMES):
+            problems[row["pid"]] = DIFFICULTY_NAMES[difficulty]
+    return {"problems": problems, "row_count": len(rows), "count": problems_block.get("count")}
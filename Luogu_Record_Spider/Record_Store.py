@@ -0,0 +1,463 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+from Data_Cache import CachedJsonFile, build_user_index, iter_json_array, write_json_atomic
+from Record_Types import users_from_dicts, users_to_dicts
+
+def group_journal(entries):
+    """增量日志的各行按用户汇总：{用户ID（字符串）: {"user_id", "user_name", "records": {(题号, 提交时间): 记录}}}"""
+    updates = {}
+    for entry in entries:
+        update = updates.setdefault(str(entry.get("user_id")), {"user_id": entry.get("user_id"), "user_name": "", "records": {}})
+        if entry.get("user_name"):
+            update["user_name"] = entry["user_name"]
+        for record in entry.get("records", []):
+            update["records"][(record.get("problem_number"), record.get("post_date"))] = record
+    return updates
+
+def apply_update(user, update):
+    """
+    把一个用户在日志中的新记录合并到其记录字典中
+
+    参数:
+        user: 快照中的用户（不会被修改），快照中没有该用户时为 None
+
+    返回:
+        dict: 新的用户字典，记录按题号和提交时间去重、按时间倒序排列
+    """
+    records = {}
+    if user is not None:
+        records = {(r.get("problem_number"), r.get("post_date")): r for r in user.get("records", [])}
+    records.update(update["records"])
+    return {"user_id": update["user_id"] if user is None else user.get("user_id"),
+            "user_name": update["user_name"] or (user.get("user_name", "") if user is not None else ""),
+            "records": sorted(records.values(), key=lambda record: record.get("post_date", ""), reverse=True)}
+
+def apply_journal(users_data, entries):
+    """
+    把增量日志中的记录合并到用户记录字典中
+
+    参数:
+        users_data: user_records.json 结构的用户列表（不会被修改，可以是共享的缓存文档）
+        entries: 增量日志的各行 {"user_id", "user_name", "records"}
+
+    返回:
+        list: 新的用户列表；有新记录的用户换成新的字典，其余用户原样引用
+    """
+    updates = group_journal(entries)
+    result = []
+    for user in users_data:
+        update = updates.pop(str(user.get("user_id")), None)
+        result.append(user if update is None else apply_update(user, update))
+    result.extend(apply_update(None, update) for update in updates.values())
+    return result
+
+class RecordJournal:
+    """
+    新记录的增量日志（JSON Lines，只追加）
+
+    参数:
+        path: 日志文件路径；压缩时当前日志并入 path + ".1"，包含它的快照落盘后再删除
+
+    说明:
+        每行是一个用户在某个周期新合并的记录 {"user_id", "user_name", "records"}；
+        重放时先读旧日志再读当前日志，合并按记录去重，同一行重放多次不会产生重复记录
+    """
+    def __init__(self, path):
+        self.path = path
+        self.previous_path = path + ".1"
+
+    def append(self, entries):
+        """追加若干行并 fsync，返回写入的字节数"""
+        data = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries).encode("utf-8")
+        if not data:
+            return 0
+        with open(self.path, "a+b") as file:
+            # 上次写到一半退出时，最后一行没有换行，新内容另起一行
+            file.seek(0, os.SEEK_END)
+            if file.tell():
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b"\n":
+                    data = b"\n" + data
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        return len(data)
+
+    def replay(self):
+        """逐行读取两份日志，写了一半的行忽略"""
+        for path in (self.previous_path, self.path):
+            try:
+                file = open(path, "r", encoding="utf-8")
+            except FileNotFoundError:
+                continue
+            with file:
+                for line_number, line in enumerate(file, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        print(f"[存储] {path} 第 {line_number} 行不完整，已忽略")
+
+    def signature(self):
+        """两份日志的修改时间和大小，用于判断是否需要重新读取"""
+        signature = []
+        for path in (self.previous_path, self.path):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def rotate(self):
+        """开始压缩：当前日志并入旧日志，之后追加的记录写入新的日志"""
+        if not os.path.exists(self.path):
+            return
+        if not os.path.exists(self.previous_path):
+            os.replace(self.path, self.previous_path)
+            return
+        with open(self.path, "rb") as source, open(self.previous_path, "ab") as target:
+            target.write(source.read())
+            target.flush()
+            os.fsync(target.fileno())
+        os.remove(self.path)
+
+    def remove_previous(self):
+        """包含旧日志全部记录的快照已经落盘，删除旧日志"""
+        try:
+            os.remove(self.previous_path)
+        except FileNotFoundError:
+            pass
+
+class JsonRecordStore:
+    """
+    记录存储：user_records.json 快照 + 新记录的增量日志 user_records.journal.jsonl
+
+    参数:
+        path: 记录文件路径
+        cached: 是否按修改时间缓存（只读的界面线程使用；返回的数据共享，不能修改）
+        writer: 可选的 BackgroundJsonWriter，提供时快照和日志追加都交给后台线程，序列化和写盘不阻塞调用方
+
+    功能:
+        1. 平时每个周期只把新合并的记录追加到增量日志，写入量只与新记录数有关
+        2. 执行清理的周期（以及导入、导出）压缩：写入完整快照并开始新的日志
+        3. 读取时在快照上重放日志，界面和爬虫看到的都是最新的记录
+    """
+    name = "json"
+
+    def __init__(self, path="user_records.json", cached=False, writer=None):
+        self.path = path
+        self.cache = CachedJsonFile(path, list, build_user_index) if cached else None
+        self.writer = writer
+        self.journal = RecordJournal(os.path.splitext(path)[0] + ".journal.jsonl")
+        self._overlay = None
+        self._overlay_signature = None
+        self._lock = threading.Lock()
+
+    def _cached(self):
+        """按修改时间缓存的快照重放日志后的 (文档, 索引)，快照和日志都没变化时直接返回上一次的结果"""
+        with self._lock:
+            document = self.cache.get()
+            signature = (self.cache.version, self.journal.signature())
+            if signature != self._overlay_signature:
+                entries = list(self.journal.replay())
+                if entries:
+                    document = apply_journal(document, entries)
+                    self._overlay = (document, build_user_index(document))
+                else:
+                    self._overlay = (document, self.cache.index())
+                self._overlay_signature = signature
+            return self._overlay
+
+    def version(self):
+        """缓存模式下快照和增量日志的版本，变化说明记录可能已更新；不缓存时返回 None"""
+        if not self.cache:
+            return None
+        self._cached()
+        return self._overlay_signature
+
+    def load(self):
+        """读取全部用户记录（快照 + 增量日志），文件不存在或损坏时按空快照处理"""
+        if self.cache:
+            return self._cached()[0]
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                users = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            users = []
+        entries = list(self.journal.replay())
+        if not entries:
+            return users
+        print(f"[存储] 已重放增量日志 {len(entries)} 行")
+        return apply_journal(users, entries)
+
+    def load_users(self):
+        """
+        读取全部用户记录并把记录转换为 Record（爬虫启动时使用）
+
+        快照逐个用户流式解析，每个用户重放日志后立即转换，
+        不会同时持有整个文件的文本、全部记录字典和全部 Record
+        """
+        entries = list(self.journal.replay())
+        updates = group_journal(entries)
+        users = []
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                for user in iter_json_array(file):
+                    update = updates.pop(str(user.get("user_id")), None)
+                    users.extend(users_from_dicts([user if update is None else apply_update(user, update)]))
+        except FileNotFoundError:
+            pass
+        except json.JSONDecodeError as e:
+            print(f"[存储] {self.path} 已损坏，按空快照处理: {e}")
+            users = []
+        users.extend(users_from_dicts([apply_update(None, update) for update in updates.values()]))
+        if entries:
+            print(f"[存储] 已重放增量日志 {len(entries)} 行")
+        return users
+
+    def load_since(self, since_date):
+        """读取提交时间不早于 since_date 的记录（只保留有记录的用户）"""
+        result = []
+        for user in self.load():
+            records = [r for r in user.get("records", []) if r.get("post_date", "") >= since_date]
+            if records:
+                result.append({"user_id": user.get("user_id"), "user_name": user.get("user_name"), "records": records})
+        return result
+
+    def get_user(self, user_id):
+        """读取单个用户的全部记录，找不到时返回 None"""
+        if self.cache:
+            return self._cached()[1].get(str(user_id))
+        return next((u for u in self.load() if str(u.get("user_id")) == str(user_id)), None)
+
+    def save(self, merged_records, new_records=None, cutoff_date=None, added_records=None):
+        """
+        保存本周期的结果
+
+        参数:
+            merged_records: 合并（及清理）后的全部用户记录（记录可以是 Record 或字典）
+            new_records: 本周期新爬取的用户记录（JSON 存储不需要）
+            cutoff_date: 本周期执行了清理时的截止日期，不为 None 时压缩
+            added_records: 本周期新合并的记录（merge_records 收集的差异）；未提供时压缩
+        """
+        if added_records is not None and cutoff_date is None:
+            entries = users_to_dicts(added_records)
+            if self.writer is None:
+                self.journal.append(entries)
+            else:
+                # 追加和 fsync 在写入线程中完成，排在之前提交的快照之后、之后提交的水位线之前
+                self.writer.append(self.journal.path, entries, self.journal.append)
+        else:
+            self.compact(merged_records)
+
+    def compact(self, merged_records):
+        """写入完整快照并开始新的增量日志，旧日志在包含它的快照落盘后删除"""
+        if self.writer is None:
+            snapshot = users_to_dicts(merged_records)
+            self.journal.rotate()
+            write_json_atomic(self.path, snapshot, indent=None)
+            self.journal.remove_previous()
+            return
+        # 调用方只复制各用户的记录列表（之后合并时会原地修改），转换为字典、轮换日志和写盘都在写入线程中完成：
+        # 写入前当前日志并入旧日志，此时日志中的记录都已在这份快照中，快照落盘后再删除旧日志
+        users = [{**user, "records": list(user.get("records", []))} for user in merged_records]
+        self.writer.submit(self.path, lambda: users_to_dicts(users), before=self.journal.rotate, after=self.journal.remove_previous)
+
+    def close(self):
+        # 旧日志由写入线程在快照落盘后删除，这里没有需要释放的资源
+        pass
+
+class SqliteRecordStore:
+    """
+    记录存储：SQLite 数据库
+
+    参数:
+        path: 数据库文件路径
+
+    功能:
+        1. (user_id, problem_number, post_date) 唯一约束，每周期只插入新记录
+        2. 按用户+时间、时间、题号建立索引
+        3. WAL 模式，界面线程读取时爬虫可以同时写入
+    """
+    name = "sqlite"
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id TEXT PRIMARY KEY,
+        user_name TEXT NOT NULL DEFAULT ''
+    );
+    CREATE TABLE IF NOT EXISTS records (
+        user_id TEXT NOT NULL,
+        problem_number TEXT NOT NULL,
+        post_date TEXT NOT NULL,
+        problem_name TEXT NOT NULL DEFAULT '',
+        UNIQUE (user_id, problem_number, post_date)
+    );
+    CREATE INDEX IF NOT EXISTS idx_records_user_date ON records (user_id, post_date DESC);
+    CREATE INDEX IF NOT EXISTS idx_records_date ON records (post_date);
+    CREATE INDEX IF NOT EXISTS idx_records_problem ON records (problem_number);
+    """
+
+    def __init__(self, path="user_records.db"):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._connection().executescript(self.SCHEMA)
+
+    def _connection(self):
+        # sqlite3 连接不能跨线程使用，每个线程各自持有一个
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    @staticmethod
+    def _group_rows(rows):
+        users = []
+        by_id = {}
+        for user_id, user_name, post_date, problem_number, problem_name in rows:
+            user = by_id.get(user_id)
+            if user is None:
+                user = {"user_id": user_id, "user_name": user_name, "records": []}
+                by_id[user_id] = user
+                users.append(user)
+            if post_date is not None:
+                user["records"].append({"post_date": post_date, "problem_number": problem_number, "problem_name": problem_name})
+        return users
+
+    def load(self):
+        rows = self._connection().execute(
+            "SELECT u.user_id, u.user_name, r.post_date, r.problem_number, r.problem_name "
+            "FROM users u LEFT JOIN records r ON r.user_id = u.user_id "
+            "ORDER BY u.rowid, r.post_date DESC"
+        ).fetchall()
+        return self._group_rows(rows)
+
+    def load_users(self):
+        """读取全部用户记录并把记录转换为 Record（爬虫启动时使用）"""
+        return users_from_dicts(self.load())
+
+    def version(self):
+        """数据库的版本号，其他连接（爬虫线程）提交写入后变化"""
+        return self._connection().execute("PRAGMA data_version").fetchone()[0]
+
+    def load_since(self, since_date):
+        rows = self._connection().execute(
+            "SELECT u.user_id, u.user_name, r.post_date, r.problem_number, r.problem_name "
+            "FROM records r JOIN users u ON r.user_id = u.user_id "
+            "WHERE r.post_date >= ? ORDER BY u.rowid, r.post_date DESC",
+            (since_date,)
+        ).fetchall()
+        return self._group_rows(rows)
+
+    def get_user(self, user_id):
+        rows = self._connection().execute(
+            "SELECT u.user_id, u.user_name, r.post_date, r.problem_number, r.problem_name "
+            "FROM users u LEFT JOIN records r ON r.user_id = u.user_id "
+            "WHERE u.user_id = ? ORDER BY r.post_date DESC",
+            (str(user_id),)
+        ).fetchall()
+        users = self._group_rows(rows)
+        return users[0] if users else None
+
+    def save(self, merged_records, new_records=None, cutoff_date=None, added_records=None):
+        """
+        增量保存本周期的结果：只写入新记录和用户名，清理时删除截止日期之前的记录
+
+        参数:
+            merged_records: 合并后的全部用户记录（未提供 new_records 时全部写入，用于导入）
+            new_records: 本周期新爬取的用户记录
+            cutoff_date: 本周期执行了清理时的截止日期字符串
+            added_records: 本周期新合并的记录（SQLite 存储不需要）
+        """
+        source = users_to_dicts(merged_records if new_records is None else new_records)
+        connection = self._connection()
+        with connection:
+            for user in source:
+                user_id = str(user["user_id"])
+                user_name = user.get("user_name") or ""
+                connection.execute(
+                    "INSERT INTO users (user_id, user_name) VALUES (?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET user_name = excluded.user_name "
+                    "WHERE excluded.user_name NOT IN ('', '未知用户')",
+                    (user_id, user_name)
+                )
+                connection.executemany(
+                    "INSERT OR IGNORE INTO records (user_id, problem_number, post_date, problem_name) VALUES (?, ?, ?, ?)",
+                    [(user_id, r.get("problem_number", ""), r.get("post_date", ""), r.get("problem_name", "")) for r in user.get("records", [])]
+                )
+            if cutoff_date is not None:
+                # 与 clean_old_records 一致：日期无法解析的记录保留，清理后没有记录的用户一并删除
+                connection.execute("DELETE FROM records WHERE post_date < ? AND post_date GLOB '[0-9][0-9][0-9][0-9]-*'", (cutoff_date,))
+                connection.execute("DELETE FROM users WHERE user_id NOT IN (SELECT DISTINCT user_id FROM records)")
+
+    def import_json(self, json_path="user_records.json"):
+        """一次性导入已有的 user_records.json，返回导入的用户数"""
+        users = JsonRecordStore(json_path).load()
+        self.save(users)
+        return len(users)
+
+    def export_json(self, json_path="user_records.json"):
+        """导出为与 user_records.json 相同结构的文件，返回导出的用户数"""
+        users = self.load()
+        JsonRecordStore(json_path).save(users)
+        return len(users)
+
+    def is_empty(self):
+        return self._connection().execute("SELECT 1 FROM users LIMIT 1").fetchone() is None
+
+    def close(self):
+        with self._connections_lock:
+            for connection in self._connections:
+                try:
+                    connection.close()
+                except sqlite3.ProgrammingError:
+                    pass
+            self._connections.clear()
+        self._local = threading.local()
+
+def open_record_store(storage="json", json_path="user_records.json", db_path="user_records.db", cached=False, writer=None):
+    """
+    按名称打开记录存储
+
+    参数:
+        storage: "json" 或 "sqlite"
+        json_path: JSON 记录文件路径
+        db_path: SQLite 数据库路径；数据库为空且存在 JSON 文件时自动导入一次
+        cached: JSON 存储是否按修改时间缓存（仅供只读的界面线程使用）
+        writer: JSON 存储的后台写入线程（BackgroundJsonWriter），为 None 时同步写入
+    """
+    if storage == "json":
+        return JsonRecordStore(json_path, cached, writer)
+    if storage == "sqlite":
+        store = SqliteRecordStore(db_path)
+        if store.is_empty() and os.path.exists(json_path):
+            count = store.import_json(json_path)
+            print(f"已从 {json_path} 导入 {count} 个用户的记录到 {db_path}")
+        return store
+    raise ValueError(f"未知的记录存储：{storage}")
+
+if __name__ == "__main__":
+    # python Record_Store.py import|export [JSON路径] [数据库路径]
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    json_path = sys.argv[2] if len(sys.argv) > 2 else "user_records.json"
+    db_path = sys.argv[3] if len(sys.argv) > 3 else "user_records.db"
+    store = SqliteRecordStore(db_path)
+    if command == "import":
+        print(f"已导入 {store.import_json(json_path)} 个用户")
+    elif command == "export":
+        print(f"已导出 {store.export_json(json_path)} 个用户")
+    else:
+        print("用法：python Record_Store.py import|export [JSON路径] [数据库路径]")
+    store.close()
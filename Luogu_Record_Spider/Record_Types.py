@@ -0,0 +1,92 @@
+import sys
+from datetime import date
+
+# 记录时间统一换算为自 1970-01-01 00:00:00 起的秒数（按本地时间直接换算，不做时区转换）
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+SECONDS_PER_DAY = 86400
+
+# 日期部分 → 当天 0 点的秒数；同一天的记录很多，只需换算一次
+_day_seconds_cache = {}
+
+def parse_post_date(post_date):
+    """
+    将 "%Y-%m-%d %H:%M:%S" 格式的日期字符串转换为秒数
+
+    返回:
+        int: 秒数，格式不正确时返回 None
+    """
+    if not isinstance(post_date, str) or len(post_date) != 19 or post_date[4] != "-" or post_date[10] != " ":
+        return None
+    day = post_date[:10]
+    try:
+        day_seconds = _day_seconds_cache.get(day)
+        if day_seconds is None:
+            day_seconds = (date(int(day[:4]), int(day[5:7]), int(day[8:10])).toordinal() - EPOCH_ORDINAL) * SECONDS_PER_DAY
+            _day_seconds_cache[day] = day_seconds
+        hour, minute, second = int(post_date[11:13]), int(post_date[14:16]), int(post_date[17:19])
+    except ValueError:
+        return None
+    if hour > 23 or minute > 59 or second > 61:
+        return None
+    return day_seconds + hour * 3600 + minute * 60 + second
+
+def to_seconds(moment):
+    """将 datetime 换算为与 Record.timestamp 相同基准的秒数（保留微秒）"""
+    return ((moment.toordinal() - EPOCH_ORDINAL) * SECONDS_PER_DAY
+            + moment.hour * 3600 + moment.minute * 60 + moment.second + moment.microsecond / 1e6)
+
+class Record:
+    """
+    一条提交记录
+
+    属性:
+        problem_number: 题号（驻留字符串，相同题号共用一个对象）
+        problem_name: 题目名称（驻留字符串）
+        post_date: 提交时间字符串，原样保存，写入存储时直接使用
+        timestamp: 提交时间的秒数，解析一次后各处直接比较；格式不正确时为 None
+    """
+    __slots__ = ("problem_number", "problem_name", "post_date", "timestamp")
+
+    def __init__(self, problem_number, post_date, problem_name="", timestamp=None):
+        self.problem_number = sys.intern(problem_number or "")
+        self.problem_name = sys.intern(problem_name or "")
+        self.post_date = post_date or ""
+        self.timestamp = parse_post_date(self.post_date) if timestamp is None else timestamp
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("problem_number", ""), data.get("post_date", ""), data.get("problem_name", ""))
+
+    def to_dict(self):
+        return {"post_date": self.post_date, "problem_number": self.problem_number, "problem_name": self.problem_name}
+
+    def __eq__(self, other):
+        if not isinstance(other, Record):
+            return NotImplemented
+        return (self.problem_number, self.post_date, self.problem_name) == (other.problem_number, other.post_date, other.problem_name)
+
+    def __hash__(self):
+        return hash((self.problem_number, self.post_date))
+
+    def __repr__(self):
+        return f"Record({self.problem_number!r}, {self.post_date!r}, {self.problem_name!r})"
+
+def as_record(record):
+    """记录字典转换为 Record，已经是 Record 时原样返回"""
+    return record if isinstance(record, Record) else Record.from_dict(record)
+
+def users_from_dicts(users_data):
+    """读取存储后调用：把 user_records.json 结构中的记录字典转换为 Record"""
+    return [
+        {"user_id": user.get("user_id"), "user_name": user.get("user_name", ""),
+         "records": [as_record(record) for record in user.get("records", [])]}
+        for user in users_data
+    ]
+
+def users_to_dicts(users_data):
+    """写入存储前调用：把 Record 转换回 user_records.json 结构中的记录字典"""
+    return [
+        {"user_id": user.get("user_id"), "user_name": user.get("user_name", ""),
+         "records": [record.to_dict() if isinstance(record, Record) else record for record in user.get("records", [])]}
+        for user in users_data
+    ]
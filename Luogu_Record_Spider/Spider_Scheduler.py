@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+class RateLimiter:
+    """
+    全局请求限速器：保证相邻两次请求的间隔不小于 1 / requests_per_second 秒
+
+    参数:
+        requests_per_second: 每秒最多请求数，为 0 或 None 时不限速
+    """
+    def __init__(self, requests_per_second):
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self._next_time = 0.0
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        wait = self._next_time - now
+        self._next_time = max(now, self._next_time) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+class SpiderScheduler:
+    """
+    有界并发的异步任务调度器，记录爬虫和题目爬虫共用
+
+    参数:
+        max_in_flight: 同时执行的最大任务数
+        requests_per_second: 全局限速，任务内部每次请求前调用 scheduler.limiter.acquire()
+        task_timeout: 单个任务的超时时间（秒），为 None 时不限时
+
+    功能:
+        固定数量的工作协程从队列中取任务，一个任务结束立即开始下一个，
+        慢任务不会拖住其他任务
+    """
+    def __init__(self, max_in_flight=10, requests_per_second=5, task_timeout=None):
+        self.max_in_flight = max_in_flight
+        self.task_timeout = task_timeout
+        self.limiter = RateLimiter(requests_per_second)
+
+    async def run(self, items, worker, stop_when=None):
+        """
+        执行所有任务
+
+        参数:
+            items: 任务参数的可迭代对象（可以是惰性的，例如 range）
+            worker: 异步函数，接收一个任务参数并返回结果
+            stop_when: 可选函数，接收任务结果，返回 True 时不再领取新任务（已开始的任务继续完成）
+
+        返回:
+            list: [(任务参数, 结果), ...]，按任务参数的顺序排列；超时或出错的任务结果为 None
+        """
+        iterator = iter(enumerate(items))
+        results = {}
+        stopped = False
+
+        async def run_one(item):
+            try:
+                if self.task_timeout:
+                    return await asyncio.wait_for(worker(item), self.task_timeout)
+                return await worker(item)
+            except asyncio.TimeoutError:
+                print(f"任务 {item} 超过 {self.task_timeout} 秒未完成，已取消")
+            except Exception as e:
+                print(f"任务 {item} 执行出错: {str(e)[:50]}")
+            return None
+
+        async def worker_loop():
+            nonlocal stopped
+            while not stopped:
+                try:
+                    index, item = next(iterator)
+                except StopIteration:
+                    return
+                result = await run_one(item)
+                results[index] = (item, result)
+                if stop_when is not None and result is not None and stop_when(result):
+                    stopped = True
+
+        await asyncio.gather(*(worker_loop() for _ in range(self.max_in_flight)))
+        return [results[index] for index in sorted(results)]
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 项目模块平铺在上一级目录中，按脚本方式互相导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
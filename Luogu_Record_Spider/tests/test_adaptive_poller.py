@@ -0,0 +1,56 @@
+import json
+import os
+
+from Adaptive_Poller import AdaptivePoller, simulate_polling
+
+TIMELINES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "submission_timelines.json")
+CYCLE_SECONDS = 30
+NOTIFY_WINDOW = 10 * 60
+
+def load_timelines():
+    with open(TIMELINES_PATH, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+def simulate(poller=None, days=3):
+    """在录制的时间线上模拟最后 days 天，之前的提交用于确定初始间隔"""
+    timelines = load_timelines()
+    end = max(stamps[-1] for stamps in timelines.values() if stamps)
+    return simulate_polling(timelines, end - days * 86400, end, CYCLE_SECONDS, poller)
+
+def test_adaptive_polling_cuts_requests_without_missing_notifications():
+    fixed = simulate()
+    adaptive = simulate(AdaptivePoller(CYCLE_SECONDS, 8 * 60))
+    delays = sorted(adaptive["delays"])
+
+    # 每周期请求数至少降为固定轮询的 1/10
+    assert adaptive["polls"] * 10 <= fixed["polls"]
+    # 没有提交因为发现得太晚而错过通知
+    assert max(delays) < NOTIFY_WINDOW
+    assert delays[int(len(delays) * 0.95)] <= 8 * 60
+    # 只有模拟结束前最后一个间隔内的少数提交还没轮到
+    assert len(fixed["delays"]) - len(delays) <= 5
+
+def test_default_cap_is_a_multiple_of_the_cycle():
+    """5 分钟的监控周期下默认上限随周期放大，不活跃的用户不会每个周期都被轮询"""
+    poller = AdaptivePoller(300)
+    assert poller.max_interval == 300 * 16
+    poller.seed_user("1", [], 0)
+    now = 0
+    for _ in range(6):
+        poller.observe("1", False, now)
+        now += poller.interval("1")
+    assert poller.interval("1") == 300 * 16
+    assert poller.due_users(["1"], now - 300) == []
+
+def test_new_record_resets_interval():
+    poller = AdaptivePoller(CYCLE_SECONDS)
+    poller.seed_user("1", [0], 86400)
+    assert poller.interval("1") > CYCLE_SECONDS
+    poller.observe("1", True, 86400)
+    assert poller.interval("1") == CYCLE_SECONDS
+    assert poller.due_users(["1"], 86400 + CYCLE_SECONDS) == ["1"]
+
+def test_initial_interval_with_cap_not_a_power_of_two():
+    """上限不是周期的 2^k 倍时，长期不活跃的用户初始间隔取上限本身"""
+    poller = AdaptivePoller(300, 480)
+    assert poller.initial_interval([0], 30 * 86400) == 480
@@ -0,0 +1,91 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from Crawl_Cursor import CrawlCursors, Watermark
+from Get_Record import visit_user_record_list
+from Record_Parser import RECORDS_PER_PAGE
+from Record_Types import Record
+
+SECOND = "2026-01-02 10:00:00"
+
+class PageFetcher:
+    """按页返回预先排好的记录（最新的在前），指定的页抛出异常模拟访问失败"""
+    def __init__(self, records, fail_page=None):
+        self.records = records
+        self.fail_page = fail_page
+        self.pages = []
+
+    async def open_session(self, user_id):
+        return None
+
+    async def close_session(self, session):
+        pass
+
+    async def fetch_record_page(self, session, user_id, page_num):
+        self.pages.append(page_num)
+        if page_num == self.fail_page:
+            raise RuntimeError("请求超时")
+        rows = self.records[(page_num - 1) * RECORDS_PER_PAGE:page_num * RECORDS_PER_PAGE]
+        return {"user_name": "alice", "records": rows, "row_count": len(rows), "skipped": 0, "empty": False}
+
+def recent(minutes):
+    return (datetime.now() - timedelta(minutes=minutes)).strftime("%Y-%m-%d %H:%M:%S")
+
+def crawl(fetcher, watermark, max_pages=5):
+    return asyncio.run(visit_user_record_list(fetcher, "1", max_pages, existing_record_keys=set(), watermark=watermark))
+
+def test_crossed_compares_keys_within_the_same_second():
+    watermark = Watermark(SECOND, [("P1000", SECOND)])
+    assert watermark.crossed(Record("P1000", SECOND))
+    # 同一秒的另一条提交不在水位线之下
+    assert not watermark.crossed(Record("P1001", SECOND))
+    assert watermark.crossed(Record("P0999", "2026-01-02 09:59:59"))
+    assert not watermark.crossed(Record("P1002", "2026-01-02 10:00:01"))
+    assert not watermark.crossed(Record("P1003", "日期异常"))
+
+def test_from_records_keeps_every_key_at_the_newest_second():
+    records = [Record("P1002", SECOND), Record("P1001", SECOND), Record("P1000", "2026-01-02 09:00:00")]
+    watermark = Watermark.from_records(records)
+    assert watermark.post_date == SECOND
+    assert watermark.keys == {("P1002", SECOND), ("P1001", SECOND)}
+    assert Watermark.from_records([Record("P1000", "日期异常")]) is None
+
+def test_advance_merges_same_second_and_keeps_newer():
+    current = Watermark(SECOND, [("P1000", SECOND)])
+    same_second = current.advance(Watermark(SECOND, [("P1001", SECOND)]))
+    assert same_second.keys == {("P1000", SECOND), ("P1001", SECOND)}
+    assert current.keys == {("P1000", SECOND)}
+    assert current.advance(Watermark("2026-01-01 10:00:00", [("P0900", "2026-01-01 10:00:00")])) is current
+    newer = Watermark("2026-01-03 10:00:00", [("P1100", "2026-01-03 10:00:00")])
+    assert current.advance(newer) is newer
+
+def test_crawl_stops_at_watermark_but_keeps_new_records_in_the_same_second():
+    """上次抓到同一秒的 P1000，这一秒又多了一条 P1001：P1001 作为新记录收下，遇到 P1000 停止"""
+    second = recent(30)
+    records = [Record("P1002", recent(10)), Record("P1001", second), Record("P1000", second), Record("P0999", recent(60))]
+    fetcher = PageFetcher(records)
+    result = crawl(fetcher, Watermark(second, [("P1000", second)]))
+    assert [record.problem_number for record in result["records"]] == ["P1002", "P1001"]
+    assert result["complete"] and fetcher.pages == [1]
+
+def test_cursor_only_advances_for_complete_crawls(tmp_path):
+    """第 2 页访问失败时本周期不完整，水位线保持不变，下个周期从原水位线补齐；完整抓到后才推进并写入文件"""
+    path = str(tmp_path / "crawl_cursors.json")
+    old = recent(600)
+    cursors = CrawlCursors(path)
+    cursors.seed([{"user_id": "1", "records": [Record("P0001", old)]}])
+    records = [Record(f"P{2000 + i}", recent(i + 1)) for i in range(RECORDS_PER_PAGE + 5)] + [Record("P0001", old)]
+
+    failed = crawl(PageFetcher(records, fail_page=2), cursors.get("1"))
+    assert not failed["complete"] and len(failed["records"]) == RECORDS_PER_PAGE
+    assert cursors.update([failed]) == 0
+    assert cursors.get("1").post_date == old
+
+    finished = crawl(PageFetcher(records), cursors.get("1"))
+    assert finished["complete"] and len(finished["records"]) == RECORDS_PER_PAGE + 5
+    assert cursors.update([finished]) == 1
+    cursors.save()
+
+    reloaded = CrawlCursors(path)
+    assert reloaded.get("1").post_date == records[0].post_date
+    assert reloaded.get("1").keys == {(records[0].problem_number, records[0].post_date)}
@@ -0,0 +1,31 @@
+import asyncio
+import json
+
+from Fake_Luogu_Server import FakeLuoguServer, make_synthetic_record_rows
+from Get_Record import CrawlWorkerPool, run_multiprocess_spider
+
+def test_worker_pool_keeps_processes_across_cycles(tmp_path):
+    """常驻工作进程跨周期复用：两个周期的结果完整，进程只启动一次"""
+    rows = make_synthetic_record_rows(8, 25)
+    server = FakeLuoguServer(rows).start()
+    cookie_path = str(tmp_path / "cookies.json")
+    with open(cookie_path, "w", encoding="utf-8") as file:
+        json.dump([{"user_name": "test", "user_id": "1", "cookies": []}], file)
+    pool = CrawlWorkerPool("1", 2, cookie_path, "http", server.base_url)
+
+    async def run():
+        cycles = []
+        for _ in range(2):
+            results = await run_multiprocess_spider("1", list(rows), 2, cookie_path, 5, str(tmp_path / "user_records.json"), 60,
+                                                    requests_per_second=0, existing_records=[], worker_pool=pool)
+            cycles.append((len(results), [process.pid for process in pool._processes]))
+        return cycles
+
+    try:
+        (first_count, first_pids), (second_count, second_pids) = asyncio.run(run())
+    finally:
+        pool.close()
+        server.stop()
+    assert first_count == second_count == 8
+    assert first_pids == second_pids
+    assert pool.launch_count == 1
@@ -0,0 +1,109 @@
+import io
+import json
+import threading
+import time
+
+import pytest
+
+from Data_Cache import BackgroundJsonWriter, iter_json_array
+
+def blocked_writer(tmp_path):
+    """返回 (writer, release)：写入线程卡在第一个任务上，直到 release.set()"""
+    release = threading.Event()
+    started = threading.Event()
+
+    def build():
+        started.set()
+        release.wait(5)
+        return []
+
+    writer = BackgroundJsonWriter()
+    writer.submit(str(tmp_path / "blocker.json"), build)
+    assert started.wait(5)
+    return writer, release
+
+def test_submit_returns_without_waiting_and_coalesces(tmp_path):
+    writer, release = blocked_writer(tmp_path)
+    path = str(tmp_path / "records.json")
+    start = time.perf_counter()
+    for value in range(5):
+        writer.submit(path, {"value": value})
+    # 写入线程被占用时 submit 仍然立即返回
+    assert time.perf_counter() - start < 0.1
+    assert writer.writes == 0
+
+    release.set()
+    assert writer.flush(5)
+    # 阻塞的任务 + 5 次提交合并后的 1 次写入
+    assert writer.writes == 2
+    assert writer.coalesced == 4
+    with open(path, "r", encoding="utf-8") as file:
+        assert json.load(file) == {"value": 4}
+    writer.close(5)
+
+def test_appends_merge_and_stay_before_later_writes(tmp_path):
+    writer, release = blocked_writer(tmp_path)
+    order = []
+    journal, cursors = str(tmp_path / "journal.jsonl"), str(tmp_path / "cursors.json")
+    # 两个周期：各追加一次日志，再保存水位线
+    writer.append(journal, ["a1"], lambda items: order.append(("append", items)))
+    writer.submit(cursors, {"cycle": 1}, before=lambda: order.append(("cursors", 1)))
+    writer.append(journal, ["a2"], lambda items: order.append(("append", items)))
+    writer.submit(cursors, {"cycle": 2}, before=lambda: order.append(("cursors", 2)))
+
+    release.set()
+    writer.close(5)
+    assert order == [("append", ["a1", "a2"]), ("cursors", 2)]
+
+def test_failed_job_is_retried_before_later_jobs(tmp_path):
+    writer, release = blocked_writer(tmp_path)
+    order = []
+    failures = [OSError("磁盘已满")]
+
+    def append(items):
+        if failures:
+            raise failures.pop()
+        order.append(("append", items))
+
+    journal, cursors = str(tmp_path / "journal.jsonl"), str(tmp_path / "cursors.json")
+    writer.append(journal, ["a1"], append)
+    writer.submit(cursors, {"cycle": 1}, before=lambda: order.append(("cursors", 1)))
+    release.set()
+    assert writer.flush(5)
+    # 日志追加失败时不写水位线
+    assert order == []
+
+    writer.append(journal, ["a2"], append)
+    writer.submit(cursors, {"cycle": 2}, before=lambda: order.append(("cursors", 2)))
+    writer.close(5)
+    assert order == [("append", ["a1", "a2"]), ("cursors", 2)]
+
+def test_unexpected_error_in_callback_keeps_writer_alive(tmp_path, capsys):
+    """after 回调抛出 OSError 以外的异常：只丢弃该任务并输出堆栈，之后的写入和 flush 照常完成"""
+    writer = BackgroundJsonWriter()
+
+    def broken_after():
+        raise RecursionError("回调出错")
+
+    first, second = str(tmp_path / "first.json"), str(tmp_path / "second.json")
+    writer.submit(first, {"value": 1}, after=broken_after)
+    assert writer.flush(5)
+    writer.submit(second, {"value": 2})
+    assert writer.flush(5)
+    with open(second, "r", encoding="utf-8") as file:
+        assert json.load(file) == {"value": 2}
+    assert writer._thread.is_alive()
+    writer.close(5)
+    assert not writer._thread.is_alive()
+    assert "RecursionError" in capsys.readouterr().err
+
+def test_submit_after_close_raises(tmp_path):
+    writer = BackgroundJsonWriter()
+    writer.close(5)
+    with pytest.raises(RuntimeError):
+        writer.submit(str(tmp_path / "late.json"), {})
+
+def test_iter_json_array_across_chunks():
+    users = [{"user_id": n, "records": [{"problem_number": f"P{n}", "post_date": "2026-01-01 00:00:00"}]} for n in range(50)]
+    file = io.StringIO(json.dumps(users, ensure_ascii=False, indent=1))
+    assert list(iter_json_array(file, chunk_size=7)) == users
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import os
+import socket
+import threading
+from datetime import datetime
+
+import pytest
+
+from Fake_Luogu_Server import FakeLuoguServer, load_fixture
+from Http_Fetcher import HttpConnectionPool, HttpRecordFetcher
+from Record_Parser import format_timestamp
+from Record_Types import Record
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "record_list.json")
+
+@pytest.fixture
+def fixture_server():
+    fixture = load_fixture(FIXTURE_PATH)
+    server = FakeLuoguServer(fixture).start()
+    try:
+        yield fixture, server
+    finally:
+        server.stop()
+
+def expected_records(fixture):
+    return {user_id: [Record(row["problem"]["pid"], format_timestamp(row["submitTime"]), row["problem"]["title"]) for row in rows]
+            for user_id, rows in fixture.items()}
+
+async def fetch_all(fetcher, user_id, max_pages=5):
+    records = []
+    for page_num in range(1, max_pages + 1):
+        page = await fetcher.fetch_record_page(None, user_id, page_num)
+        if page["empty"]:
+            break
+        records.extend(page["records"])
+    return records
+
+def test_http_fetcher_matches_recorded_pages(fixture_server):
+    fixture, server = fixture_server
+    expected = expected_records(fixture)
+
+    async def run():
+        fetcher = HttpRecordFetcher("", server.base_url)
+        try:
+            return {user_id: await fetch_all(fetcher, user_id) for user_id in fixture}
+        finally:
+            await fetcher.close()
+
+    assert asyncio.run(run()) == expected
+
+class RecordingFallback:
+    """记录被调用的页，返回固定结果的兜底后端"""
+    def __init__(self):
+        self.pages = []
+        self.closed = False
+
+    async def open_session(self, user_id):
+        return user_id
+
+    async def close_session(self, session):
+        pass
+
+    async def fetch_record_page(self, session, user_id, page_num):
+        self.pages.append((user_id, page_num))
+        return {"user_name": "fallback", "records": [], "row_count": 0, "skipped": 0, "empty": True}
+
+    async def close(self):
+        self.closed = True
+
+def test_http_fetcher_falls_back_on_server_error():
+    fallback = RecordingFallback()
+    server = FakeLuoguServer(load_fixture(FIXTURE_PATH), error_rate=1.0).start()
+
+    async def create_fallback():
+        return fallback
+
+    async def run():
+        fetcher = HttpRecordFetcher("", server.base_url, fallback_factory=create_fallback)
+        try:
+            return await fetcher.fetch_record_page(None, "102468", 1)
+        finally:
+            await fetcher.close()
+
+    try:
+        page = asyncio.run(run())
+    finally:
+        server.stop()
+    assert page["user_name"] == "fallback"
+    assert fallback.pages == [("102468", 1)] and fallback.closed
+
+def test_http_fetcher_without_fallback_raises():
+    server = FakeLuoguServer(load_fixture(FIXTURE_PATH), error_rate=1.0).start()
+
+    async def run():
+        fetcher = HttpRecordFetcher("", server.base_url)
+        try:
+            await fetcher.fetch_record_page(None, "102468", 1)
+        finally:
+            await fetcher.close()
+
+    try:
+        with pytest.raises(RuntimeError):
+            asyncio.run(run())
+    finally:
+        server.stop()
+
+def test_cancelled_request_closes_its_connection():
+    """请求被取消（调度器的 task_timeout）时关闭正在使用的连接，不放回空闲列表，服务器端随即看到连接关闭"""
+    listener = socket.create_server(("127.0.0.1", 0))
+    closed = threading.Event()
+
+    def serve():
+        # 接受连接后只读不回，直到客户端关闭连接
+        connection, _ = listener.accept()
+        with connection:
+            while connection.recv(4096):
+                pass
+        closed.set()
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    pool = HttpConnectionPool(f"http://127.0.0.1:{listener.getsockname()[1]}", size=1, timeout=5)
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(pool.request("GET", "/slow"), 0.2)
+        assert pool._idle == []
+        # 不必等到连接自身超时
+        return await asyncio.to_thread(closed.wait, 2)
+
+    try:
+        assert asyncio.run(run())
+    finally:
+        listener.close()
+
+def test_backends_agree_through_run_spider(fixture_server, tmp_path):
+    """两种后端经 run_spider 得到与录制数据完全一致的结果（需要安装 Playwright 和浏览器）"""
+    pytest.importorskip("playwright.async_api")
+    from Get_Record import run_spider
+
+    fixture, server = fixture_server
+    expected = expected_records(fixture)
+    oldest = min(row["submitTime"] for rows in fixture.values() for row in rows)
+    days_threshold = (datetime.now() - datetime.fromtimestamp(oldest)).days + 1
+    cookie_path = str(tmp_path / "cookies.json")
+    with open(cookie_path, "w", encoding="utf-8") as file:
+        json.dump([{"user_name": "bench", "user_id": "1", "cookies": []}], file)
+
+    for backend in ("http", "playwright"):
+        results = asyncio.run(run_spider("1", list(fixture), cookie_path, 5, str(tmp_path / "user_records.json"), days_threshold,
+                                         backend=backend, base_url=server.base_url))
+        for result in results:
+            assert result["records"] == expected[result["user_id"]], f"{backend} 后端用户 {result['user_id']} 的结果与录制数据不一致"
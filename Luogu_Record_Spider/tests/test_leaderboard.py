@@ -0,0 +1,102 @@
+import random
+import threading
+from datetime import datetime, timedelta
+
+from Leaderboard import LeaderboardAggregate
+from Record_Types import Record, to_seconds
+
+NOW = datetime(2026, 3, 10, 12, 0, 0)
+
+def make_record(number, moment):
+    return Record(number, moment.strftime("%Y-%m-%d %H:%M:%S"), "题目")
+
+def brute_force(users, levels, days, min_lv, max_lv, now=NOW):
+    # 逐条比较时间的原始排行榜算法，作为对照
+    start = to_seconds(now) - days * 86400
+    counts = []
+    for user_id, records in users.items():
+        count = sum(1 for r in records
+                    if r.timestamp >= start and min_lv <= levels.get(r.problem_number, -1) <= max_lv)
+        if count:
+            counts.append((user_id, count))
+    return sorted(counts)
+
+def as_pairs(leaderboard):
+    return sorted((row["user_id"], row["count"]) for row in leaderboard)
+
+def test_query_matches_brute_force_after_adds_and_removes():
+    """按天前缀和加起始日逐条比较，与逐条扫描的结果一致，移除记录后也一致"""
+    rng = random.Random(7)
+    levels = {f"P{1000 + i}": i % 7 for i in range(40)}
+    levels.update({f"P{2000 + i}": -1 for i in range(5)})
+    board = LeaderboardAggregate(lambda p: levels.get(p, -1), 7)
+    users = {}
+    for user_id in range(1, 6):
+        records = []
+        for _ in range(60):
+            moment = NOW - timedelta(seconds=rng.randrange(0, 40 * 86400))
+            records.append(make_record(rng.choice(sorted(levels)), moment))
+        users[user_id] = records
+        board.add(user_id, f"user{user_id}", records)
+
+    removed = users[3][:20]
+    board.remove(3, removed)
+    users[3] = [r for r in users[3] if (r.problem_number, r.post_date) not in
+                {(x.problem_number, x.post_date) for x in removed}]
+
+    for days, min_lv, max_lv in [(1, 0, 6), (7, 2, 4), (30, 0, 0), (60, 5, 6), (3, 3, 3)]:
+        assert as_pairs(board.query(days, min_lv, max_lv, now=NOW)) == brute_force(users, levels, days, min_lv, max_lv)
+
+def test_add_ignores_duplicates_and_keeps_latest_name():
+    board = LeaderboardAggregate(lambda p: 2, 7)
+    record = make_record("P1000", NOW - timedelta(hours=1))
+    board.add(1, "old", [record])
+    board.add(1, "new", [record, make_record("P1000", NOW - timedelta(hours=1))])
+    board.add(1, "未知用户", [])
+    assert board.query(1, 0, 6, now=NOW) == [{"user_id": 1, "user_name": "new", "count": 1}]
+
+def test_relevel_counts_records_whose_difficulty_became_known():
+    """未知难度的记录也会保留，难度表更新后重新分级即可计入，不需要重新读盘"""
+    levels = {}
+    board = LeaderboardAggregate(lambda p: levels.get(p, -1), 7)
+    board.add(1, "a", [make_record("P1000", NOW - timedelta(hours=2)), make_record("P1001", NOW - timedelta(hours=3))])
+    assert board.query(1, 0, 6, now=NOW) == []
+
+    levels.update({"P1000": 1, "P1001": 4})
+    board.relevel()
+    assert board.query(1, 0, 6, now=NOW)[0]["count"] == 2
+    assert board.query(1, 4, 6, now=NOW)[0]["count"] == 1
+
+def test_rebuild_keeps_records_not_yet_on_disk():
+    """磁盘上的记录落后于内存：重建后已合并但尚未落盘的记录仍然计入"""
+    board = LeaderboardAggregate(lambda p: 2, 7)
+    on_disk = make_record("P1000", NOW - timedelta(hours=1))
+    pending = make_record("P1001", NOW - timedelta(hours=2))
+    board.add(1, "a", [on_disk, pending])
+    board.rebuild([{"user_id": 1, "user_name": "a", "records": [on_disk.to_dict()]}])
+    assert board.query(1, 0, 6, now=NOW)[0]["count"] == 2
+
+def test_rebuild_running_alongside_adds_and_removes():
+    """重建读取磁盘的同时爬虫线程在加入和移除记录：查询只看到旧统计或新统计，重建后不丢新记录、不带回已移除的记录"""
+    board = LeaderboardAggregate(lambda p: 3, 7)
+    old = [make_record(f"P{1000 + i}", NOW - timedelta(minutes=i + 1)) for i in range(10)]
+    board.add(1, "a", old)
+    disk = [{"user_id": 1, "user_name": "a", "records": [r.to_dict() for r in old]}]
+    added = [make_record(f"P{2000 + i}", NOW - timedelta(seconds=i + 1)) for i in range(5)]
+    seen = []
+
+    def users_data():
+        # 读到一半时另一个线程加入新记录、移除一条旧记录，并查询排行榜
+        yield disk[0]
+        def crawler():
+            board.add(1, "a", added)
+            board.remove(1, old[:1])
+            seen.append(board.query(1, 0, 6, now=NOW)[0]["count"])
+        thread = threading.Thread(target=crawler)
+        thread.start()
+        thread.join(5)
+
+    board.rebuild(users_data())
+    # 重建过程中的查询看到的是完整的旧统计（加入和移除都已生效），不是清空后的部分结果
+    assert seen == [10 + 5 - 1]
+    assert board.query(1, 0, 6, now=NOW)[0]["count"] == 10 + 5 - 1
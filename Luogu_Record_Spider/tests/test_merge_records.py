@@ -0,0 +1,78 @@
+from Get_Record import merge_records, merge_sorted_records
+from Leaderboard import LeaderboardAggregate
+from Record_Types import Record
+
+def crawl_result(user_id, *records):
+    """爬取结果：带有只用于爬取的字段，记录未排序且可能重复"""
+    return {"user_id": user_id, "user_name": f"user{user_id}", "pages_fetched": 2, "complete": True, "watermark": None,
+            "records": [Record(number, post_date, "题目") for number, post_date in records]}
+
+def records(*rows):
+    return [Record(number, post_date, "题目") for number, post_date in rows]
+
+def keys(records_list):
+    return [(record.problem_number, record.post_date) for record in records_list]
+
+def test_merge_interleaves_by_time():
+    existing = records(("P1004", "2026-01-05 10:00:00"), ("P1002", "2026-01-03 10:00:00"), ("P1000", "2026-01-01 10:00:00"))
+    new = records(("P1005", "2026-01-06 10:00:00"), ("P1003", "2026-01-04 10:00:00"), ("P1001", "2026-01-02 10:00:00"))
+    added = merge_sorted_records(existing, new)
+    assert keys(added) == keys(new)
+    assert [record.problem_number for record in existing] == ["P1005", "P1004", "P1003", "P1002", "P1001", "P1000"]
+
+def test_merge_skips_duplicates_in_same_second():
+    """同一秒的记录只按 (题号, 时间) 去重：已有的和本次重复爬到的都不会再加入，同一秒的其他题目照常加入"""
+    existing = records(("P1001", "2026-01-02 10:00:00"), ("P1000", "2026-01-02 10:00:00"))
+    new = records(("P1002", "2026-01-02 10:00:00"), ("P1001", "2026-01-02 10:00:00"), ("P1002", "2026-01-02 10:00:00"))
+    added = merge_sorted_records(existing, new)
+    assert keys(added) == [("P1002", "2026-01-02 10:00:00")]
+    assert sorted(keys(existing)) == sorted([("P1000", "2026-01-02 10:00:00"), ("P1001", "2026-01-02 10:00:00"), ("P1002", "2026-01-02 10:00:00")])
+
+def test_merge_into_empty_history():
+    existing = []
+    new = records(("P1001", "2026-01-02 10:00:00"), ("P1000", "2026-01-01 10:00:00"))
+    assert keys(merge_sorted_records(existing, new)) == keys(new)
+    assert keys(existing) == keys(new)
+
+def test_merge_only_rewrites_the_prefix():
+    """比最旧一条新记录还旧的已有记录保持原来的对象和位置，只替换归并过的开头部分"""
+    existing = records(("P1003", "2026-01-04 10:00:00"), ("P1001", "2026-01-02 10:00:00"), ("P1000", "2026-01-01 10:00:00"))
+    tail = existing[1:]
+    new = records(("P1004", "2026-01-05 10:00:00"), ("P1002", "2026-01-03 10:00:00"))
+    merge_sorted_records(existing, new)
+    assert [record.problem_number for record in existing] == ["P1004", "P1003", "P1002", "P1001", "P1000"]
+    assert all(a is b for a, b in zip(existing[3:], tail))
+
+def test_merge_keeps_unparsable_dates_last():
+    existing = records(("P1000", "2026-01-01 10:00:00"), ("P0999", "未知时间"))
+    added = merge_sorted_records(existing, records(("P1001", "2026-01-02 10:00:00")))
+    assert keys(added) == [("P1001", "2026-01-02 10:00:00")]
+    assert [record.problem_number for record in existing] == ["P1001", "P1000", "P0999"]
+
+def test_first_cycle_sorts_and_deduplicates():
+    new_records = [crawl_result("1", ("P1000", "2026-01-01 10:00:00"), ("P1002", "2026-01-03 10:00:00"),
+                                ("P1000", "2026-01-01 10:00:00"), ("P1001", "2026-01-02 10:00:00"))]
+    added_records = []
+    merged = merge_records([], new_records, added_records=added_records)
+
+    assert merged == [{"user_id": "1", "user_name": "user1", "records": [
+        Record("P1002", "2026-01-03 10:00:00", "题目"), Record("P1001", "2026-01-02 10:00:00", "题目"), Record("P1000", "2026-01-01 10:00:00", "题目")]}]
+    assert [len(user["records"]) for user in added_records] == [3]
+
+def test_first_cycle_matches_merging_into_existing_history():
+    """第一个周期与已有记录时的结果一致：同一用户的两次结果合并为一个用户"""
+    first = [crawl_result("1", ("P1000", "2026-01-01 10:00:00")), crawl_result("2", ("P2000", "2026-01-01 11:00:00")),
+             crawl_result("1", ("P1001", "2026-01-02 10:00:00"), ("P1000", "2026-01-01 10:00:00"))]
+    merged = merge_records([], first)
+    assert [user["user_id"] for user in merged] == ["1", "2"]
+    assert [r.problem_number for r in merged[0]["records"]] == ["P1001", "P1000"]
+    assert all(set(user) == {"user_id", "user_name", "records"} for user in merged)
+
+def test_leaderboard_gets_the_resolved_user_name():
+    """爬到的用户名未知时，排行榜与界面一样沿用已保存的用户名"""
+    existing = [{"user_id": "1", "user_name": "alice", "records": [Record("P1000", "2026-01-01 10:00:00", "题目")]}]
+    crawled = [{"user_id": "1", "user_name": "未知用户", "records": [Record("P1001", "2026-01-02 10:00:00", "题目")]}]
+    leaderboard = LeaderboardAggregate(lambda p_num: 0)
+    merged = merge_records(existing, crawled, leaderboard=leaderboard)
+    assert merged[0]["user_name"] == "alice"
+    assert [row["user_name"] for row in leaderboard.query(3650, 0, 6)] == ["alice"]
@@ -0,0 +1,79 @@
+import multiprocessing
+import os
+
+import pytest
+
+from Metrics import MetricsRegistry
+
+def test_drain_and_merge_carry_deltas_between_registries():
+    worker, coordinator = MetricsRegistry(log_path=None), MetricsRegistry(log_path=None)
+    worker.counter("crawler_pages_fetched_total", "抓取的页数").inc(3)
+    for value in (0.02, 0.2, 2.0):
+        worker.histogram("crawler_user_seconds", "单个用户的爬取耗时（秒）").observe(value)
+    coordinator.counter("crawler_pages_fetched_total", "抓取的页数").inc(1)
+
+    coordinator.merge(worker.drain())
+    assert coordinator.get("crawler_pages_fetched_total").value == 4
+    histogram = coordinator.get("crawler_user_seconds")
+    assert histogram.count == 3 and histogram.sum == pytest.approx(2.22)
+    assert histogram.quantile(0.5) == 0.2
+    assert 'crawler_user_seconds_bucket{le="+Inf"} 3' in coordinator.render_prometheus()
+
+    # 已取出的增量清零，再次合并不会重复计数
+    worker.counter("crawler_pages_fetched_total", "抓取的页数").inc(2)
+    coordinator.merge(worker.drain())
+    assert coordinator.get("crawler_pages_fetched_total").value == 6
+    assert coordinator.get("crawler_user_seconds").count == 3
+    assert worker.drain() == []
+
+def drain_in_child(result_queue):
+    from Metrics import METRICS
+    METRICS.counter("crawler_pages_fetched_total", "抓取的页数", backend="http").inc(5)
+    METRICS.histogram("crawler_page_phase_seconds", "每页各阶段耗时（秒）", backend="http", phase="navigate").observe(0.1)
+    result_queue.put(METRICS.drain())
+
+def test_deltas_cross_a_spawned_process():
+    """工作进程（spawn 方式）drain 出的增量经队列传回后能合并"""
+    context = multiprocessing.get_context("spawn")
+    result_queue = context.Queue()
+    process = context.Process(target=drain_in_child, args=(result_queue,))
+    process.start()
+    deltas = result_queue.get(timeout=30)
+    process.join(timeout=30)
+    coordinator = MetricsRegistry(log_path=None)
+    coordinator.merge(deltas)
+    assert coordinator.get("crawler_pages_fetched_total", backend="http").value == 5
+    assert coordinator.get("crawler_page_phase_seconds", backend="http", phase="navigate").count == 1
+
+def test_main_calls_freeze_support_first():
+    """打包后的工作进程从 Main.py 启动，__main__ 中必须先调用 freeze_support"""
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Main.py")
+    with open(path, "r", encoding="utf-8") as file:
+        source = file.read()
+    main_block = source[source.index("if __name__ == '__main__':"):]
+    statements = [line.strip() for line in main_block.splitlines()[1:] if line.strip() and not line.strip().startswith("#")]
+    assert statements[0] == "multiprocessing.freeze_support()"
+
+def test_multiprocess_spider_merges_worker_metrics(tmp_path):
+    """多进程爬取后，主进程的抓取页数和每页耗时包含全部工作进程的数据"""
+    import asyncio
+    import json
+    from Fake_Luogu_Server import FakeLuoguServer, make_synthetic_record_rows
+    from Get_Record import run_multiprocess_spider
+    from Metrics import METRICS
+
+    rows = make_synthetic_record_rows(12, 45)
+    server = FakeLuoguServer(rows).start()
+    cookie_path = str(tmp_path / "cookies.json")
+    with open(cookie_path, "w", encoding="utf-8") as file:
+        json.dump([{"user_name": "test", "user_id": "1", "cookies": []}], file)
+    METRICS.reset()
+    try:
+        results = asyncio.run(run_multiprocess_spider("1", list(rows), 2, cookie_path, 5, str(tmp_path / "user_records.json"), 60,
+                                                      backend="http", base_url=server.base_url, requests_per_second=0, existing_records=[]))
+    finally:
+        server.stop()
+    pages = sum(result["pages_fetched"] for result in results)
+    assert len(results) == 12 and pages > 0
+    assert METRICS.get("crawler_pages_fetched_total").value == pages
+    assert METRICS.get("crawler_page_phase_seconds", backend="http", phase="navigate").count == pages
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import Problem_Refresh
+from Fake_Luogu_Server import FakeLuoguServer, load_fixture
+from Http_Fetcher import HttpProblemFetcher
+from Problem_Checkpoint import ProblemCrawlCheckpoint
+from Problem_Refresh import ProblemDifficultyRefresher
+from Record_Parser import DIFFICULTY_NAMES, format_timestamp
+from Record_Types import Record
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "record_list.json")
+TTL_DAYS = 30
+
+def fixture_users(fixture):
+    return [{"user_id": user_id, "records": [Record(row["problem"]["pid"], format_timestamp(row["submitTime"]), row["problem"]["title"])
+                                             for row in rows]}
+            for user_id, rows in fixture.items()]
+
+def test_entries_without_fetch_time_are_seeded_as_fresh(tmp_path):
+    """problem_list.json 中已有但没有获取时间的题目以当前时间记入，不算过期；只有真正过期和缺失的题目需要查询"""
+    problem_path, meta_path = str(tmp_path / "problem_list.json"), str(tmp_path / "problem_list_meta.json")
+    with open(problem_path, "w", encoding="utf-8") as file:
+        json.dump({"P1000": "入门", "P1001": "普及-", "P1002": "普及/提高-"}, file, ensure_ascii=False)
+    now = time.time()
+    with open(meta_path, "w", encoding="utf-8") as file:
+        json.dump({"P1000": now - 86400, "P1001": now - (TTL_DAYS + 1) * 86400}, file)
+    refresher = ProblemDifficultyRefresher(None, problem_path, meta_path, ttl_days=TTL_DAYS)
+    users = [{"user_id": "1", "records": [Record(number, "2026-01-01 10:00:00") for number in ("P1000", "P1001", "P1002", "P1003")]}]
+    assert refresher.stale_problems(users, now) == (["P1003"], ["P1001"])
+    assert refresher.fetched_at["P1002"] == int(now)
+
+def test_first_run_seeds_meta_without_requests(tmp_path, monkeypatch):
+    """首次开启时没有 problem_list_meta.json：已有的题目全部记入获取时间，不发出请求，写入在事件循环之外进行"""
+    problem_path, meta_path = str(tmp_path / "problem_list.json"), str(tmp_path / "problem_list_meta.json")
+    with open(problem_path, "w", encoding="utf-8") as file:
+        json.dump({"P1000": "入门", "P1001": "普及-"}, file, ensure_ascii=False)
+    threads = []
+    merge = Problem_Refresh.merge_fetch_times
+    def recording_merge(*args):
+        threads.append(threading.current_thread())
+        return merge(*args)
+    monkeypatch.setattr(Problem_Refresh, "merge_fetch_times", recording_merge)
+
+    class NoFetcher:
+        async def fetch_difficulty(self, problem_number):
+            raise AssertionError(problem_number)
+
+    refresher = ProblemDifficultyRefresher(NoFetcher(), problem_path, meta_path, ttl_days=TTL_DAYS)
+    users = [{"user_id": "1", "records": [Record(number, "2026-01-01 10:00:00") for number in ("P1000", "P1001")]}]
+    assert asyncio.run(refresher.refresh(users)) == 0
+    with open(meta_path, "r", encoding="utf-8") as file:
+        assert set(json.load(file)) == {"P1000", "P1001"}
+    assert threads and threads[0] is not threading.main_thread()
+
+def test_refresh_fetches_only_missing_and_stale_problems(tmp_path):
+    """难度表中删掉一道题、把另一道题的获取时间设为过期：第一次补全只请求这两道题，第二次不再发出请求"""
+    fixture = load_fixture(FIXTURE_PATH)
+    users = fixture_users(fixture)
+    server = FakeLuoguServer(fixture).start()
+    expected = {pid: DIFFICULTY_NAMES[problem["difficulty"]] for pid, problem in server.problems.items()}
+    missing_pid, stale_pid, *_ = sorted(expected)
+
+    problem_path, meta_path = str(tmp_path / "problem_list.json"), str(tmp_path / "problem_list_meta.json")
+    known = {pid: difficulty for pid, difficulty in expected.items() if pid != missing_pid}
+    known[stale_pid] = "暂无评定"
+    with open(problem_path, "w", encoding="utf-8") as file:
+        json.dump(known, file, ensure_ascii=False)
+    with open(meta_path, "w", encoding="utf-8") as file:
+        json.dump({pid: time.time() for pid in known} | {stale_pid: time.time() - (TTL_DAYS + 1) * 86400}, file)
+
+    async def run():
+        fetcher = HttpProblemFetcher(base_url=server.base_url)
+        try:
+            refresher = ProblemDifficultyRefresher(fetcher, problem_path, meta_path, ttl_days=TTL_DAYS, requests_per_second=50)
+            requests = []
+            for _ in range(2):
+                before = server.request_count
+                await refresher.refresh(users)
+                requests.append(server.request_count - before)
+            return requests
+        finally:
+            await fetcher.close()
+
+    try:
+        assert asyncio.run(run()) == [2, 0]
+    finally:
+        server.stop()
+    with open(problem_path, "r", encoding="utf-8") as file:
+        assert json.load(file) == expected
+    with open(meta_path, "r", encoding="utf-8") as file:
+        assert set(json.load(file)) == set(expected)
+
+def test_checkpoint_reports_fetch_time_per_problem(tmp_path):
+    """get_problem 合并断点时，每道题的获取时间取所在页结果的写入时间"""
+    checkpoint = ProblemCrawlCheckpoint(str(tmp_path / "problem_checkpoint"))
+    checkpoint.mark_done(1, {"P1000": "入门", "P1001": "普及-"})
+    checkpoint.mark_done(2, {"P1050": "提高+/省选-"}, reached_end=True)
+    os.utime(os.path.join(checkpoint.directory, "page_1.json"), (1_700_000_000, 1_700_000_000))
+    problems, fetched_at = checkpoint.merged_problems()
+    assert problems == {"P1000": "入门", "P1001": "普及-", "P1050": "提高+/省选-"}
+    assert fetched_at["P1000"] == fetched_at["P1001"] == 1_700_000_000
+    assert fetched_at["P1050"] > 1_700_000_000
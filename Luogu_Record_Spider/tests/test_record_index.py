@@ -0,0 +1,59 @@
+import json
+
+from Data_Cache import CachedJsonFile
+from Record_Index import UserRecordIndex
+from Record_Store import JsonRecordStore
+
+UNKNOWN = ("未知", -1, "#bfbfbf")
+
+def make_records(count, day="2026-01"):
+    # 每两条记录同一时间，检验同一时间的记录也能按题号区分
+    return [{"problem_number": f"P{1000 + n}", "post_date": f"{day}-{1 + n // 48:02d} {n // 2 % 24:02d}:00:00", "problem_name": "题目"}
+            for n in range(count)][::-1]
+
+def make_index(tmp_path, records):
+    records_path = tmp_path / "user_records.json"
+    problem_path = tmp_path / "problem_list.json"
+    records_path.write_text(json.dumps([{"user_id": 1, "user_name": "a", "records": records}]), encoding="utf-8")
+    problem_path.write_text(json.dumps({f"P{1000 + n}": n % 8 for n in range(0, 200, 3)}), encoding="utf-8")
+    problem_cache = CachedJsonFile(str(problem_path), dict, lambda problems: {k: (str(v), v, "#000") for k, v in problems.items()})
+    store = JsonRecordStore(str(records_path), cached=True)
+    return UserRecordIndex(store, problem_cache, UNKNOWN), store
+
+def collect(index, **filters):
+    rows, cursor = [], None
+    while True:
+        result = index.query(1, cursor, limit=7, **filters)
+        rows.extend(row["problem_number"] for row in result["data"])
+        cursor = result["next_cursor"]
+        if cursor is None:
+            return rows, result["total"]
+
+def test_cursor_pages_match_filtered_listing(tmp_path):
+    records = make_records(150)
+    index, _ = make_index(tmp_path, records)
+    ordered = sorted(records, key=lambda r: (r["post_date"], r["problem_number"]), reverse=True)
+    level = lambda number: int(number[1:]) - 1000 if (int(number[1:]) - 1000) % 3 == 0 else None
+
+    rows, total = collect(index)
+    assert rows == [r["problem_number"] for r in ordered] and total == 150
+
+    expected = [r["problem_number"] for r in ordered
+                if "2026-01-01" <= r["post_date"] <= "2026-01-02 23:59:59" and r["problem_number"].startswith("P10")
+                and level(r["problem_number"]) is not None and 2 <= level(r["problem_number"]) % 8 <= 5]
+    rows, total = collect(index, min_lv=2, max_lv=5, date_from="2026-01-01", date_to="2026-01-02", prefix="P10")
+    assert rows == expected and total == len(expected)
+
+def test_new_records_do_not_shift_next_page(tmp_path):
+    """翻页之间有新记录插到最前面时，下一页既不重复也不遗漏"""
+    records = make_records(30)
+    index, store = make_index(tmp_path, records)
+    first = index.query(1, limit=10)
+
+    newer = [{"problem_number": f"P{3000 + n}", "post_date": f"2026-02-01 0{n}:00:00", "problem_name": "新题"} for n in range(5)][::-1]
+    store.journal.append([{"user_id": 1, "user_name": "a", "records": newer}])
+    second = index.query(1, first["next_cursor"], limit=10)
+
+    seen = [row["problem_number"] for row in first["data"] + second["data"]]
+    assert seen == [r["problem_number"] for r in records[:20]]
+    assert second["total"] == 35
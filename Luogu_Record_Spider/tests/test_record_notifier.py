@@ -0,0 +1,58 @@
+import threading
+
+from Get_Record import merge_records
+from Record_Notifier import NewRecordQueue, RecentKeySet
+from Record_Types import Record
+
+def test_recent_keys_expire_after_ttl():
+    keys = RecentKeySet(ttl_seconds=60, max_size=100)
+    assert keys.add("a", now=0)
+    assert not keys.add("a", now=30)
+    # 过期后淘汰，同一个键可以再次加入
+    assert keys.add("b", now=61)
+    assert "a" not in keys and len(keys) == 1
+    assert keys.add("a", now=62)
+
+def test_recent_keys_evict_oldest_beyond_max_size():
+    keys = RecentKeySet(ttl_seconds=3600, max_size=3)
+    for index, key in enumerate("abcd"):
+        assert keys.add(key, now=index)
+    assert len(keys) == 3
+    assert "a" not in keys and all(key in keys for key in "bcd")
+
+def test_queue_hands_records_to_consumer_thread():
+    """爬虫线程发布，通知线程按发布顺序取出；没有新记录时超时返回 None"""
+    queue = NewRecordQueue()
+    records = [Record("P1001", "2026-01-02 10:00:00"), Record("P1000", "2026-01-01 10:00:00")]
+    received = []
+
+    def consumer():
+        while True:
+            item = queue.get(timeout=1)
+            if item is None:
+                return
+            received.append(item)
+
+    thread = threading.Thread(target=consumer)
+    thread.start()
+    queue.publish("1", "alice", records)
+    thread.join(5)
+    assert received == [("1", "alice", records[0]), ("1", "alice", records[1])]
+    assert queue.published_count == 2
+    assert queue.get(timeout=0) is None
+
+def test_clear_drops_unconsumed_records():
+    queue = NewRecordQueue()
+    queue.publish("1", "alice", [Record("P1000", "2026-01-01 10:00:00")])
+    queue.clear()
+    assert queue.get(timeout=0) is None
+
+def test_merge_publishes_only_newly_merged_records():
+    existing = [{"user_id": "1", "user_name": "alice", "records": [Record("P1000", "2026-01-01 10:00:00")]}]
+    crawled = [{"user_id": "1", "user_name": "未知用户", "records": [Record("P1001", "2026-01-02 10:00:00"), Record("P1000", "2026-01-01 10:00:00")]}]
+    queue = NewRecordQueue()
+    merge_records(existing, crawled, notifier=queue)
+    user_id, user_name, record = queue.get(timeout=0)
+    # 爬到的用户名未知时沿用已保存的用户名
+    assert (user_id, user_name, record.problem_number) == ("1", "alice", "P1001")
+    assert queue.get(timeout=0) is None
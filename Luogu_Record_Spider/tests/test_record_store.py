@@ -0,0 +1,67 @@
+import json
+import os
+import threading
+
+from Data_Cache import BackgroundJsonWriter
+from Record_Store import JsonRecordStore
+from Record_Types import Record, users_to_dicts
+
+def make_user(user_id, *records):
+    return {"user_id": user_id, "user_name": f"user{user_id}",
+            "records": [Record(number, post_date, "题目") for number, post_date in records]}
+
+def test_save_with_writer_does_not_touch_files_on_caller_thread(tmp_path):
+    """提交日志追加和快照后立即返回，轮换日志、写快照、删除旧日志都在写入线程中完成"""
+    path = str(tmp_path / "user_records.json")
+    release = threading.Event()
+    writer = BackgroundJsonWriter()
+    # 先让写入线程卡在一个任务上，之后提交的任务只能排队
+    writer.submit(str(tmp_path / "blocker.json"), lambda: release.wait(5) and [])
+    store = JsonRecordStore(path, writer=writer)
+    history = [make_user(1, ("P1001", "2026-01-02 10:00:00"), ("P1000", "2026-01-01 10:00:00"))]
+
+    store.save(history, added_records=[make_user(1, ("P1001", "2026-01-02 10:00:00"))])
+    store.compact(history)
+    # 提交之后合并时原地修改记录列表，不影响已提交的快照
+    history[0]["records"].insert(0, Record("P1002", "2026-01-03 10:00:00", "题目"))
+    assert not os.path.exists(store.journal.path)
+    assert not os.path.exists(path)
+
+    release.set()
+    writer.close(5)
+    with open(path, "r", encoding="utf-8") as file:
+        snapshot = json.load(file)
+    assert [r["problem_number"] for r in snapshot[0]["records"]] == ["P1001", "P1000"]
+    assert not os.path.exists(store.journal.previous_path)
+
+def test_journal_and_snapshot_replay_to_latest_records(tmp_path):
+    """追加、压缩、再追加之后，从快照重放日志得到内存中的全部记录"""
+    path = str(tmp_path / "user_records.json")
+    writer = BackgroundJsonWriter()
+    store = JsonRecordStore(path, writer=writer)
+    history = [make_user(1, ("P1000", "2026-01-01 10:00:00"))]
+    store.compact(history)
+
+    added = [make_user(1, ("P1001", "2026-01-02 10:00:00")), make_user(2, ("P2000", "2026-01-02 11:00:00"))]
+    history = [make_user(1, ("P1001", "2026-01-02 10:00:00"), ("P1000", "2026-01-01 10:00:00")),
+               make_user(2, ("P2000", "2026-01-02 11:00:00"))]
+    store.save(history, added_records=added)
+    store.compact(history)
+    added = [make_user(2, ("P2001", "2026-01-03 09:00:00"))]
+    history[1]["records"].insert(0, Record("P2001", "2026-01-03 09:00:00", "题目"))
+    store.save(history, added_records=added)
+    writer.close(5)
+
+    assert store.load() == users_to_dicts(history)
+    assert users_to_dicts(store.load_users()) == users_to_dicts(history)
+    assert not os.path.exists(store.journal.previous_path)
+
+def test_replay_ignores_torn_last_line(tmp_path):
+    """上次写到一半退出时，最后一行不完整：重放忽略该行，之后追加的记录另起一行"""
+    store = JsonRecordStore(str(tmp_path / "user_records.json"))
+    store.journal.append([{"user_id": 1, "user_name": "a", "records": [{"problem_number": "P1000", "post_date": "2026-01-01 10:00:00"}]}])
+    with open(store.journal.path, "ab") as file:
+        file.write(b'{"user_id": 1, "records": [')
+    store.journal.append([{"user_id": 1, "user_name": "a", "records": [{"problem_number": "P1001", "post_date": "2026-01-02 10:00:00"}]}])
+    users = store.load()
+    assert [r["problem_number"] for r in users[0]["records"]] == ["P1001", "P1000"]
@@ -0,0 +1,72 @@
+import threading
+
+from Record_Store import JsonRecordStore, SqliteRecordStore
+from Record_Types import Record
+
+def make_user(user_id, user_name, *records):
+    return {"user_id": user_id, "user_name": user_name,
+            "records": [Record(number, post_date, "题目") for number, post_date in records]}
+
+def problem_numbers(user):
+    return [record["problem_number"] for record in user["records"]]
+
+def test_resaving_records_does_not_duplicate(tmp_path):
+    """(用户, 题号, 时间) 唯一：同一批记录再保存一次不会重复；未知用户名不覆盖已有用户名"""
+    store = SqliteRecordStore(str(tmp_path / "user_records.db"))
+    first = [make_user("1", "alice", ("P1001", "2026-01-02 10:00:00"), ("P1000", "2026-01-01 10:00:00"))]
+    store.save(first, new_records=first)
+    again = [make_user("1", "未知用户", ("P1001", "2026-01-02 10:00:00"), ("P1002", "2026-01-03 10:00:00"))]
+    store.save(again, new_records=again)
+
+    users = store.load()
+    assert len(users) == 1 and users[0]["user_name"] == "alice"
+    assert problem_numbers(users[0]) == ["P1002", "P1001", "P1000"]
+    store.close()
+
+def test_load_since_and_cleanup(tmp_path):
+    store = SqliteRecordStore(str(tmp_path / "user_records.db"))
+    users = [make_user("1", "alice", ("P1002", "2026-01-03 10:00:00"), ("P1000", "2026-01-01 10:00:00")),
+             make_user("2", "bob", ("P2000", "2026-01-01 09:00:00"))]
+    store.save(users)
+
+    recent = store.load_since("2026-01-02 00:00:00")
+    assert [(user["user_id"], problem_numbers(user)) for user in recent] == [("1", ["P1002"])]
+
+    # 清理截止日期之前的记录，没有记录的用户一并删除
+    store.save(users, new_records=[], cutoff_date="2026-01-02 00:00:00")
+    assert [(user["user_id"], problem_numbers(user)) for user in store.load()] == [("1", ["P1002"])]
+    store.close()
+
+def test_import_export_round_trip(tmp_path):
+    json_path, export_path = str(tmp_path / "user_records.json"), str(tmp_path / "exported.json")
+    users = [make_user("1", "alice", ("P1001", "2026-01-02 10:00:00"), ("P1000", "2026-01-01 10:00:00")),
+             make_user("2", "bob", ("P2000", "2026-01-01 09:00:00"))]
+    JsonRecordStore(json_path).save(users)
+
+    store = SqliteRecordStore(str(tmp_path / "user_records.db"))
+    assert store.import_json(json_path) == 2
+    assert store.export_json(export_path) == 2
+    store.close()
+    assert JsonRecordStore(export_path).load() == JsonRecordStore(json_path).load()
+
+def test_each_thread_uses_its_own_connection(tmp_path):
+    """sqlite3 连接不能跨线程：界面线程读取、爬虫线程写入各用自己的连接，写入提交后读取方能看到"""
+    store = SqliteRecordStore(str(tmp_path / "user_records.db"))
+    main_connection = store._connection()
+    version_before = store.version()
+    seen = {}
+
+    def crawler():
+        seen["connection"] = store._connection()
+        users = [make_user("1", "alice", ("P1000", "2026-01-01 10:00:00"))]
+        store.save(users, new_records=users)
+
+    thread = threading.Thread(target=crawler)
+    thread.start()
+    thread.join(5)
+    assert seen["connection"] is not main_connection
+    assert store._connection() is main_connection
+    assert store.version() != version_before
+    assert problem_numbers(store.get_user("1")) == ["P1000"]
+    store.close()
+    assert store._connections == []